@@ -8,6 +8,7 @@ const Notification: React.FC = () => {
   const [confidence, setConfidence] = useState(0);
   const [loading, setLoading] = useState(true);
   const [fadeOut, setFadeOut] = useState(false);
+  const [evidence, setEvidence] = useState("");
 
   useEffect(() => {
     const handleTruthLabel = (_event: any, label: string) => {
@@ -16,8 +17,14 @@ const Notification: React.FC = () => {
         setLoading(false);
       } else {
         setLoading(true);
+        setEvidence("");
       }
     };
+
+    // The best-matching passage, shown while the verdict is still on its way
+    const handleEvidence = (_event: any, snippet: string) => {
+      setEvidence(snippet || "");
+    };
     
     const handleConfidence = (_event: any, conf: number) => {
       setConfidence(conf);
@@ -33,12 +40,14 @@ const Notification: React.FC = () => {
 
     ipcRenderer.on("truth-label", handleTruthLabel);
     ipcRenderer.on("confidence", handleConfidence);
+    ipcRenderer.on("evidence", handleEvidence);
     ipcRenderer.on("fade-out", handleFadeOut);
     ipcRenderer.on("fade-in", handleFadeIn);
 
     return () => {
       ipcRenderer.removeListener("truth-label", handleTruthLabel);
       ipcRenderer.removeListener("confidence", handleConfidence);
+      ipcRenderer.removeListener("evidence", handleEvidence);
       ipcRenderer.removeListener("fade-out", handleFadeOut);
       ipcRenderer.removeListener("fade-in", handleFadeIn);
     };
@@ -99,7 +108,25 @@ const Notification: React.FC = () => {
       }}
     >
       {loading ? (
-        <Spin />
+        evidence ? (
+          <Flex align="center" gap="middle" style={{ padding: "0 12px" }}>
+            <Spin />
+            <div
+              style={{
+                fontSize: "10px",
+                opacity: 0.7,
+                overflow: "hidden",
+                display: "-webkit-box",
+                WebkitLineClamp: 4,
+                WebkitBoxOrient: "vertical",
+              }}
+            >
+              {evidence}
+            </div>
+          </Flex>
+        ) : (
+          <Spin />
+        )
       ) : (
         <Flex align="center" gap="middle">
           <Progress 
@@ -41,6 +41,7 @@ const Notification = () => {
     const [confidence, setConfidence] = (0, react_1.useState)(0);
     const [loading, setLoading] = (0, react_1.useState)(true);
     const [fadeOut, setFadeOut] = (0, react_1.useState)(false);
+    const [evidence, setEvidence] = (0, react_1.useState)("");
     (0, react_1.useEffect)(() => {
         const handleTruthLabel = (_event, label) => {
             setTruthLabel(label);
@@ -49,8 +50,13 @@ const Notification = () => {
             }
             else {
                 setLoading(true);
+                setEvidence("");
             }
         };
+        // The best-matching passage, shown while the verdict is still on its way
+        const handleEvidence = (_event, snippet) => {
+            setEvidence(snippet || "");
+        };
         const handleConfidence = (_event, conf) => {
             setConfidence(conf);
         };
@@ -62,11 +68,13 @@ const Notification = () => {
         };
         ipcRenderer.on("truth-label", handleTruthLabel);
         ipcRenderer.on("confidence", handleConfidence);
+        ipcRenderer.on("evidence", handleEvidence);
         ipcRenderer.on("fade-out", handleFadeOut);
         ipcRenderer.on("fade-in", handleFadeIn);
         return () => {
             ipcRenderer.removeListener("truth-label", handleTruthLabel);
             ipcRenderer.removeListener("confidence", handleConfidence);
+            ipcRenderer.removeListener("evidence", handleEvidence);
             ipcRenderer.removeListener("fade-out", handleFadeOut);
             ipcRenderer.removeListener("fade-in", handleFadeIn);
         };
@@ -117,7 +125,16 @@ const Notification = () => {
             justifyContent: "center",
             opacity: fadeOut ? 0 : 1,
             transition: "opacity 1.2s ease",
-        } }, loading ? (react_1.default.createElement(antd_1.Spin, null)) : (react_1.default.createElement(antd_1.Flex, { align: "center", gap: "middle" },
+        } }, loading ? (evidence ? (react_1.default.createElement(antd_1.Flex, { align: "center", gap: "middle", style: { padding: "0 12px" } },
+        react_1.default.createElement(antd_1.Spin, null),
+        react_1.default.createElement("div", { style: {
+                fontSize: "10px",
+                opacity: 0.7,
+                overflow: "hidden",
+                display: "-webkit-box",
+                WebkitLineClamp: 4,
+                WebkitBoxOrient: "vertical",
+            } }, evidence))) : (react_1.default.createElement(antd_1.Spin, null))) : (react_1.default.createElement(antd_1.Flex, { align: "center", gap: "middle" },
         react_1.default.createElement(antd_1.Progress, { type: "circle", percent: Math.round(Math.abs(confidence) * 100), strokeColor: getProgressColor(truthLabel), trailColor: "#ffffff", format: (percent) => react_1.default.createElement("span", { style: { color: 'white', fontSize: '10px', fontWeight: 600 } },
                 percent,
                 "%"), size: 50 }),
@@ -99,6 +99,70 @@ function createTray() {
     tray.setContextMenu(contextMenu);
     tray.setToolTip('Verity');
 }
+function postCheck(payload, onResponse) {
+    const data = JSON.stringify(payload);
+    const options = {
+        hostname: '3cdqdmy43d.execute-api.us-east-1.amazonaws.com',
+        path: '/staging/check',
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Content-Length': data.length
+        }
+    };
+    const req = https_1.default.request(options, (res) => {
+        let responseData = '';
+        res.on('data', (chunk) => { responseData += chunk; });
+        res.on('end', () => {
+            onResponse(JSON.parse(responseData));
+        });
+    });
+    req.on('error', () => { });
+    req.write(data);
+    req.end();
+}
+function showResult(response) {
+    console.log('API Response:', response);
+    dashboardWindow.webContents.send('verification-result', response);
+    notificationWindow.webContents.send('truth-label', response.verdict);
+    notificationWindow.webContents.send('confidence', response.confidence);
+    if (notificationTimeout) {
+        clearTimeout(notificationTimeout);
+    }
+    notificationTimeout = setTimeout(() => {
+        if (notificationWindow && !notificationWindow.isDestroyed()) {
+            notificationWindow.webContents.send('fade-out');
+            setTimeout(() => {
+                if (notificationWindow && !notificationWindow.isDestroyed()) {
+                    notificationWindow.hide();
+                }
+            }, 1000);
+        }
+    }, 3000);
+}
+// A streamed check answers with a streamId; poll it for the evidence, then the verdict
+function pollStream(streamId, after) {
+    postCheck({ streamId, after }, (page) => {
+        if (!Array.isArray(page.events)) {
+            showResult({ verdict: 'UNKNOWN', confidence: 0 });
+            return;
+        }
+        for (const item of page.events) {
+            if (item.event === 'evidence' && item.top_match) {
+                notificationWindow.webContents.send('evidence', item.top_match.match_snippet);
+            }
+            else if (item.event === 'verdict') {
+                showResult(item.response);
+                return;
+            }
+            else if (item.event === 'error') {
+                showResult({ verdict: 'UNKNOWN', confidence: 0 });
+                return;
+            }
+        }
+        pollStream(streamId, page.next);
+    });
+}
 function checkClipboard() {
     const currentText = electron_1.clipboard.readText();
     if (currentText) {
@@ -107,44 +171,15 @@ function checkClipboard() {
         dashboardWindow.webContents.send('clipboard-update', currentText);
         dashboardWindow.webContents.executeJavaScript('localStorage.getItem("affiliation")')
             .then((affiliation) => {
-            const payload = { text: sanitizedText, affiliation: affiliation || '' };
-            const data = JSON.stringify(payload);
-            const options = {
-                hostname: '3cdqdmy43d.execute-api.us-east-1.amazonaws.com',
-                path: '/staging/check',
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Content-Length': data.length
+            const payload = { text: sanitizedText, affiliation: affiliation || '', stream: true };
+            postCheck(payload, (response) => {
+                if (response.streamId) {
+                    pollStream(response.streamId, 0);
+                }
+                else {
+                    showResult(response);
                 }
-            };
-            const req = https_1.default.request(options, (res) => {
-                let responseData = '';
-                res.on('data', (chunk) => { responseData += chunk; });
-                res.on('end', () => {
-                    const response = JSON.parse(responseData);
-                    console.log('API Response:', response);
-                    dashboardWindow.webContents.send('verification-result', response);
-                    notificationWindow.webContents.send('truth-label', response.verdict);
-                    notificationWindow.webContents.send('confidence', response.confidence);
-                    if (notificationTimeout) {
-                        clearTimeout(notificationTimeout);
-                    }
-                    notificationTimeout = setTimeout(() => {
-                        if (notificationWindow && !notificationWindow.isDestroyed()) {
-                            notificationWindow.webContents.send('fade-out');
-                            setTimeout(() => {
-                                if (notificationWindow && !notificationWindow.isDestroyed()) {
-                                    notificationWindow.hide();
-                                }
-                            }, 1000);
-                        }
-                    }, 3000);
-                });
             });
-            req.on('error', () => { });
-            req.write(data);
-            req.end();
         });
     }
 }
@@ -0,0 +1,173 @@
+"""
+Citation URL validation against a local HTTP stub.
+
+Starts a stub server with live, dead, redirecting, HEAD-refusing, forbidden
+and slow paths, checks that public_api.lambda_handler.CitationChecker sorts
+each into live / dead / unknown as intended (exit status 1 if not), then
+times validating one batch of citations serially, through the bounded
+concurrent pool, and again from the warm cache.
+
+    python bench/citation_check.py
+    python bench/citation_check.py --citations 40 --server-latency 120 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The stub listens on loopback, which the checker refuses by default
+os.environ["CITATION_CHECK_ALLOW_PRIVATE"] = "on"
+os.environ.setdefault("TRACE_METRICS", "off")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "public_api"))
+# The shared modules, as the Lambda layer puts them on the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layer", "python"))
+
+import lambda_handler  # noqa: E402
+
+SERVER_LATENCY = 0.05
+SLOW_SECONDS = 2.0
+
+
+class SourceStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def respond(self, head):
+        time.sleep(SERVER_LATENCY)
+        path = self.path.split("?")[0]
+        kind = path.strip("/").split("/")[0]
+        if kind == "slow":
+            time.sleep(SLOW_SECONDS)
+        if kind == "moved":
+            self.send_response(301)
+            self.send_header("Location", "/ok" + path[len("/moved"):])
+        elif kind == "loop":
+            self.send_response(302)
+            self.send_header("Location", path)
+        elif kind == "nohead" and head:
+            self.send_response(405)
+        else:
+            self.send_response({"ok": 200, "nohead": 200, "slow": 200, "gone": 404, "removed": 410, "forbidden": 403}.get(kind, 404))
+        body = b"" if head else b"ok"
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def do_GET(self):
+        self.respond(head=False)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 64
+
+    def handle_error(self, request, client_address):
+        # The checker hangs up on /slow once its timeout passes
+        pass
+
+
+def start_stub():
+    server = StubServer(("127.0.0.1", 0), SourceStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def new_checker(timeout, concurrency):
+    # A fresh cache each time; every asyncio.run() loop gets its own probe semaphore
+    cache = lambda_handler.CitationCheckCache(1024)
+    return lambda_handler.CitationChecker(cache, timeout, concurrency, lambda_handler.CITATION_CHECK_MAX_REDIRECTS)
+
+
+async def check_all(checker, urls):
+    return await asyncio.gather(*(checker.status(url) for url in urls))
+
+
+def timed(checker, urls):
+    started = time.perf_counter()
+    statuses = asyncio.run(check_all(checker, urls))
+    return (time.perf_counter() - started) * 1000, statuses
+
+
+def verify(base, timeout):
+    expected = {
+        f"{base}/ok/a": "live",
+        f"{base}/moved/a": "live",
+        f"{base}/nohead/a": "live",
+        f"{base}/gone/a": "dead",
+        f"{base}/removed/a": "dead",
+        f"{base}/forbidden/a": "unknown",
+        f"{base}/loop/a": "unknown",
+        f"{base}/slow/a": "unknown",
+        "http://127.0.0.1:9/refused": "dead",
+        "http://no-such-host.invalid/page": "dead",
+        "ftp://example.com/file": "dead",
+    }
+    _, statuses = timed(new_checker(timeout, 16), list(expected))
+    failures = 0
+    for (url, want), got in zip(expected.items(), statuses):
+        failures += got != want
+        print(f"{'ok' if got == want else 'FAIL':<5} {want:<8} {got:<8} {url}")
+
+    lambda_handler.CITATION_CHECK_ALLOW_PRIVATE = "off"
+    try:
+        _, (got,) = timed(new_checker(timeout, 1), [f"{base}/ok/private"])
+    finally:
+        lambda_handler.CITATION_CHECK_ALLOW_PRIVATE = "on"
+    failures += got != "dead"
+    print(f"{'ok' if got == 'dead' else 'FAIL':<5} {'dead':<8} {got:<8} {base}/ok/private (private addresses not allowed)")
+
+    async def resolver_down(*args, **kwargs):
+        raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution")
+
+    async def probe_with_resolver_down(url):
+        asyncio.get_running_loop().getaddrinfo = resolver_down
+        return await new_checker(timeout, 1).probe(url)
+
+    got = asyncio.run(probe_with_resolver_down(f"{base}/ok/a"))
+    failures += got != "unknown"
+    print(f"{'ok' if got == 'unknown' else 'FAIL':<5} {'unknown':<8} {got:<8} {base}/ok/a (resolver timed out)")
+    return failures
+
+
+def main():
+    global SERVER_LATENCY
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--citations", type=int, default=24)
+    parser.add_argument("--server-latency", type=float, default=50, help="ms the stub takes to answer")
+    parser.add_argument("--concurrency", type=int, default=lambda_handler.CITATION_CHECK_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    args = parser.parse_args()
+    SERVER_LATENCY = args.server_latency / 1000
+
+    server, base = start_stub()
+    try:
+        failures = verify(base, args.timeout)
+
+        # A claim's worth of sources: mostly live, some moved, some gone
+        kinds = ["ok", "ok", "moved", "ok", "gone", "ok"]
+        urls = [f"{base}/{kinds[i % len(kinds)]}/{i}" for i in range(args.citations)]
+        serial_ms, _ = timed(new_checker(args.timeout, 1), urls)
+        checker = new_checker(args.timeout, args.concurrency)
+        cold_ms, statuses = timed(checker, urls)
+        warm_ms, _ = timed(checker, urls)
+        dead = statuses.count("dead")
+        print(f"\n{len(urls)} citations, {dead} dead, stub latency {args.server_latency:.0f} ms")
+        print(f"serial               {serial_ms:8.1f} ms")
+        print(f"{f'concurrent (x{args.concurrency})':<20} {cold_ms:8.1f} ms")
+        print(f"warm cache           {warm_ms:8.1f} ms")
+    finally:
+        server.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Regression check and microbenchmark for the orchestrator's check-worthiness
+pre-filter.
+
+Checks that real claims, most without a number, always reach the pipeline
+and that links, code, single words, questions and chat are screened out
+(exit status 1 if not). Then times screen_text() (sentence split +
+per-sentence scoring) on typical clipboard pastes, and prints what each
+paste was judged to be.
+
+    python bench/claim_filter.py
+    python bench/claim_filter.py --repeat 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("TRACE_METRICS", "off")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+# The shared modules, as the Lambda layer puts them on the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layer", "python"))
+
+import factCheckerFunction as orchestrator  # noqa: E402
+
+# Must reach the pipeline
+CLAIMS = [
+    "Vaccines cause autism.",
+    "AWS encrypts all customer data at rest by default.",
+    "Water boils at 100 degrees Celsius at sea level.",
+    "Employees get 20 days of PTO.",
+    "The moon orbits the Earth.",
+    "S3 replicates objects across three availability zones.",
+    "Remote employees receive a monthly stipend.",
+    "Smoking kills.",
+    "Contractors are not eligible for the annual bonus.",
+    "The refund window is thirty days.",
+    "Our support team answers tickets around the clock.",
+    "Managers approve expense reports before reimbursement.",
+    "the free tier never expires",
+    "Parental leave applies to adoptive parents too.",
+    "Einstein developed the theory of relativity.",
+    # Numeric and financial prose that looks a little like code
+    "#1 selling EV in Europe is the Tesla Model Y.",
+    "@Apple reported 20% growth in Q3.",
+    "E = mc2 holds for all massive particles.",
+    "- Q3 revenue: $4.2B (up 12%)\n- Q3 margin: 31% (down 2 pts)",
+    "Acme (NYSE: ACM) closed at $42.\nVolume was 3M shares.",
+]
+# (text, why it is screened out)
+NOT_CLAIMS = [
+    ("Kubernetes", "short"),
+    ("https://docs.example.com/guides/getting-started", "url"),
+    ("x = compute(rows[0]);", "code"),
+    ("if (user.isAdmin()) { return true; }", "code"),
+    ("<div class=\"note\">Hello</div>", "code"),
+    ("Does the enterprise plan include phone support?", "question"),
+    ("I think we should mention this in the deck.", "opinion"),
+    ("thanks, see you tomorrow!", "opinion"),
+]
+
+PASTES = {
+    "word": "Kubernetes",
+    "name": "Jane Doe",
+    "url": "https://docs.example.com/guides/getting-started?ref=nav#install",
+    "code": "def handler(event, context):\n    return {\"statusCode\": 200, \"body\": json.dumps(event)}",
+    "question": "Does the enterprise plan include phone support?",
+    "claim": "Acme reported 12% revenue growth in 2023 and now employs 4,000 people.",
+    "paragraph": (
+        "Our enterprise support plan guarantees a fifteen minute response time for critical outages. "
+        "Customers in the EU region are billed in euros. The premium API is available in 14 regions worldwide. "
+        "I think we should mention this in the onboarding deck, thanks!"
+    ),
+    "article": " ".join(
+        f"The {product} grew {n}% in {2015 + n % 9} according to the annual report."
+        for n, product in enumerate(["storage tier", "support plan", "premium API", "security suite"] * 8)
+    ),
+    # Worst cases: nothing worth checking, so the whole paste has to be looked at
+    "chatter": " ".join(f"ok thanks, see you at {n} tomorrow!" for n in range(200)),
+    "codefile": "\n".join(f"    total_{i} = compute(total_{i - 1}, rows[{i}])  # step {i}" for i in range(1, 201)),
+}
+
+
+def verify():
+    failures = 0
+    for claim in CLAIMS:
+        skipped = orchestrator.screen_text(claim)
+        failures += skipped is not None
+        print(f"{'FAIL' if skipped else 'ok':<5} check          {claim!r}")
+    for text, reason in NOT_CLAIMS:
+        skipped = orchestrator.screen_text(text)
+        got = skipped["reason"] if skipped else None
+        failures += got != reason
+        print(f"{'ok' if got == reason else 'FAIL':<5} skip {reason:<9} {text!r}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = verify()
+
+    print(f"\n{'paste':<10} {'chars':>6} {'us/paste':>9}  result")
+    for name, text in PASTES.items():
+        orchestrator.screen_text(text)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            skipped = orchestrator.screen_text(text)
+        micros = (time.perf_counter() - started) / args.repeat * 1e6
+        result = f"skip ({skipped['reason']})" if skipped else "check"
+        print(f"{name:<10} {len(text):>6} {micros:>9.1f}  {result}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
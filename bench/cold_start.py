@@ -0,0 +1,129 @@
+"""
+Cold-start profile for each Lambda handler.
+
+Every sample is a fresh interpreter running under `python -X importtime`:
+it imports the handler module (the Lambda init phase), then invokes it once
+with an event that fails validation, the cheapest request a new container can
+get. Reports median init and first-invoke time, which heavy packages were
+loaded by the end of that invocation, and the imports that cost the most,
+from the last sample's importtime log.
+
+    python bench/cold_start.py
+    python bench/cold_start.py --handler internal --repeat 10 --top 20
+
+To compare against another checkout (e.g. a `git worktree` of an older
+commit), point --root at it.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HANDLERS = {
+    # name: (directory, module, event that fails validation)
+    "orchestrator": ("lambda", "factCheckerFunction", {"body": "{}"}),
+    "internal": ("lambda", "factcheck_internal_check", {"body": "{}"}),
+    "public": ("public_api", "lambda_handler", {"body": "{}"}),
+    "ingestion": ("lambda", "ingestion_trigger", {}),
+}
+HEAVY_PACKAGES = ("boto3", "botocore", "numpy", "backboard", "local_index")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module} as handler
+imported = time.perf_counter()
+response = handler.lambda_handler(json.loads({event!r}), None)
+invoked = time.perf_counter()
+print(json.dumps({{
+    "init_ms": (imported - started) * 1000,
+    "invoke_ms": (invoked - imported) * 1000,
+    "status": response.get("statusCode"),
+    "loaded": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def sample(root, directory, module, event):
+    """One cold start in a fresh interpreter. Returns (probe result, importtime rows)."""
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env.setdefault("TRACE_METRICS", "off")
+    # The shared modules, where the Lambda layer puts them
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.join(root, "layer", "python"), env.get("PYTHONPATH")]))
+    code = PROBE.format(module=module, event=json.dumps(event), heavy=HEAVY_PACKAGES)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.join(root, directory),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode or not lines:
+        tail = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")][-3:]
+        raise RuntimeError(f"{module} failed to start: {' / '.join(tail)}")
+    return json.loads(lines[-1]), parse_importtime(proc.stderr)
+
+
+def parse_importtime(stderr):
+    """[(cumulative_us, self_us, depth, module)] from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    return rows
+
+
+def report(name, results, rows, top):
+    init = statistics.median(r["init_ms"] for r in results)
+    invoke = statistics.median(r["invoke_ms"] for r in results)
+    print(f"\n== {name}: init {init:.1f} ms, first invoke {invoke:.1f} ms "
+          f"(status {results[-1]['status']}, median of {len(results)})")
+    print(f"   heavy packages loaded: {', '.join(results[-1]['loaded']) or 'none'}")
+
+    # Cost per top-level package: the sum of self time over it and all its submodules
+    per_package = {}
+    for _, self_us, _, module in rows:
+        package = module.split(".")[0]
+        per_package[package] = per_package.get(package, 0) + self_us
+    print(f"   {'package':<28} {'self ms':>8}")
+    for package, self_us in sorted(per_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"   {package:<28} {self_us / 1000:8.1f}")
+
+    print(f"   {'import (top two levels)':<40} {'cumulative ms':>13}")
+    shallow = [row for row in rows if row[2] <= 1]
+    for cumulative_us, _, depth, module in sorted(shallow, key=lambda row: -row[0])[:top]:
+        print(f"   {'  ' * depth + module:<40} {cumulative_us / 1000:13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--handler", choices=sorted(HANDLERS), action="append",
+                        help="repeatable; default is every handler")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per handler")
+    parser.add_argument("--top", type=int, default=10, help="rows per table")
+    parser.add_argument("--root", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+                        help="checkout to profile")
+    args = parser.parse_args()
+
+    failures = 0
+    for name in args.handler or list(HANDLERS):
+        directory, module, event = HANDLERS[name]
+        try:
+            samples = [sample(args.root, directory, module, event) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            failures += 1
+            print(f"\n== {name}: {e}")
+            continue
+        report(name, [result for result, _ in samples], samples[-1][1], args.top)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Cold-handshake vs pooled keep-alive latency for the Gemini HTTP client.
+
+Runs a local stub of the Gemini generateContent endpoint and times the same
+POST through a fresh urllib.request connection per call (the old path) and
+through public_api.lambda_handler.HTTPPool.
+
+    python bench/gemini_http_pool.py --requests 500
+    python bench/gemini_http_pool.py --certfile cert.pem --keyfile key.pem   # include TLS handshakes
+"""
+import argparse
+import json
+import os
+import ssl
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "public_api"))
+# The shared modules, as the Lambda layer puts them on the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layer", "python"))
+
+import lambda_handler  # noqa: E402
+
+STUB_BODY = json.dumps(
+    {
+        "candidates": [
+            {
+                "content": {
+                    "parts": [
+                        {"text": '[{"source": "stub", "url": "https://example.com", "snippet": "s", "stance": "neutral"}]'}
+                    ]
+                }
+            }
+        ]
+    }
+).encode("utf-8")
+
+
+class GeminiStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; avoid Nagle + delayed-ACK stalls on keep-alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_BODY)))
+        self.end_headers()
+        self.wfile.write(STUB_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(certfile=None, keyfile=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GeminiStub)
+    scheme = "http"
+    if certfile:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(certfile, keyfile)
+        server.socket = ctx.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+
+def client_ssl_context(enabled):
+    if not enabled:
+        return None
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+def time_calls(fn, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]  # noqa: E731
+    print(
+        f"{name:<8} n={len(samples):<5} mean={statistics.mean(samples):7.3f}ms "
+        f"p50={p(0.50):7.3f}ms p95={p(0.95):7.3f}ms p99={p(0.99):7.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(args.certfile, args.keyfile)
+    ctx = client_ssl_context(bool(args.certfile))
+    body = json.dumps({"contents": [{"parts": [{"text": "claim"}]}]}).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+
+    def cold():
+        req = urllib.request.Request(base_url + lambda_handler.GEMINI_MODEL_PATH, data=body, headers=headers, method="POST")
+        with urllib.request.urlopen(req, timeout=25, context=ctx) as resp:
+            resp.read()
+
+    pool = lambda_handler.HTTPPool(base_url, 4, 3, 25, ssl_context=ctx)
+
+    def pooled():
+        lambda_handler.request_with_retry(pool, "POST", lambda_handler.GEMINI_MODEL_PATH, body=body, headers=headers)
+
+    # Warm both paths once so imports and the first pooled connect are excluded
+    cold()
+    pooled()
+
+    report("cold", time_calls(cold, args.requests))
+    report("pooled", time_calls(pooled, args.requests))
+
+    pool.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,658 @@
+"""
+In-process load harness for the three Lambda handlers.
+
+Imports the orchestrator, internal checker and public handler as-is and swaps
+their backends for local stubs with configurable latency: Bedrock agent-runtime
+(retrieve), Bedrock runtime (converse), Bedrock agent (KB
+version checks), Lambda invoke, the Gemini HTTP pool, the Backboard client and
+the citation URL probe. No network and no AWS credentials are needed.
+
+Drives a synthetic claim corpus (or --claims-file, one claim per line) at the
+given concurrency and reports throughput, p50/p95/p99 latency, and per-request
+allocations (tracemalloc high-water and retained bytes, measured in a separate
+sequential pass so tracing overhead doesn't skew the latency numbers).
+
+    python bench/load_harness.py --target orchestrator --requests 500 --concurrency 16
+    python bench/load_harness.py --target internal --batch-size 10 --converse-latency lognormal:900,0.4
+    python bench/load_harness.py --target public --no-caches --gemini-latency fixed:400
+    python bench/load_harness.py --target internal --no-caches --concurrency 32 --converse-capacity 4
+    python bench/load_harness.py --target orchestrator --invoke-backend local --orchestrator-memory-mb 1024
+    python bench/load_harness.py --target orchestrator --stream
+
+With --stream each orchestrator request is a streamed check driven like the
+client drives it (start, then poll until the verdict); latency is time to the
+verdict and "evidence" is time to the first evidence event.
+
+Each result also estimates Lambda cost per 1000 requests from billed durations
+(the handler under test plus, for the orchestrator, every downstream invoke).
+
+Latency specs: "fixed:MS", "uniform:LO,HI" or "lognormal:MEDIAN,SIGMA" (ms).
+
+The managed runtime serves one request per execution environment; here all
+workers share one process, so module-level caches behave like a single warm
+environment (--no-caches turns them off).
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "lambda"))
+sys.path.insert(0, os.path.join(ROOT, "public_api"))
+# The shared modules, as the Lambda layer puts them on the path
+sys.path.insert(0, os.path.join(ROOT, "layer", "python"))
+
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises"]
+PRODUCTS = ["enterprise support plan", "cloud storage tier", "premium API", "managed database", "security suite"]
+CLAIM_TEMPLATES = [
+    "{company} reported {pct}% revenue growth in {year}.",
+    "The {product} includes {n} hours of dedicated support per month.",
+    "Employees at {company} receive {n} paid vacation days per year.",
+    "{company} guarantees a {n} minute response time for critical outages on the {product}.",
+    "The {product} is available in {n} regions worldwide.",
+    "{company} was founded in {year} and now has {n},000 employees.",
+    "Customers on the {product} get {pct}% uptime under the standard SLA.",
+    "{company} does not store customer data outside the EU for the {product}.",
+]
+# x86 on-demand pricing (us-east-1)
+LAMBDA_USD_PER_GB_SECOND = 0.0000166667
+LAMBDA_USD_PER_REQUEST = 0.0000002
+
+FILLER = (
+    "policy customers region pricing billing business hours escalation engineer service account contract "
+    "renewal invoice portal ticket severity managed network storage compute tier standard premium onboarding"
+).split()
+
+
+# -------- Latency --------
+class Latency:
+    def __init__(self, spec):
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution {spec!r}")
+        self.kind = kind
+        self.values = values
+        self.spec = spec
+
+    def sample(self, rng=random):
+        """Seconds."""
+        if self.kind == "fixed":
+            ms = self.values[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.values[0], self.values[1])
+        else:
+            ms = self.values[0] * math.exp(rng.gauss(0.0, self.values[1]))
+        return max(0.0, ms) / 1000
+
+    def sleep(self):
+        time.sleep(self.sample())
+
+
+# -------- Corpus --------
+def synthetic_claims(n, repeat_rate, seed):
+    rng = random.Random(seed)
+    claims = []
+    for _ in range(n):
+        if claims and rng.random() < repeat_rate:
+            claims.append(rng.choice(claims))
+            continue
+        claims.append(
+            rng.choice(CLAIM_TEMPLATES).format(
+                company=rng.choice(COMPANIES),
+                product=rng.choice(PRODUCTS),
+                pct=rng.randint(2, 99),
+                n=rng.randint(2, 60),
+                year=rng.randint(1990, 2025),
+            )
+        )
+    return claims
+
+
+def passage(claim, seed, words=160):
+    """A chunk that mentions some of the claim's words among filler, like a real retrieved passage."""
+    rng = random.Random(seed)
+    claim_words = re.findall(r"\w+", claim)
+    out = [rng.choice(FILLER) for _ in range(words)]
+    for word in claim_words:
+        if rng.random() < 0.7:
+            out[rng.randrange(words)] = word
+    return " ".join(out) + "."
+
+
+def label_for(claim):
+    return ("INTERNAL_TRUE", "INTERNAL_MISINFO", "INTERNAL_UNSURE")[zlib.crc32(claim.encode("utf-8")) % 3]
+
+
+# -------- Stubs --------
+class StubAgentRuntime:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration):
+        self.latency.sleep()
+        claim = retrievalQuery["text"]
+        top_k = retrievalConfiguration["vectorSearchConfiguration"]["numberOfResults"]
+        seed = zlib.crc32(f"{knowledgeBaseId}:{claim}".encode("utf-8"))
+        rng = random.Random(seed)
+        scores = sorted((rng.uniform(0.05, 0.9) for _ in range(top_k)), reverse=True)
+        return {
+            "retrievalResults": [
+                {
+                    "content": {"text": passage(claim, seed + i)},
+                    "score": score,
+                    "location": {"s3Location": {"uri": f"s3://{knowledgeBaseId}/doc-{(seed + i) % 50}.txt"}},
+                }
+                for i, score in enumerate(scores)
+            ]
+        }
+
+
+class StubBedrockAgent:
+    """KB version checks: one data source whose latest ingestion job never changes."""
+
+    def list_data_sources(self, knowledgeBaseId):
+        return {"dataSourceSummaries": [{"dataSourceId": "ds-bench"}]}
+
+    def list_ingestion_jobs(self, **kwargs):
+        return {"ingestionJobSummaries": [{"ingestionJobId": "job-1"}]}
+
+
+class StubThrottled(Exception):
+    """Shaped like botocore's ClientError for a ThrottlingException."""
+
+    def __init__(self):
+        super().__init__("ThrottlingException: Too many requests")
+        self.response = {"Error": {"Code": "ThrottlingException"}}
+
+
+class StubBedrockRuntime:
+    def __init__(self, latency, capacity=0):
+        self.latency = latency
+        # Calls beyond `capacity` in flight are throttled, like a saturated account quota (0 = unlimited)
+        self.capacity = capacity
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def admit(self):
+        with self._lock:
+            if self.capacity and self.inflight >= self.capacity:
+                raise StubThrottled()
+            self.inflight += 1
+
+    def done(self):
+        with self._lock:
+            self.inflight -= 1
+
+    @staticmethod
+    def answer(prompt):
+        claims = re.findall(r"=== CLAIM (\d+) ===\n(.*)", prompt)
+        if claims:
+            return json.dumps([
+                {"claim_id": int(i), "label": label_for(c), "confidence": 0.85, "rationale": "Stub rationale.",
+                 "citations": [{"chunk_id": 1, "supports": label_for(c) == "INTERNAL_TRUE"}]}
+                for i, c in claims
+            ])
+        claim = re.search(r"CLAIM:\n(.*)", prompt)
+        label = label_for(claim.group(1) if claim else prompt)
+        return json.dumps({"label": label, "confidence": 0.85, "rationale": "Stub rationale.",
+                           "citations": [{"chunk_id": 1, "supports": label == "INTERNAL_TRUE"}]})
+
+    def converse(self, modelId, messages, inferenceConfig):
+        self.admit()
+        try:
+            self.latency.sleep()
+        finally:
+            self.done()
+        prompt = messages[0]["content"][0]["text"]
+        text = self.answer(prompt)
+        return {
+            "output": {"message": {"content": [{"text": text}]}},
+            "usage": {"inputTokens": len(prompt) // 4, "outputTokens": len(text) // 4},
+        }
+
+    def converse_stream(self, modelId, messages, inferenceConfig):
+        """converse()'s answer in 24-character pieces spread over the same latency."""
+        self.admit()
+        prompt = messages[0]["content"][0]["text"]
+        text = self.answer(prompt)
+        pieces = [text[i:i + 24] for i in range(0, len(text), 24)]
+        pause = self.latency.sample() / len(pieces)
+
+        def events():
+            try:
+                for piece in pieces:
+                    time.sleep(pause)
+                    yield {"contentBlockDelta": {"delta": {"text": piece}, "contentBlockIndex": 0}}
+            finally:
+                self.done()
+            yield {"metadata": {"usage": {"inputTokens": len(prompt) // 4, "outputTokens": len(text) // 4}}}
+
+        return {"stream": events()}
+
+
+class StubLambda:
+    """
+    lambda_client.invoke → the target module's handler, in-process, after the
+    invoke overhead. Tallies the downstream functions' billed GB-ms.
+    """
+
+    def __init__(self, latency, handlers, memory_mb):
+        self.latency = latency
+        self.handlers = handlers
+        self.memory_mb = memory_mb
+        self.invocations = 0
+        self.gb_ms = 0.0
+        self._lock = threading.Lock()
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.latency.sleep()
+        started = time.perf_counter()
+        result = self.handlers[FunctionName](json.loads(Payload), None)
+        billed_ms = math.ceil((time.perf_counter() - started) * 1000)
+        with self._lock:
+            self.invocations += 1
+            self.gb_ms += billed_ms * self.memory_mb[FunctionName] / 1024
+        return {"Payload": io.BytesIO(json.dumps(result).encode("utf-8"))}
+
+    def reset(self):
+        with self._lock:
+            self.invocations, self.gb_ms = 0, 0.0
+
+
+class StreamClient:
+    """
+    The orchestrator's stream mode driven like a client: start the check, then
+    poll until the verdict, which is returned as the response body. Records
+    the time to the first evidence event of each check.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.evidence_ms = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event, context):
+        started = time.perf_counter()
+        response = self.handler(event, context)
+        if response.get("statusCode") != 202:
+            # Screened out by the claim filter: answered directly
+            return response
+        stream_id = json.loads(response["body"])["streamId"]
+        after, evidence = 0, False
+        while True:
+            polled = self.handler({"body": json.dumps({"streamId": stream_id, "after": after})}, context)
+            if polled.get("statusCode") != 200:
+                return polled
+            data = json.loads(polled["body"])
+            for item in data["events"]:
+                if item["event"] == "evidence" and not evidence:
+                    evidence = True
+                    with self._lock:
+                        self.evidence_ms.append((time.perf_counter() - started) * 1000)
+                elif item["event"] == "verdict":
+                    return {"statusCode": 200, "body": json.dumps(item["response"])}
+                elif item["event"] == "error":
+                    return {"statusCode": 502, "body": json.dumps(item)}
+            after = data["next"]
+
+
+class StubGeminiPool:
+    """Stands in for public_api.lambda_handler.gemini_http (an HTTPPool)."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    @staticmethod
+    def answer(body):
+        prompt = json.loads(body)["contents"][0]["parts"][0]["text"]
+        seed = zlib.crc32(prompt.encode("utf-8"))
+        citations = [
+            {"source": f"Source {i}", "url": f"https://example.com/{seed % 997}/{i}",
+             "snippet": passage(prompt, seed + i, 30), "stance": ("support", "contradict", "neutral")[(seed + i) % 3]}
+            for i in range(seed % 4 + 1)
+        ]
+        usage = {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": 60 * len(citations)}
+        return citations, usage
+
+    def request(self, method, path, body=None, headers=None, deadline=None):
+        self.latency.sleep()
+        citations, usage = self.answer(body)
+        data = {"candidates": [{"content": {"parts": [{"text": json.dumps(citations)}]}}], "usageMetadata": usage}
+        return 200, {}, json.dumps(data).encode("utf-8")
+
+    @contextlib.contextmanager
+    def stream(self, method, path, body=None, headers=None, deadline=None):
+        """SSE like streamGenerateContent: first chunk at 40% of the latency, one citation per chunk up to 90%."""
+        total = self.latency.sample()
+        citations, usage = self.answer(body)
+        pieces = [json.dumps(c) for c in citations]
+        fragments = ["[" + ", ".join(pieces[:1])] + [", " + p for p in pieces[1:]]
+        fragments[-1] += "]"
+
+        def lines():
+            time.sleep(total * 0.4)
+            for i, fragment in enumerate(fragments):
+                if i:
+                    time.sleep(total * 0.5 / len(fragments))
+                chunk = {"candidates": [{"content": {"parts": [{"text": fragment}]}}]}
+                yield b"data: " + json.dumps(chunk).encode("utf-8") + b"\r\n"
+                yield b"\r\n"
+            time.sleep(total * 0.1)
+            yield b"data: " + json.dumps({"candidates": [], "usageMetadata": usage}).encode("utf-8") + b"\r\n"
+
+        yield 200, {}, lines()
+
+    def close(self):
+        pass
+
+
+class StubUrlProbe:
+    """Stands in for public_api.lambda_handler.citation_checker.probe; about one URL in ten is dead."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def __call__(self, url):
+        await asyncio.sleep(self.latency.sample())
+        return "dead" if zlib.crc32(url.encode("utf-8")) % 10 == 0 else "live"
+
+
+class StubBackboardClient:
+    def __init__(self, latency):
+        self.latency = latency
+        self._threads = 0
+        self._lock = threading.Lock()
+
+    async def create_thread(self, assistant_id):
+        await asyncio.sleep(self.latency.sample() / 4)
+        with self._lock:
+            self._threads += 1
+            return type("Thread", (), {"thread_id": f"thread-{self._threads}"})()
+
+    async def add_message(self, thread_id, content):
+        await asyncio.sleep(self.latency.sample())
+        payload = json.loads(content)
+        confidence = round(((zlib.crc32(payload["claim"].encode("utf-8")) % 200) - 100) / 100, 2)
+        body = {"citations": payload["citations"], "confidence": confidence, "summary": "Stub evaluation."}
+        return type("Message", (), {"content": json.dumps(body)})()
+
+
+# -------- Setup --------
+def configure_env(args):
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("MODEL_ID", "bench-model")
+    os.environ.setdefault("KB_AWS_ID", "kb-bench")
+    os.environ["TRACE_METRICS"] = "on" if args.metrics else "off"
+    os.environ["INVOKE_BACKEND"] = args.invoke_backend
+    if args.no_caches:
+        os.environ.update(VERDICT_CACHE_BACKEND="none", SIMILARITY_CACHE_MAX_ENTRIES="0", RETRIEVAL_CACHE_MAX_BYTES="0")
+
+
+def install_stubs(args):
+    """Imports the handlers and points every backend at a stub. Returns (orchestrator, internal, public)."""
+    import factCheckerFunction as orchestrator
+    import factcheck_internal_check as internal
+    import lambda_handler as public
+
+    kb_client = StubAgentRuntime(Latency(args.retrieve_latency))
+    br_client = StubBedrockRuntime(Latency(args.converse_latency), args.converse_capacity)
+    internal.get_kb_client = lambda: kb_client
+    internal.get_br_client = lambda: br_client
+    internal.kb_versions._client = StubBedrockAgent()
+
+    public.gemini_http = StubGeminiPool(Latency(args.gemini_latency))
+    backboard = StubBackboardClient(Latency(args.backboard_latency))
+    public.get_backboard_client = lambda: backboard
+    public.citation_checker.probe = StubUrlProbe(Latency(args.head_latency))
+
+    # Unused with --invoke-backend local, where the orchestrator calls the handlers itself
+    lambda_client = StubLambda(
+        Latency(args.invoke_latency),
+        {
+            orchestrator.INTERNAL_FUNCTION_NAME: internal.lambda_handler,
+            orchestrator.PUBLIC_FUNCTION_NAME: public.lambda_handler,
+        },
+        {
+            orchestrator.INTERNAL_FUNCTION_NAME: args.internal_memory_mb,
+            orchestrator.PUBLIC_FUNCTION_NAME: args.public_memory_mb,
+        },
+    )
+    orchestrator.get_lambda_client = lambda: lambda_client
+    return orchestrator, internal, public
+
+
+def make_events(target, claims, args):
+    """API-Gateway-shaped events for the chosen handler."""
+    groups = [claims[i:i + args.batch_size] for i in range(0, len(claims), args.batch_size)] if args.batch_size > 1 else None
+    if target == "orchestrator":
+        if groups:
+            return [{"body": json.dumps({"claims": g, "affiliation": args.company})} for g in groups]
+        extra = {"stream": True} if args.stream else {}
+        return [{"body": json.dumps({"text": c, "affiliation": args.company, **extra})} for c in claims]
+    if target == "internal":
+        if groups:
+            return [{"body": json.dumps({"texts": g, "company": args.company})} for g in groups]
+        return [{"body": json.dumps({"text": c, "company": args.company})} for c in claims]
+    return [{"body": json.dumps({"claim": c})} for c in claims]
+
+
+# -------- Measurement --------
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def run_load(handler, events, concurrency):
+    """
+    Returns (latencies_ms, counts, wall_seconds). counts has errors, shed ("retry
+    later" answers) and coalesced (answers shared from another in-flight check).
+    """
+    latencies, counts = [], {"errors": 0, "shed": 0, "coalesced": 0}
+    lock = threading.Lock()
+
+    def one(event):
+        started = time.perf_counter()
+        try:
+            response = handler(event, None)
+            ok = response.get("statusCode") == 200
+            body = response.get("body") or ""
+            shed = '"retryAfter"' in body
+            coalesced = (response.get("headers") or {}).get("X-Coalesced") in ("follower", "shared") or '"coalesced": "' in body
+        except Exception:
+            ok, shed, coalesced = False, False, False
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            counts["errors"] += not ok
+            counts["shed"] += shed
+            counts["coalesced"] += coalesced
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, events))
+    return latencies, counts, time.perf_counter() - started
+
+
+def measure_allocations(handler, events):
+    """Mean tracemalloc high-water and retained bytes per request, sequentially."""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for event in events:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            handler(event, None)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.mean(peaks), statistics.mean(retained)
+
+
+def usd_per_1k(latencies, memory_mb, downstream):
+    """Lambda compute + request charges per 1000 requests, including downstream invokes."""
+    gb_ms = sum(math.ceil(ms) for ms in latencies) * memory_mb / 1024
+    invocations = len(latencies)
+    if downstream:
+        gb_ms += downstream.gb_ms
+        invocations += downstream.invocations
+    usd = gb_ms / 1000 * LAMBDA_USD_PER_GB_SECOND + invocations * LAMBDA_USD_PER_REQUEST
+    return usd / max(1, len(latencies)) * 1000, invocations / max(1, len(latencies))
+
+
+def benchmark(handler, warmup, measured, alloc, args, label, memory_mb, downstream=None):
+    for event in warmup:
+        handler(event, None)
+    evidence_ms = getattr(handler, "evidence_ms", None)
+    if evidence_ms is not None:
+        evidence_ms.clear()
+
+    if downstream:
+        downstream.reset()
+    gen0_before = gc.get_stats()[0]["collections"]
+    latencies, counts, wall = run_load(handler, measured, args.concurrency)
+    gen0 = gc.get_stats()[0]["collections"] - gen0_before
+    evidence = sorted(evidence_ms) if evidence_ms else None
+    cost, invocations = usd_per_1k(latencies, memory_mb, downstream)
+    peak, retained = measure_allocations(handler, alloc) if alloc else (0.0, 0.0)
+
+    latencies.sort()
+    return {
+        "target": label,
+        "requests": len(latencies),
+        "errors": counts["errors"],
+        "shed": counts["shed"],
+        "coalesced": counts["coalesced"],
+        "concurrency": args.concurrency,
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "invocations_per_request": round(invocations, 2),
+        "usd_per_1k_requests": round(cost, 5),
+        "peak_alloc_kib_per_request": round(peak / 1024, 1),
+        "retained_bytes_per_request": round(retained),
+        "gen0_gcs_per_request": round(gen0 / max(1, len(latencies)), 3),
+        "evidence_p50_ms": round(percentile(evidence, 0.50), 2) if evidence else None,
+        "evidence_p95_ms": round(percentile(evidence, 0.95), 2) if evidence else None,
+    }
+
+
+def report(result):
+    print(
+        f"{result['target']:<14} n={result['requests']:<5} err={result['errors']:<3} shed={result['shed']:<3} "
+        f"coalesced={result['coalesced']:<3} c={result['concurrency']:<3} "
+        f"{result['throughput_rps']:8.1f} req/s  p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms "
+        f"p99={result['p99_ms']:8.2f}ms  peak={result['peak_alloc_kib_per_request']:7.1f}KiB/req "
+        f"retained={result['retained_bytes_per_request']}B/req gen0={result['gen0_gcs_per_request']}/req "
+        f"invokes={result['invocations_per_request']}/req ${result['usd_per_1k_requests']:.5f}/1k"
+        + (f"  evidence p50={result['evidence_p50_ms']:.2f}ms p95={result['evidence_p95_ms']:.2f}ms"
+           if result["evidence_p50_ms"] is not None else "")
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=["orchestrator", "internal", "public", "all"], default="all")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1, help="claims per request (orchestrator/internal)")
+    parser.add_argument("--company", default="aws")
+    parser.add_argument("--claims-file", help="one claim per line; default is a synthetic corpus")
+    parser.add_argument("--repeat-rate", type=float, default=0.2, help="share of synthetic claims that repeat")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--alloc-requests", type=int, default=50, help="requests in the tracemalloc pass (0 skips)")
+    parser.add_argument("--no-caches", action="store_true", help="disable verdict, similarity and retrieval caches")
+    parser.add_argument("--metrics", action="store_true", help="keep the handlers' EMF log lines")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--retrieve-latency", default="lognormal:120,0.3")
+    parser.add_argument("--converse-latency", default="lognormal:900,0.4")
+    parser.add_argument("--converse-capacity", type=int, default=0, help="throttle converse calls beyond this many in flight")
+    parser.add_argument("--gemini-latency", default="lognormal:1200,0.4")
+    parser.add_argument("--backboard-latency", default="lognormal:1500,0.4")
+    parser.add_argument("--head-latency", default="lognormal:150,0.6")
+    parser.add_argument("--invoke-latency", default="lognormal:25,0.5")
+    parser.add_argument("--invoke-backend", choices=["remote", "local"], default="remote",
+                        help="orchestrator reaches the other handlers via Lambda invoke or in-process calls")
+    parser.add_argument("--orchestrator-memory-mb", type=int, default=512)
+    parser.add_argument("--internal-memory-mb", type=int, default=512)
+    parser.add_argument("--public-memory-mb", type=int, default=256)
+    parser.add_argument("--stream", action="store_true", help="orchestrator requests are streamed checks, polled to the verdict")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.stream and args.batch_size > 1:
+        parser.error("--stream checks one claim per request")
+    configure_env(args)
+    orchestrator, internal, public = install_stubs(args)
+
+    total = args.warmup + args.requests
+    if args.claims_file:
+        with open(args.claims_file, "r", encoding="utf-8") as f:
+            corpus = [line.strip() for line in f if line.strip()]
+        claims = [corpus[i % len(corpus)] for i in range(total + args.alloc_requests)]
+    else:
+        claims = synthetic_claims(total, args.repeat_rate, args.seed)
+    warmup, measured = claims[:args.warmup], claims[args.warmup:total]
+
+    def alloc_claims(idx):
+        # Claims no earlier pass has seen (the orchestrator pass also warms the other two handlers),
+        # so the allocation pass measures the uncached path
+        if args.claims_file:
+            return claims[total:]
+        return synthetic_claims(args.alloc_requests, 0.0, args.seed + 1 + idx)
+
+    handlers = {
+        "orchestrator": StreamClient(orchestrator.lambda_handler) if args.stream else orchestrator.lambda_handler,
+        "internal": internal.lambda_handler,
+        "public": public.lambda_handler,
+    }
+    memory_mb = {
+        "orchestrator": args.orchestrator_memory_mb,
+        "internal": args.internal_memory_mb,
+        "public": args.public_memory_mb,
+    }
+    targets = list(handlers) if args.target == "all" else [args.target]
+    results = [
+        benchmark(
+            handlers[t],
+            make_events(t, warmup, args),
+            make_events(t, measured, args),
+            make_events(t, alloc_claims(idx), args),
+            args,
+            t,
+            memory_mb[t],
+            orchestrator.get_lambda_client() if t == "orchestrator" else None,
+        )
+        for idx, t in enumerate(targets)
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            report(result)
+
+
+if __name__ == "__main__":
+    main()
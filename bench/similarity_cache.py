@@ -0,0 +1,78 @@
+"""
+Regression check for the near-duplicate verdict cache.
+
+Stores one claim, looks up a rewording, and checks the cache answers only
+when the meaning can't have changed (exit status 1 if not). Then times
+lookups against a full cache.
+
+    python bench/similarity_cache.py
+    python bench/similarity_cache.py --entries 4096 --repeat 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layer", "python"))
+
+import similarity_cache  # noqa: E402
+
+THRESHOLD = 0.9
+
+# (stored claim, lookup, should the cached verdict be reused)
+PAIRS = [
+    ("Employees can expense home office equipment.", "Employees cannot expense home office equipment.", False),
+    ("Employees can expense home office equipment.", "Employees can't expense home office equipment.", False),
+    ("Revenue increased five percent in 2023.", "Revenue decreased five percent in 2023.", False),
+    ("Contractors are eligible for the annual bonus.", "Contractors are ineligible for the annual bonus.", False),
+    ("The feature is available in the EU region.", "The feature is unavailable in the EU region.", False),
+    ("Managers approve expense reports.", "Managers disapprove expense reports.", False),
+    ("The refund window is 30 days.", "The refund window is 60 days.", False),
+    ("The refund window is 30 days.", "The refund window is not 30 days.", False),
+    ("Support is available on weekdays.", "Support is available on weekends.", False),
+    ("The free tier includes the maximum storage quota.", "The free tier includes the minimum storage quota.", False),
+    ("Data is encrypted at rest.", "Data is encrypted in transit.", False),
+    ("The dog bit the man.", "The man bit the dog.", False),
+    ("The basic plan has 5 seats and the pro plan has 50 seats.",
+     "The basic plan has 50 seats and the pro plan has 5 seats.", False),
+    ("Interns get 10 days off and staff get 25 days off.", "Interns get 25 days off and staff get 10 days off.", False),
+    ("The refund window is 30 days.", "the refund window is 30 days", True),
+    ("The refund window is 30 days.", "The refund window is 30 days!", True),
+    ("Employees get 20 days of PTO.", "Employees get 20 days PTO.", True),
+    ("Acme employs 4,000 people.", "Acme employs 4000 people.", True),
+    ("Customers receive a discount on renewals.", "Customers receive a discount on renewal.", True),
+]
+
+
+def verify():
+    failures = 0
+    for stored, lookup, want in PAIRS:
+        cache = similarity_cache.SimilarityCache(16, 60, THRESHOLD)
+        cache.store("ns", stored, {"label": "supported"})
+        got = cache.lookup("ns", lookup) is not None
+        failures += got != want
+        print(f"{'ok' if got == want else 'FAIL':<5} {'hit' if want else 'miss':<5} {stored!r} -> {lookup!r}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    failures = verify()
+
+    cache = similarity_cache.SimilarityCache(args.entries, 3600, THRESHOLD)
+    for i in range(args.entries):
+        cache.store("ns", f"Product line {i} shipped {i % 97} units in region {i % 13} last quarter", {"i": i})
+    started = time.perf_counter()
+    for i in range(args.repeat):
+        cache.lookup("ns", f"product line {i} shipped {i % 97} units in region {i % 13} last quarter!")
+    micros = (time.perf_counter() - started) / args.repeat * 1e6
+    print(f"\nlookup against {args.entries} entries: {micros:.1f} us")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
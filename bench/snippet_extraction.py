@@ -0,0 +1,108 @@
+"""
+Microbenchmark for match-snippet extraction in the internal checker.
+
+Compares the previous per-token str.find anchoring (re-tokenizing the claim
+for every chunk) with the precomputed ClaimMatcher (one regex pass per chunk,
+densest-window anchoring), over one request's worth of chunks.
+
+    python bench/snippet_extraction.py
+    python bench/snippet_extraction.py --top-k 5 25 100 --chunk-chars 1000 4000 10000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+os.environ.setdefault("MODEL_ID", "bench")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
+# The shared modules, as the Lambda layer puts them on the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "layer", "python"))
+
+import factcheck_internal_check as checker  # noqa: E402
+
+CLAIM = "Our enterprise support plan guarantees a fifteen minute response time for critical production outages worldwide"
+# Roughly one word in ten overlaps the claim, as in a real retrieved chunk
+VOCAB = (
+    "the a of to and in for on with is are be by as at or this that from customers region pricing billing "
+    "business hours escalation engineer service account contract renewal invoice portal ticket severity "
+    "managed cloud network storage compute tier standard premium basic onboarding training documentation "
+    "support plan response critical outages"
+).split()
+
+
+def legacy_snippet(claim, chunk_text, max_chars):
+    claim = checker.normalize(claim).lower()
+    text = checker.normalize(chunk_text)
+    if not text:
+        return ""
+
+    low = text.lower()
+    tokens = [t for t in re.findall(r"[a-z0-9]{4,}", claim) if t not in {"this", "that", "with", "from", "have", "uses"}]
+    anchor_pos = -1
+    for t in tokens[:12]:
+        p = low.find(t)
+        if p != -1:
+            anchor_pos = p
+            break
+
+    if anchor_pos == -1:
+        return text[:max_chars]
+
+    start = max(0, anchor_pos - max_chars // 2)
+    end = min(len(text), start + max_chars)
+    snippet = text[start:end].strip()
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet = snippet + "…"
+    return snippet
+
+
+def make_chunks(top_k, chunk_chars, rng):
+    chunks = []
+    for _ in range(top_k):
+        words, size = [], 0
+        while size < chunk_chars:
+            word = rng.choice(VOCAB)
+            words.append(word)
+            size += len(word) + 1
+        chunks.append(" ".join(words)[:chunk_chars])
+    return chunks
+
+
+def run(fn, chunks, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in chunks:
+            fn(text)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 25, 100])
+    parser.add_argument("--chunk-chars", type=int, nargs="+", default=[1000, 4000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    max_chars = checker.MATCH_SNIPPET_CHARS
+    print(f"{'top_k':>5} {'chunk':>6} {'legacy ms':>10} {'matcher ms':>11} {'speedup':>8}")
+    for top_k in args.top_k:
+        for chunk_chars in args.chunk_chars:
+            chunks = make_chunks(top_k, chunk_chars, rng)
+            legacy = run(lambda t: legacy_snippet(CLAIM, t, max_chars), chunks, args.repeat)
+
+            def current(t):
+                checker.extract_match_snippet(CLAIM, t, max_chars)
+
+            # Measure the per-request cost, including building the matcher once
+            checker.claim_matcher.cache_clear()
+            matcher = run(current, chunks, args.repeat)
+            print(f"{top_k:>5} {chunk_chars:>6} {legacy:>10.3f} {matcher:>11.3f} {legacy / matcher:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,1020 @@
+import contextlib
+import fcntl
+import functools
+import hashlib
+import importlib
+import itertools
 import json
-import boto3
-from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from event_stream import StreamWriter, build_stream_store
+from tracing import Trace
+
+# -------- ENV --------
+# memory = in-process LRU only; dynamodb = in-process LRU in front of a shared table; none = disabled
+VERDICT_CACHE_BACKEND = os.environ.get("VERDICT_CACHE_BACKEND", "memory").lower()
+VERDICT_CACHE_TTL = int(os.environ.get("VERDICT_CACHE_TTL", "3600"))
+VERDICT_CACHE_UNKNOWN_TTL = int(os.environ.get("VERDICT_CACHE_UNKNOWN_TTL", "60"))
+VERDICT_CACHE_MAX_ENTRIES = int(os.environ.get("VERDICT_CACHE_MAX_ENTRIES", "2048"))
+VERDICT_CACHE_TABLE = os.environ.get("VERDICT_CACHE_TABLE", "")
+# Point at DynamoDB Local (or any compatible stand-in) when running outside AWS
+VERDICT_CACHE_ENDPOINT_URL = os.environ.get("VERDICT_CACHE_ENDPOINT_URL") or None
+
+# Single-flight: concurrent checks of the same claim + affiliation share one computation (off disables)
+COALESCE = os.environ.get("COALESCE", "on").lower()
+# "" = within this execution environment; dynamodb or file (local stand-in) = also across environments
+COALESCE_SHARED = os.environ.get("COALESCE_SHARED", "").lower()
+COALESCE_TABLE = os.environ.get("COALESCE_TABLE", "") or VERDICT_CACHE_TABLE
+COALESCE_DIR = os.environ.get("COALESCE_DIR", "/tmp/factcheck-flights")
+# A leader that dies keeps others waiting at most this long; its published result is reused for as long
+COALESCE_LEASE_SECONDS = int(os.environ.get("COALESCE_LEASE_SECONDS", "30"))
+COALESCE_WAIT_SECONDS = float(os.environ.get("COALESCE_WAIT_SECONDS", "25"))
+COALESCE_POLL_SECONDS = float(os.environ.get("COALESCE_POLL_SECONDS", "0.1"))
+
+# race = return as soon as the internal check is decisive; wait = always wait for both Lambdas
+FANOUT_MODE = os.environ.get("FANOUT_MODE", "race").lower()
+PUBLIC_FUNCTION_NAME = os.environ.get("PUBLIC_FUNCTION_NAME", "factCheckerFinalFinalFinal")
+INTERNAL_FUNCTION_NAME = os.environ.get("INTERNAL_FUNCTION_NAME", "factcheck-internal-db")
+# When the internal answer wins while the public check is still running, tell it to skip its
+# evaluation: directly with the local invoke backend, otherwise with a marker item in this table
+# (verdict cache schema; the public function reads it from its own SETTLE_TABLE; "" = remote checks run on)
+SETTLE_TABLE = os.environ.get("SETTLE_TABLE", "")
+
+# remote = lambda_client.invoke each downstream check; local = import the internal and public
+# handlers into this process (deploy their modules alongside this one) and call them directly
+INVOKE_BACKEND = os.environ.get("INVOKE_BACKEND", "remote").lower()
+LOCAL_INTERNAL_MODULE = os.environ.get("LOCAL_INTERNAL_MODULE", "factcheck_internal_check")
+LOCAL_PUBLIC_MODULE = os.environ.get("LOCAL_PUBLIC_MODULE", "lambda_handler")
+
+# Check-worthiness pre-filter: pastes with no sentence scoring at least CLAIM_MIN_SCORE are answered
+# "NOT A CLAIM" without touching the pipeline (off disables). Only links, code, single words, questions
+# and chat score below the default, so an ordinary statement is always checked
+CLAIM_FILTER = os.environ.get("CLAIM_FILTER", "on").lower()
+CLAIM_MIN_SCORE = float(os.environ.get("CLAIM_MIN_SCORE", "0.4"))
+CLAIM_MIN_WORDS = int(os.environ.get("CLAIM_MIN_WORDS", "2"))
+# Stop scoring a long paste after this many sentences with nothing worth checking
+CLAIM_FILTER_MAX_SENTENCES = int(os.environ.get("CLAIM_FILTER_MAX_SENTENCES", "40"))
+
+BATCH_MAX_CLAIMS = int(os.environ.get("BATCH_MAX_CLAIMS", "50"))
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "8"))
+# Threads for downstream invokes, shared by every check: an internal and a public invoke per batch worker
+INVOKE_MAX_WORKERS = int(os.environ.get("INVOKE_MAX_WORKERS", str(2 * BATCH_MAX_WORKERS)))
+
+# Streamed checks ({"stream": true}) answer 202 with a streamId at once and run the check in the
+# background; the client polls {"streamId": ..., "after": n} for its events. They travel through this
+# table (verdict cache schema, shared with the internal function's STREAM_TABLE) so the run, the
+# internal check and each poll can land in different environments. "" = in-process only: local
+# runs and the local invoke backend, never a deployed function (it is frozen between invocations)
+STREAM_TABLE = os.environ.get("STREAM_TABLE", "")
+STREAM_TTL = int(os.environ.get("STREAM_TTL", "600"))
+STREAM_ENDPOINT_URL = os.environ.get("STREAM_ENDPOINT_URL") or VERDICT_CACHE_ENDPOINT_URL
+# Longest a poll waits for a new event before answering with none
+STREAM_POLL_WAIT = float(os.environ.get("STREAM_POLL_WAIT", "1"))
+# With a table, the check runs in an async invoke of this function (needs lambda:InvokeFunction on itself)
+STREAM_FUNCTION_NAME = os.environ.get("STREAM_FUNCTION_NAME") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "")
+
+RESPONSE_HEADERS = {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}
+
+# boto3 is imported with the first client, so a cold start that ends at the claim filter
+# or in the in-process verdict cache never loads it
+@functools.lru_cache(maxsize=None)
+def aws_client(service, endpoint_url=None):
+    import boto3
+
+    return boto3.client(service, endpoint_url=endpoint_url)
+
+def get_lambda_client():
+    return aws_client('lambda')
+
+def start_trace(event, body):
+    """Reuses the caller's X-Trace-Id (or API Gateway's request id) and records time spent before the handler."""
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    request_context = event.get('requestContext') or {}
+    trace = Trace(
+        "orchestrator",
+        headers.get('x-trace-id') or body.get('traceId') or request_context.get('requestId'),
+        detail=bool(body.get('timings')),
+    )
+    # HTTP APIs send timeEpoch, REST APIs requestTimeEpoch; the gap covers API Gateway and any cold start
+    received_ms = request_context.get('timeEpoch') or request_context.get('requestTimeEpoch')
+    if received_ms:
+        trace.add("gateway", max(0.0, time.time() * 1000 - float(received_ms)))
+    return trace
+
+
+def with_trace(response, trace):
+    response = dict(response)
+    response["headers"] = {**response.get("headers", RESPONSE_HEADERS), "X-Trace-Id": trace.trace_id}
+    if trace.detail and response["headers"].get("Content-Type") == "application/json":
+        response["body"] = json.dumps({**json.loads(response["body"]), "timings": trace.summary()})
+    return response
+
+# -------- Verdict Cache --------
+class MemoryVerdictCache:
+    """In-process LRU with per-entry TTL. Survives across warm invocations."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DynamoVerdictCache:
+    """Shared cache in a DynamoDB table (partition key `cache_key`, TTL attribute `expires_at`).
+
+    Values are the JSON response bodies, stored as strings.
+    """
+
+    def __init__(self, table, endpoint_url=None):
+        self.table = table
+        self._client = aws_client('dynamodb', endpoint_url)
+
+    def get(self, key):
+        """(value, expires_at), or None on a miss."""
+        item = self._client.get_item(TableName=self.table, Key={"cache_key": {"S": key}}).get("Item")
+        if not item:
+            return None
+        # DynamoDB TTL deletion is lazy, so expired items can still be returned
+        expires_at = int(item["expires_at"]["N"])
+        if expires_at <= time.time():
+            return None
+        return item["value"]["S"], expires_at
+
+    def set(self, key, value, ttl):
+        self._client.put_item(
+            TableName=self.table,
+            Item={
+                "cache_key": {"S": key},
+                "value": {"S": value},
+                "expires_at": {"N": str(int(time.time() + ttl))},
+            },
+        )
+
+
+class TieredVerdictCache:
+    """Local LRU in front of a shared backend. Shared backend errors are logged, never raised."""
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        try:
+            hit = self.shared.get(key)
+        except Exception as e:
+            print("Verdict cache read error:", repr(e))
+            return None
+        if hit is None:
+            return None
+        value, expires_at = hit
+        # Keep the shared item's TTL, so a short-lived UNKNOWN verdict isn't held for VERDICT_CACHE_TTL
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            self.local.set(key, value, ttl)
+        return value
+
+    def set(self, key, value, ttl):
+        self.local.set(key, value, ttl)
+        try:
+            self.shared.set(key, value, ttl)
+        except Exception as e:
+            print("Verdict cache write error:", repr(e))
+
+
+def build_verdict_cache(backend):
+    if backend == "none":
+        return None
+    local = MemoryVerdictCache(VERDICT_CACHE_MAX_ENTRIES)
+    if backend == "dynamodb":
+        if not VERDICT_CACHE_TABLE:
+            raise RuntimeError("VERDICT_CACHE_TABLE is not set")
+        return TieredVerdictCache(local, DynamoVerdictCache(VERDICT_CACHE_TABLE, VERDICT_CACHE_ENDPOINT_URL))
+    return local
+
+
+verdict_cache = build_verdict_cache(VERDICT_CACHE_BACKEND)
+cache_stats = {"hits": 0, "misses": 0}
+
+
+# -------- Single-flight --------
+class SingleFlight:
+    """
+    In-process single-flight: the first caller for a key runs the check, and
+    callers arriving while it is in flight wait on the same Future.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        """Returns (future, leader). The leader resolves the future, then calls finish(key)."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                return future, False
+            future = self._flights[key] = Future()
+            return future, True
+
+    def finish(self, key):
+        with self._lock:
+            self._flights.pop(key, None)
+
+
+class DynamoFlightStore:
+    """
+    Cross-environment flight lock: an item keyed "flight#<key>" in a table with
+    the verdict cache's schema. The leader takes a lease with a conditional put
+    and later writes the response body into the same item.
+    """
+
+    def __init__(self, table, endpoint_url=None):
+        self.table = table
+        self._client = aws_client('dynamodb', endpoint_url)
+
+    def acquire(self, key, leader_id, lease):
+        now = int(time.time())
+        try:
+            self._client.put_item(
+                TableName=self.table,
+                Item={
+                    "cache_key": {"S": f"flight#{key}"},
+                    "leader_id": {"S": leader_id},
+                    "expires_at": {"N": str(now + lease)},
+                },
+                ConditionExpression="attribute_not_exists(cache_key) OR expires_at < :now",
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+            return True
+        except self._client.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def read(self, key):
+        """Returns (body, live): body once published; live while a lease or published result holds."""
+        item = self._client.get_item(
+            TableName=self.table, Key={"cache_key": {"S": f"flight#{key}"}}, ConsistentRead=True
+        ).get("Item")
+        if not item or int(item["expires_at"]["N"]) <= time.time():
+            return None, False
+        return item.get("value", {}).get("S"), True
+
+    def publish(self, key, leader_id, body, ttl):
+        self._client.put_item(
+            TableName=self.table,
+            Item={
+                "cache_key": {"S": f"flight#{key}"},
+                "leader_id": {"S": leader_id},
+                "value": {"S": body},
+                "expires_at": {"N": str(int(time.time() + ttl))},
+            },
+        )
+
+    def abandon(self, key, leader_id):
+        try:
+            self._client.delete_item(
+                TableName=self.table,
+                Key={"cache_key": {"S": f"flight#{key}"}},
+                ConditionExpression="leader_id = :leader",
+                ExpressionAttributeValues={":leader": {"S": leader_id}},
+            )
+        except self._client.exceptions.ConditionalCheckFailedException:
+            pass
+
+
+class FileFlightStore:
+    """
+    Local stand-in for DynamoFlightStore: one JSON state file per flight in a
+    shared directory (flock guards acquire), so processes on one host coalesce.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _write(self, key, state):
+        tmp = f"{self._path(key)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self._path(key))
+
+    @contextlib.contextmanager
+    def _mutex(self, key):
+        with open(self._path(key) + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _state(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if state["expires_at"] > time.time() else None
+
+    def acquire(self, key, leader_id, lease):
+        with self._mutex(key):
+            if self._state(key) is not None:
+                return False
+            self._write(key, {"leader_id": leader_id, "expires_at": time.time() + lease})
+            return True
+
+    def read(self, key):
+        state = self._state(key)
+        if state is None:
+            return None, False
+        return state.get("value"), True
+
+    def publish(self, key, leader_id, body, ttl):
+        self._write(key, {"leader_id": leader_id, "value": body, "expires_at": time.time() + ttl})
+
+    def abandon(self, key, leader_id):
+        with self._mutex(key):
+            state = self._state(key)
+            if state is not None and state["leader_id"] == leader_id:
+                os.remove(self._path(key))
+
+
+def build_flight_store(backend):
+    if backend == "dynamodb":
+        if not COALESCE_TABLE:
+            raise RuntimeError("COALESCE_TABLE (or VERDICT_CACHE_TABLE) is not set")
+        return DynamoFlightStore(COALESCE_TABLE, VERDICT_CACHE_ENDPOINT_URL)
+    if backend == "file":
+        return FileFlightStore(COALESCE_DIR)
+    return None
+
+
+single_flight = SingleFlight() if COALESCE != "off" else None
+flight_store = build_flight_store(COALESCE_SHARED) if single_flight else None
+coalesce_stats = {"leader": 0, "follower": 0, "shared": 0}
+
+
+def wait_for_flight(key, leader_id):
+    """
+    Takes the shared lock, or waits for the environment holding it. Returns the
+    body that environment published, or None when this caller should run the
+    check itself (it holds the lock, the leader died, or the wait ran out).
+    """
+    deadline = time.monotonic() + COALESCE_WAIT_SECONDS
+    while not flight_store.acquire(key, leader_id, COALESCE_LEASE_SECONDS):
+        while True:
+            body, live = flight_store.read(key)
+            if body is not None:
+                return body
+            if not live:
+                break
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(COALESCE_POLL_SECONDS)
+    return None
+
+
+def shared_flight(key, compute):
+    """compute() under the cross-environment lock. Returns (response, "leader" | "shared")."""
+    if flight_store is None:
+        return compute(), "leader"
+
+    leader_id = uuid.uuid4().hex
+    try:
+        body = wait_for_flight(key, leader_id)
+    except Exception as e:
+        print("Flight lock error:", repr(e))
+        return compute(), "leader"
+    if body is not None:
+        return {"statusCode": 200, "headers": dict(RESPONSE_HEADERS), "body": body}, "shared"
+
+    response = None
+    try:
+        response = compute()
+    finally:
+        try:
+            # Shed answers are not worth handing to other environments
+            if response and response.get("statusCode") == 200 and '"retryAfter"' not in response["body"]:
+                flight_store.publish(key, leader_id, response["body"], COALESCE_LEASE_SECONDS)
+            else:
+                flight_store.abandon(key, leader_id)
+        except Exception as e:
+            print("Flight publish error:", repr(e))
+    return response, "leader"
+
+
+def coalesced_check(key, compute, trace=None):
+    """
+    Single-flight around compute(), which returns a response dict. Returns
+    (response, role): "leader" ran the check, "follower" shared a check in
+    flight in this environment, "shared" reused another environment's result.
+    role is None when coalescing is off.
+    """
+    if single_flight is None:
+        return compute(), None
+
+    future, leader = single_flight.begin(key)
+    if not leader:
+        try:
+            with trace.stage("coalesce") if trace else contextlib.nullcontext():
+                response, role = dict(future.result(timeout=COALESCE_WAIT_SECONDS)), "follower"
+        except FutureTimeout:
+            response, role = compute(), "leader"
+    else:
+        try:
+            response, role = shared_flight(key, compute)
+            future.set_result(response)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            single_flight.finish(key)
+
+    coalesce_stats[role] += 1
+    if trace:
+        trace.count("coalesced", int(role != "leader"))
+    return response, role
+
+
+def normalize_claim(text):
+    return re.sub(r"\s+", " ", (text or "").strip()).lower()
+
+
+def verdict_cache_key(claim, affiliation):
+    raw = f"{normalize_claim(claim)}\x00{normalize_claim(affiliation)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def with_cache_headers(response, status):
+    response = dict(response)
+    response["headers"] = {
+        **response.get("headers", RESPONSE_HEADERS),
+        "X-Verdict-Cache": status,
+        "X-Verdict-Cache-Hits": str(cache_stats["hits"]),
+        "X-Verdict-Cache-Misses": str(cache_stats["misses"]),
+    }
+    return response
 
-lambda_client = boto3.client('lambda')
 
 def lambda_handler(event, context):
+    trace = None
     try:
         body = json.loads(event.get('body', '{}'))
-        text = body.get('text', '')
+        trace = start_trace(event, body)
         affiliation_val = body.get('affiliation', '').lower()
 
-        # Define the payloads for both Lambdas
-        internal_payload = {
-            "body": json.dumps({"text": text, "company": affiliation_val}),
-            "isBase64Encoded": False
-        }
-        public_payload = {
-            "body": json.dumps({"claim": text})
-        }
+        if body.get('streamId'):
+            return poll_stream(body)
+        if isinstance(body.get('streamRun'), dict):
+            run_stream(body['streamRun'], trace)
+            return {"statusCode": 200, "headers": dict(RESPONSE_HEADERS), "body": "{}"}
+
+        if is_batch_request(event, body):
+            response = batch_handler(body, affiliation_val, trace)
+            trace.emit(mode="batch")
+            return with_trace(response, trace)
+
+        text = body.get('text', '')
+        with trace.stage("filter"):
+            skipped = screen_text(text)
+        if skipped is not None:
+            response = not_a_claim_response(skipped)
+            trace.emit(mode="single", filtered=skipped["reason"])
+            return with_trace(response, trace)
+
+        if body.get('stream'):
+            response = start_stream(text, affiliation_val, trace)
+            trace.emit(mode="stream")
+            return with_trace(response, trace)
 
-        # --- STEP 1: Invoke Both Lambdas Simultaneously ---
-        with ThreadPoolExecutor() as executor:
-            # We always trigger the public search in the background
-            future_public = executor.submit(invoke_lambda, 'factCheckerFinalFinalFinal', public_payload)
-            
-            # We only trigger internal if an affiliation is provided
-            future_internal = None
-            if affiliation_val:
-                future_internal = executor.submit(invoke_lambda, 'factcheck-internal-db', internal_payload)
-
-            # Wait for results
-            public_res = future_public.result()
-            internal_res = future_internal.result() if future_internal else None
-
-        # --- STEP 2: Logic Triage (Same as before) ---
-        
-        # 1. Check Internal First
-        if internal_res:
-            internal_data = json.loads(internal_res.get('body', '{}'))
-            if internal_data.get('label') != "unknown":
-                return format_response(internal_data, source=affiliation_val, is_public=False)
-
-        # 2. Fallback to the already-completed Public search
-        public_data = json.loads(public_res.get('body', '{}'))
-        return format_response(public_data, source="public", is_public=True)
+        response, cache_status = cached_check(text, affiliation_val, trace)
+        response = with_cache_headers(response, cache_status) if cache_status else response
+        headers = response.get("headers", {})
+        trace.emit(
+            mode="single", cache=cache_status, winner=headers.get("X-Fanout-Winner"), coalesced=headers.get("X-Coalesced")
+        )
+        return with_trace(response, trace)
 
     except Exception as e:
+        if trace:
+            trace.emit(error=str(e))
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
+def not_a_claim_response(skipped):
+    return {"statusCode": 200, "headers": dict(RESPONSE_HEADERS), "body": json.dumps(skipped)}
+
+def cache_lookup(text, affiliation_val, trace=None):
+    """Returns (cache_key, cached_body); cache_key is None when the cache is bypassed."""
+    if verdict_cache is None or not normalize_claim(text):
+        return None, None
+
+    cache_key = verdict_cache_key(text, affiliation_val)
+    with trace.stage("cache") if trace else contextlib.nullcontext():
+        cached = verdict_cache.get(cache_key)
+    if cached is not None:
+        cache_stats["hits"] += 1
+    else:
+        cache_stats["misses"] += 1
+    return cache_key, cached
+
+def cache_store(cache_key, response):
+    if response.get("statusCode") != 200:
+        return
+    data = json.loads(response["body"])
+    if "retryAfter" in data:
+        # Shed under load; the next attempt should really check the claim
+        return
+    verdict = data.get("verdict")
+    ttl = VERDICT_CACHE_UNKNOWN_TTL if verdict == "UNKNOWN" else VERDICT_CACHE_TTL
+    verdict_cache.set(cache_key, response["body"], ttl)
+
+def cached_check(text, affiliation_val, trace=None, stream_id=None):
+    """Returns (response, cache_status); cache_status is None when the cache was bypassed."""
+    cache_key, cached = cache_lookup(text, affiliation_val, trace)
+    if cached is not None:
+        return {"statusCode": 200, "headers": dict(RESPONSE_HEADERS), "body": cached}, "HIT"
+
+    response, role = coalesced_check(
+        verdict_cache_key(text, affiliation_val),
+        lambda: check_claim(text, affiliation_val, trace=trace, stream_id=stream_id),
+        trace,
+    )
+    if role is not None:
+        response = {**response, "headers": {**response.get("headers", RESPONSE_HEADERS), "X-Coalesced": role}}
+    if cache_key is None:
+        return response, None
+    # The leader (here or in another environment) already stored the verdict
+    if role in (None, "leader"):
+        cache_store(cache_key, response)
+    return response, "MISS"
+
+# -------- Streaming --------
+stream_store = build_stream_store(STREAM_TABLE, STREAM_TTL, STREAM_ENDPOINT_URL)
+
+def start_stream(text, affiliation_val, trace):
+    """Opens a stream for one claim and starts checking it in the background; returns 202 with the streamId."""
+    stream_id = uuid.uuid4().hex
+    StreamWriter(stream_store, stream_id, "orchestrator").emit("started", claim=text)
+    run = {"streamId": stream_id, "text": text, "affiliation": affiliation_val}
+    if STREAM_TABLE and STREAM_FUNCTION_NAME:
+        # This environment may freeze as soon as the 202 is returned, so the check gets an invocation of its own
+        get_lambda_client().invoke(
+            FunctionName=STREAM_FUNCTION_NAME,
+            InvocationType='Event',
+            Payload=json.dumps({"body": json.dumps(trace.payload({"streamRun": run}))}),
+        )
+    else:
+        threading.Thread(
+            target=run_stream, args=(run, Trace("orchestrator", trace.trace_id)), name="stream", daemon=True
+        ).start()
+    return {"statusCode": 202, "headers": dict(RESPONSE_HEADERS), "body": json.dumps({"streamId": stream_id})}
+
+def run_stream(run, trace):
+    """
+    Checks the claim like a single request and closes the stream with a
+    "verdict" event carrying the usual response body (or an "error" event).
+    The internal checker adds its "evidence" and "delta" events on the way.
+    """
+    stream = StreamWriter(stream_store, run["streamId"], "orchestrator")
+    try:
+        response, cache_status = cached_check(run["text"], run.get("affiliation", ""), trace, stream_id=run["streamId"])
+        headers = response.get("headers", {})
+        stream.close(
+            "verdict", response=json.loads(response["body"]), cache=cache_status, winner=headers.get("X-Fanout-Winner")
+        )
+        trace.emit(mode="stream", cache=cache_status, winner=headers.get("X-Fanout-Winner"))
+    except Exception as e:
+        print("Stream check error:", repr(e))
+        stream.close("error", error=str(e))
+        trace.emit(mode="stream", error=str(e))
+
+def poll_stream(body):
+    """{"streamId", "after"} → the stream's events after the first `after`, waiting up to STREAM_POLL_WAIT for one."""
+    after = max(0, int(body.get('after') or 0))
+    found = stream_store.read(body['streamId'], after, STREAM_POLL_WAIT)
+    if found is None:
+        return {"statusCode": 404, "headers": dict(RESPONSE_HEADERS), "body": json.dumps({"error": "Unknown or expired stream"})}
+    events, done = found
+    return {
+        "statusCode": 200,
+        "headers": dict(RESPONSE_HEADERS),
+        "body": json.dumps({"streamId": body['streamId'], "events": events, "next": after + len(events), "done": done}),
+    }
+
+# -------- Batch --------
+SENTENCE_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+(?=[A-Z0-9\"'(])|\n+")
+INITIALISM = re.compile(r"(?:[a-z]\.)*[a-z]")
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr", "inc", "ltd", "co", "corp", "vs", "etc", "no", "fig"}
+
+def is_batch_request(event, body):
+    path = event.get('rawPath') or event.get('path') or ''
+    return path.rstrip('/').endswith('/batch') or 'claims' in body
+
+def iter_sentences(text):
+    """Yields sentences lazily, so a caller that stops early doesn't pay for the rest of the text."""
+    text = text or ''
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        head = text[start:match.start()].split()
+        if match.group(0)[0] == '.' and head:
+            # "U.S. GDP", "e.g. this", "Dr. Smith" are not sentence ends
+            word = head[-1].lower()
+            if INITIALISM.fullmatch(word) or word in ABBREVIATIONS:
+                continue
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            yield sentence
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        yield tail
+
+def split_sentences(text):
+    return list(iter_sentences(text))
+
+# -------- Check-worthiness --------
+WORD = re.compile(r"[A-Za-z][A-Za-z'’-]*|\d[\d,.%]*")
+NUMERAL = re.compile(r"\d")
+URL = re.compile(r"(?:https?://|www\.)\S+")
+# Independent signs of source code; prose trips one now and then ("E = mc2", "#1 seller",
+# "@Apple"), so it takes CODE_MIN_SIGNALS of them to call a sentence code
+CODE_SIGNALS = [
+    re.compile(r"[{};]\s*$", re.M),  # statement or block end
+    re.compile(r"^\s*(?:def|class|import|return|const|let|var|function|elif)\b", re.M),
+    re.compile(r"=>|==|!=|&&|\|\||\+=|-="),  # operators
+    re.compile(r"\b[A-Za-z_][\w.]*\("),  # a call: identifier right before "("
+    re.compile(r"\w\["),  # indexing
+    re.compile(r"<\w+(?:\s[^<>]*)?>"),  # opening tag
+    re.compile(r"</\w+>"),  # closing tag
+    re.compile(r"^\s*[\w.\[\]]+\s*[-+*/]?=\s*\S", re.M),  # assignment
+    re.compile(r"\b[a-z]+_[a-z0-9_]+\b|\b[a-z]+[A-Z]\w*\.\w"),  # snake_case, camelCase.member
+]
+CODE_MIN_SIGNALS = 2
+# Counted for a multi-line paste's symbol density; "$", "#", "@" and parentheses are common in prose
+CODE_SYMBOLS = "{}[];=<>\\|`"
+
+def code_signals(text):
+    return sum(1 for pattern in CODE_SIGNALS if pattern.search(text))
+
+OPINION = re.compile(
+    r"\b(?:i think|i feel|i believe|in my opinion|imo|lol|please|thanks|thank you|let's|should we|check out)\b", re.I
+)
+NOT_A_CLAIM_REASONS = {
+    "empty": "the text is empty",
+    "short": "it is a single word",
+    "url": "it is a link",
+    "code": "it looks like code",
+    "question": "it is a question",
+    "opinion": "it reads as opinion or chat",
+    "no_claim": "no checkable statement found",
+}
+
+def check_worthiness(sentence):
+    """
+    Scores one sentence 0..1 for check-worthiness. The filter fails open: a
+    sentence is only scored low on a positive sign that it is not a claim (a
+    link, code, a single word, a question, opinion or chat). Anything else
+    starts at a passing 0.5, and numerals, name-like capitalized words and
+    length only raise it. Returns (score, reason); reason says why a low
+    score was low.
+    """
+    words = WORD.findall(sentence)
+    if not words:
+        return 0.0, "empty"
+    stripped = sentence.strip()
+    if ("http" in stripped or "www." in stripped) and len(URL.sub("", stripped).split()) < CLAIM_MIN_WORDS:
+        return 0.0, "url"
+    if code_signals(stripped) >= CODE_MIN_SIGNALS:
+        return 0.0, "code"
+    if len(words) < CLAIM_MIN_WORDS:
+        return 0.0, "short"
+    if stripped.endswith("?"):
+        return 0.1, "question"
+    if OPINION.search(stripped):
+        return 0.2, "opinion"
+
+    score = 0.5
+    if NUMERAL.search(stripped):
+        score += 0.2
+    if any(w[0].isupper() for w in words[1:]):
+        score += 0.2
+    if len(words) >= 5:
+        score += 0.1
+    return min(score, 1.0), "no_claim"
+
+def screen_text(text):
+    """None when text holds at least one check-worthy sentence, else the "NOT A CLAIM" response body."""
+    if CLAIM_FILTER == "off":
+        return None
+    score, reason = 0.0, "empty"
+    if (
+        "\n" in text.strip()
+        and sum(map(text.count, CODE_SYMBOLS)) / len(text) > 0.05
+        and code_signals(text) >= CODE_MIN_SIGNALS
+    ):
+        # A multi-line paste this dense in code symbols is source code; skip the per-line scoring
+        score, reason = 0.0, "code"
+    for sentence in itertools.islice(iter_sentences(text), CLAIM_FILTER_MAX_SENTENCES if reason == "empty" else 0):
+        # Unpunctuated pastes arrive as one huge "sentence"; its head is enough to judge it
+        sentence_score, sentence_reason = check_worthiness(sentence[:500])
+        if sentence_score >= CLAIM_MIN_SCORE:
+            return None
+        if reason == "empty" or sentence_score > score:
+            score, reason = sentence_score, sentence_reason
+    return {
+        "verdict": "NOT A CLAIM",
+        "confidence": None,
+        "summary": f"Not checked: {NOT_A_CLAIM_REASONS[reason]}.",
+        "source": "filter",
+        "claim": text,
+        "citations": [],
+        "is_internal": False,
+        "checkWorthiness": round(score, 2),
+        "reason": reason,
+    }
+
+def batch_handler(body, affiliation_val, trace=None):
+    """
+    Accepts {"claims": [...]} and/or {"text": "..."} (split into sentences) and
+    returns one verdict per input claim. Identical claims are checked once.
+    """
+    claims = [c for c in body.get('claims', []) if isinstance(c, str) and c.strip()]
+    claims += split_sentences(body.get('text', ''))
+    if not claims:
+        return {"statusCode": 400, "headers": dict(RESPONSE_HEADERS), "body": json.dumps({"error": "Missing claims"})}
+    if len(claims) > BATCH_MAX_CLAIMS:
+        return {
+            "statusCode": 400,
+            "headers": dict(RESPONSE_HEADERS),
+            "body": json.dumps({"error": f"Too many claims ({len(claims)} > {BATCH_MAX_CLAIMS})"}),
+        }
+
+    # Dedupe on the same normalization the verdict cache uses; first spelling wins
+    unique = {}
+    for claim in claims:
+        unique.setdefault(normalize_claim(claim), claim)
+
+    with trace.stage("filter") if trace else contextlib.nullcontext():
+        skipped = {key: screen_text(claim) for key, claim in unique.items()}
+
+    verdicts = {}
+    pending = []
+    for key, claim in unique.items():
+        if skipped[key] is not None:
+            verdicts[key] = skipped[key]
+            continue
+        _, cached = cache_lookup(claim, affiliation_val, trace)
+        if cached is not None:
+            verdicts[key] = {**json.loads(cached), "cache": "HIT"}
+        else:
+            pending.append(key)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(pending))) as executor:
+            # One internal invoke classifies every uncached claim; public checks stay per claim
+            internal_futures = {}
+            if affiliation_val and len(pending) > 1:
+                batch_future = invoke_executor.submit(
+                    invoke_internal_batch, [unique[key] for key in pending], affiliation_val, trace
+                )
+                internal_futures = split_batch_future(batch_future, pending)
+
+            futures = {
+                key: executor.submit(check_and_store, unique[key], affiliation_val, internal_futures.get(key), trace)
+                for key in pending
+            }
+
+        for key, future in futures.items():
+            try:
+                verdicts[key] = future.result()
+            except Exception as e:
+                verdicts[key] = {"error": str(e)}
+
+    results = [{**verdicts[normalize_claim(claim)], "claim": claim} for claim in claims]
+    return {
+        "statusCode": 200,
+        "headers": dict(RESPONSE_HEADERS),
+        "body": json.dumps({
+            "count": len(claims),
+            "unique": len(unique),
+            "skipped": sum(1 for body in skipped.values() if body is not None),
+            "results": results,
+        }),
+    }
+
+def check_and_store(text, affiliation_val, internal_future, trace=None):
+    key = verdict_cache_key(text, affiliation_val)
+    response, role = coalesced_check(key, lambda: check_claim(text, affiliation_val, internal_future, trace), trace)
+    result = json.loads(response.get('body', '{}'))
+    if role in ("follower", "shared"):
+        result["coalesced"] = role
+    if verdict_cache is not None:
+        if role in (None, "leader"):
+            cache_store(key, response)
+        result["cache"] = "MISS"
+    return result
+
+def invoke_internal_batch(texts, affiliation_val, trace=None):
+    trace = trace or Trace("orchestrator")
+    payload = {
+        "body": json.dumps(trace.payload({"texts": texts, "company": affiliation_val})),
+        "isBase64Encoded": False
+    }
+    with trace.stage("internal"):
+        res = invoke_lambda(INTERNAL_FUNCTION_NAME, payload)
+    data = json.loads(res.get('body', '{}'))
+    trace.child("internal", data)
+    results = data.get('results')
+    if not isinstance(results, list) or len(results) != len(texts):
+        raise RuntimeError(f"Internal batch check failed: {res.get('body')}")
+    return results
+
+def split_batch_future(batch_future, keys):
+    """Fans one batch result out into per-claim futures shaped like invoke_lambda() responses."""
+    futures = {key: Future() for key in keys}
+
+    def done(f):
+        try:
+            results = f.result()
+        except Exception as e:
+            for future in futures.values():
+                future.set_exception(e)
+            return
+        for key, result in zip(keys, results):
+            futures[key].set_result({"statusCode": 200, "body": json.dumps(result)})
+
+    batch_future.add_done_callback(done)
+    return futures
+
+# Downstream invokes share one pool for the life of the execution environment. With the local
+# backend the public handler keeps an event loop and Backboard client per thread, so reusing threads
+# reuses those too instead of leaving a new loop behind on every check
+invoke_executor = ThreadPoolExecutor(max_workers=INVOKE_MAX_WORKERS, thread_name_prefix="invoke")
+
+def check_claim(text, affiliation_val, future_internal=None, trace=None, stream_id=None):
+    started = time.perf_counter()
+    trace = trace or Trace("orchestrator")
+
+    # Define the payloads for both Lambdas; a streamed check has the internal one write its evidence to the stream
+    internal_body = {"text": text, "company": affiliation_val}
+    if stream_id:
+        internal_body["streamId"] = stream_id
+    internal_payload = {
+        "body": json.dumps(trace.payload(internal_body)),
+        "isBase64Encoded": False
+    }
+    # Per invoke, not per trace: a batch shares one trace id across its public checks
+    check_id = uuid.uuid4().hex
+    public_payload = {
+        "body": json.dumps(trace.payload({"claim": text, "checkId": check_id}))
+    }
+
+    # --- STEP 1: Invoke Both Lambdas Simultaneously ---
+    # We always trigger the public search in the background
+    future_public = invoke_executor.submit(timed_invoke, PUBLIC_FUNCTION_NAME, public_payload)
+
+    # We only trigger internal if an affiliation is provided (batch callers pass theirs in)
+    if future_internal is None and affiliation_val:
+        future_internal = invoke_executor.submit(traced_invoke, trace, "internal", INTERNAL_FUNCTION_NAME, internal_payload)
+
+    # --- STEP 2: Logic Triage ---
+
+    # 1. Check Internal First; in race mode a decisive answer returns without waiting for public,
+    #    which finishes in the pool
+    internal_data = None
+    if future_internal:
+        try:
+            internal_data = json.loads(future_internal.result().get('body', '{}'))
+            trace.child("internal", internal_data)
+        except Exception as e:
+            print("Internal check error:", repr(e))
+        if is_decisive(internal_data) and not future_public.done():
+            settle_public(check_id)
+        if is_decisive(internal_data) and FANOUT_MODE == "race":
+            return with_fanout_headers(
+                format_response(internal_data, source=affiliation_val, is_public=False),
+                winner="internal",
+                started=started,
+                public_pending=not future_public.done(),
+            )
+
+    # 2. Fallback to the Public search
+    public_res, public_ms = future_public.result()
+    trace.add("public", public_ms)
+    record_public_latency(public_ms)
+
+    if is_decisive(internal_data):
+        return with_fanout_headers(
+            format_response(internal_data, source=affiliation_val, is_public=False),
+            winner="internal",
+            started=started,
+        )
+
+    public_data = json.loads(public_res.get('body', '{}'))
+    trace.child("public", public_data)
+    return with_fanout_headers(
+        format_response(public_data, source="public", is_public=True),
+        winner="public",
+        started=started,
+    )
+
+def is_decisive(internal_data):
+    # Error bodies carry no label; treat them like "unknown" and fall back to public
+    return bool(internal_data) and internal_data.get('label') not in (None, "unknown")
+
+# -------- Race Bookkeeping --------
+# Smoothed public-path latency, used to estimate what an early return saved
+race_stats = {"public_latency_ms": None}
+
+def timed_invoke(name, payload):
+    started = time.perf_counter()
+    result = invoke_lambda(name, payload)
+    return result, (time.perf_counter() - started) * 1000
+
+def traced_invoke(trace, stage, name, payload):
+    with trace.stage(stage):
+        return invoke_lambda(name, payload)
+
+def record_public_latency(elapsed_ms):
+    # Only from invokes the handler waited for: one abandoned by a race finishes after the
+    # environment was frozen, and its time would include the freeze
+    previous = race_stats["public_latency_ms"]
+    race_stats["public_latency_ms"] = elapsed_ms if previous is None else 0.8 * previous + 0.2 * elapsed_ms
+
+def with_fanout_headers(response, winner, started, public_pending=False):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    headers = {
+        **response.get("headers", RESPONSE_HEADERS),
+        "X-Fanout-Mode": FANOUT_MODE,
+        "X-Fanout-Winner": winner,
+        "X-Fanout-Latency-Ms": f"{elapsed_ms:.0f}",
+    }
+    if public_pending and race_stats["public_latency_ms"] is not None:
+        saved_ms = max(0.0, race_stats["public_latency_ms"] - elapsed_ms)
+        headers["X-Fanout-Saved-Ms"] = f"{saved_ms:.0f}"
+    elif not public_pending:
+        headers["X-Fanout-Saved-Ms"] = "0"
+    return {**response, "headers": headers}
+
+def load_local_handlers():
+    """Imports the downstream handlers once, in the init phase, so no request pays for it."""
+    return {
+        INTERNAL_FUNCTION_NAME: importlib.import_module(LOCAL_INTERNAL_MODULE).lambda_handler,
+        PUBLIC_FUNCTION_NAME: importlib.import_module(LOCAL_PUBLIC_MODULE).lambda_handler,
+    }
+
+local_handlers = load_local_handlers() if INVOKE_BACKEND == "local" else {}
+# The in-process public module's settle(); already imported above, so this is a lookup
+local_settle = getattr(importlib.import_module(LOCAL_PUBLIC_MODULE), "settle", None) if local_handlers else None
+
+def settle_public(check_id):
+    """Marks a still-running public check settled so it skips its Backboard evaluation. Best effort."""
+    try:
+        if local_settle is not None:
+            local_settle(check_id)
+        elif SETTLE_TABLE and not local_handlers:
+            # Written before returning: a frozen environment would never send it afterwards
+            aws_client('dynamodb', VERDICT_CACHE_ENDPOINT_URL).put_item(
+                TableName=SETTLE_TABLE,
+                Item={
+                    "cache_key": {"S": f"settled#{check_id}"},
+                    "expires_at": {"N": str(int(time.time() + 300))},
+                },
+            )
+    except Exception as e:
+        print("Settle signal error:", repr(e))
+
 def invoke_lambda(name, payload):
-    response = lambda_client.invoke(
+    if INVOKE_BACKEND == "local":
+        # Same event and response shapes as a RequestResponse invoke, minus the hop
+        return local_handlers[name](payload, None)
+    response = get_lambda_client().invoke(
         FunctionName=name,
         InvocationType='RequestResponse',
         Payload=json.dumps(payload)
@@ -61,18 +1026,23 @@ def format_response(raw_data, source, is_public):
     verdict = str(raw_label).upper() if raw_label else "UNKNOWN"
     claim_text = raw_data.get('claim') or raw_data.get('text')
 
+    body = {
+        "verdict": verdict,
+        "confidence": raw_data.get('confidence'),
+        "summary": raw_data.get('summary'),
+        "source": source,
+        "claim": claim_text,
+        "citations": raw_data.get('citations', []),
+        "is_internal": not is_internal_logic(source)
+    }
+    headers = dict(RESPONSE_HEADERS)
+    if raw_data.get('retryAfter'):
+        body["retryAfter"] = raw_data['retryAfter']
+        headers["Retry-After"] = str(raw_data['retryAfter'])
     return {
         "statusCode": 200,
-        "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
-        "body": json.dumps({
-            "verdict": verdict,
-            "confidence": raw_data.get('confidence'),
-            "summary": raw_data.get('summary'),
-            "source": source,
-            "claim": claim_text,
-            "citations": raw_data.get('citations', []),
-            "is_internal": not is_internal_logic(source)
-        })
+        "headers": headers,
+        "body": json.dumps(body)
     }
 
 def is_internal_logic(source):
@@ -1,17 +1,30 @@
 import base64
+import functools
 import json
 import os
 import re
+import threading
 import time
-from typing import Dict, List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
 
-import boto3
-from botocore.config import Config
+from backpressure import Backpressure, Overloaded
+from event_stream import StreamWriter, build_stream_store
+from similarity_cache import SimilarityCache
+from tracing import Trace
 
 # -------- ENV --------
-MODEL_ID = os.environ["MODEL_ID"]
+# Checked when a claim first reaches the model, so a misconfigured function still answers warmups and 400s
+MODEL_ID = os.environ.get("MODEL_ID", "")
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 
+# Tenant → KB registry: s3://bucket/key.json or a local/EFS path ("" = only the legacy KB_*_ID tenants).
+# Loaded once per container and re-checked every TENANT_REGISTRY_TTL seconds.
+TENANT_REGISTRY_URI = os.environ.get("TENANT_REGISTRY_URI", "")
+TENANT_REGISTRY_TTL = float(os.environ.get("TENANT_REGISTRY_TTL", "300"))
+
+# Legacy tenants, still honored when the registry doesn't define them
 KB_AWS_ID = os.environ.get("KB_AWS_ID", "")
 KB_CISCO_ID = os.environ.get("KB_CISCO_ID", "")
 
@@ -24,10 +37,89 @@ TEMPERATURE = float(os.environ.get("TEMPERATURE", "0.0"))
 CITATION_TEXT_CHARS = int(os.environ.get("CITATION_TEXT_CHARS", "600"))
 MATCH_SNIPPET_CHARS = int(os.environ.get("MATCH_SNIPPET_CHARS", "280"))
 
+# Multi-claim requests: output tokens reserved per claim decide how many claims share one call
+BATCH_TOKENS_PER_CLAIM = int(os.environ.get("BATCH_TOKENS_PER_CLAIM", "160"))
+BATCH_MAX_PROMPT_TOKENS = int(os.environ.get("BATCH_MAX_PROMPT_TOKENS", "12000"))
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "4"))
+
+# Context packing before the prompt: collapse near-duplicate chunks, stitch overlapping chunks of
+# the same document back together, then keep the best-ranked chunks that fit the token budget
+CONTEXT_COMPACTION = os.environ.get("CONTEXT_COMPACTION", "on").lower()  # on | off
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))  # 0 = unbounded
+CHUNK_DEDUP_THRESHOLD = float(os.environ.get("CHUNK_DEDUP_THRESHOLD", "0.8"))
+CHUNK_MERGE_MIN_OVERLAP_WORDS = int(os.environ.get("CHUNK_MERGE_MIN_OVERLAP_WORDS", "8"))
+
+# Multi-KB checks ("company": "acme, policy" or a tenant's extra_kb_ids) retrieve from each KB concurrently
+RETRIEVAL_MAX_WORKERS = int(os.environ.get("RETRIEVAL_MAX_WORKERS", "8"))
+MERGE_RRF_K = 60
+
+# Retrieval-only fast path: off | insufficient (answer "unknown" without the LLM when retrieval found
+# nothing or only low-score chunks) | lexical (also answer "unknown" when the chunks share under
+# FAST_PATH_MIN_OVERLAP of the claim's words, and accept a claim found verbatim in the top chunk).
+# Retrieval is semantic, so a chunk can be strong evidence in other words; lexical checks are opt-in
+FAST_PATH = os.environ.get("FAST_PATH", "insufficient").lower()
+FAST_PATH_MIN_SCORE = float(os.environ.get("FAST_PATH_MIN_SCORE", "0.1"))
+FAST_PATH_MIN_OVERLAP = float(os.environ.get("FAST_PATH_MIN_OVERLAP", "0.2"))
+FAST_PATH_LEXICAL_CONFIDENCE = float(os.environ.get("FAST_PATH_LEXICAL_CONFIDENCE", "0.9"))
+
+# bedrock = Bedrock Knowledge Base; local = hybrid BM25 + vector index under LOCAL_INDEX_DIR/<kb_id>
+RETRIEVER = os.environ.get("RETRIEVER", "bedrock").lower()
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "/opt/index")
+LOCAL_INDEX_EMBED_MODEL_ID = os.environ.get("LOCAL_INDEX_EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+
+# Retrieval cache (0 disables). Entries are keyed on the KB version marker so a re-ingest invalidates them.
+RETRIEVAL_CACHE_MAX_BYTES = int(os.environ.get("RETRIEVAL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# ingestion = latest COMPLETE Bedrock ingestion job per data source; s3 = ETag of a marker object;
+# local = version in the local index manifest; none = never cache
+KB_VERSION_SOURCE = os.environ.get("KB_VERSION_SOURCE", "local" if RETRIEVER == "local" else "ingestion").lower()
+KB_VERSION_MARKER_URI = os.environ.get("KB_VERSION_MARKER_URI", "")  # e.g. s3://bucket/markers/{kb_id}.json
+KB_VERSION_CHECK_SECONDS = float(os.environ.get("KB_VERSION_CHECK_SECONDS", "60"))
+
+# Near-duplicate verdict cache (0 entries disables)
+SIMILARITY_CACHE_MAX_ENTRIES = int(os.environ.get("SIMILARITY_CACHE_MAX_ENTRIES", "4096"))
+SIMILARITY_CACHE_TTL = int(os.environ.get("SIMILARITY_CACHE_TTL", "3600"))
+# Shingle Jaccard a reworded claim needs on top of matching every content word exactly
+SIMILARITY_CACHE_THRESHOLD = float(os.environ.get("SIMILARITY_CACHE_THRESHOLD", "0.9"))
+
+# Backpressure around Bedrock converse (rate 0 = unlimited). Per execution environment, so it only
+# bounds the fan-out of one request; reserved concurrency caps the function as a whole
+MODEL_RATE_PER_SEC = float(os.environ.get("MODEL_RATE_PER_SEC", "0"))
+MODEL_BURST = int(os.environ.get("MODEL_BURST", "10"))
+MODEL_CONCURRENCY_MAX = int(os.environ.get("MODEL_CONCURRENCY_MAX", "16"))
+MODEL_MAX_RETRIES = int(os.environ.get("MODEL_MAX_RETRIES", "2"))
+MODEL_BACKOFF_BASE = float(os.environ.get("MODEL_BACKOFF_BASE", "0.25"))
+MODEL_BACKOFF_MAX = float(os.environ.get("MODEL_BACKOFF_MAX", "4"))
+# Longest a call waits for a token or a slot before it is shed with "retry later"
+SHED_QUEUE_TIMEOUT = float(os.environ.get("SHED_QUEUE_TIMEOUT", "2"))
+SHED_RETRY_AFTER = int(os.environ.get("SHED_RETRY_AFTER", "2"))
+THROTTLE_ERROR_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException", "ModelNotReadyException"}
+
+# Streamed checks (the orchestrator passes "streamId"): the evidence and the model's text are appended
+# to this table as they arrive. Same table as the orchestrator's STREAM_TABLE; "" = in-process, which
+# only reaches the poller with the orchestrator's local invoke backend
+STREAM_TABLE = os.environ.get("STREAM_TABLE", "")
+STREAM_TTL = int(os.environ.get("STREAM_TTL", "600"))
+STREAM_ENDPOINT_URL = os.environ.get("STREAM_ENDPOINT_URL") or None
+# Model text is written to the stream at most this often
+STREAM_FLUSH_SECONDS = float(os.environ.get("STREAM_FLUSH_SECONDS", "0.2"))
+
 # -------- Clients --------
-cfg = Config(retries={"max_attempts": 2})
-kb_client = boto3.client("bedrock-agent-runtime", region_name=AWS_REGION, config=cfg)
-br_client = boto3.client("bedrock-runtime", region_name=AWS_REGION, config=cfg)
+# boto3 and each client's service model load on first use, not at import: a cold start
+# that ends in a 400 or a similarity-cache hit never pays for them
+@functools.lru_cache(maxsize=None)
+def aws_client(service: str):
+    import boto3
+    from botocore.config import Config
+
+    # The model backpressure owns Bedrock Runtime retries, so every throttle reaches its limiter
+    retries = {"total_max_attempts": 1} if service == "bedrock-runtime" else {"max_attempts": 2}
+    return boto3.client(service, region_name=AWS_REGION, config=Config(retries=retries))
+
+def get_kb_client():
+    return aws_client("bedrock-agent-runtime")
+
+def get_br_client():
+    return aws_client("bedrock-runtime")
 
 # -------- Helpers --------
 def parse_body(event):
@@ -65,52 +157,95 @@ def limit_words_smart(text: str, max_words: int = 60) -> str:
 
     return truncated.strip() + "..."
 
-def resolve_kb_id(company_raw: str) -> str:
-    company = normalize(company_raw).lower()
-    if company == "aws":
-        if not KB_AWS_ID:
-            raise RuntimeError("KB_AWS_ID is not set")
-        return KB_AWS_ID
-    if company == "cisco":
-        if not KB_CISCO_ID:
-            raise RuntimeError("KB_CISCO_ID is not set")
-        return KB_CISCO_ID
-    raise RuntimeError("Invalid company flag. Use 'aws' or 'cisco'.")
-
 def safe_float(x, default=0.0):
     try:
         return float(x)
     except Exception:
         return default
 
-def extract_match_snippet(claim: str, chunk_text: str, max_chars: int) -> str:
+def claim_tokens(claim: str) -> List[str]:
     claim = normalize(claim).lower()
-    text = normalize(chunk_text)
-    if not text:
-        return ""
+    return [t for t in re.findall(r"[a-z0-9]{4,}", claim) if t not in {"this", "that", "with", "from", "have", "uses"}]
+
+
+class ClaimMatcher:
+    """
+    A claim's anchor tokens, extracted once per claim and reused for every
+    chunk, citation and top_match instead of re-tokenizing the claim each time.
+    """
+
+    def __init__(self, claim: str):
+        self.tokens = list(dict.fromkeys(claim_tokens(claim)))
+
+    def found_tokens(self, text: str) -> set:
+        low = text.lower()
+        return {t for t in self.tokens if t in low}
+
+    def occurrences(self, low: str) -> List[Tuple[int, int, int]]:
+        """Sorted (start, end, token_index) for every occurrence of every token."""
+        hits = []
+        for idx, token in enumerate(self.tokens):
+            pos = low.find(token)
+            while pos != -1:
+                hits.append((pos, pos + len(token), idx))
+                pos = low.find(token, pos + 1)
+        hits.sort()
+        return hits
+
+    def densest_window(self, low: str, width: int):
+        """(start, end) of the span ≤ width covering the most distinct tokens, or None."""
+        hits = self.occurrences(low)
+        if not hits:
+            return None
 
-    low = text.lower()
-    tokens = [t for t in re.findall(r"[a-z0-9]{4,}", claim) if t not in {"this", "that", "with", "from", "have", "uses"}]
-    anchor_pos = -1
-    for t in tokens[:12]:
-        p = low.find(t)
-        if p != -1:
-            anchor_pos = p
-            break
+        counts = [0] * len(self.tokens)
+        distinct = 0
+        best, best_score = None, None
+        left = 0
+        for right, (_, end, idx) in enumerate(hits):
+            if not counts[idx]:
+                distinct += 1
+            counts[idx] += 1
+            while end - hits[left][0] > width:
+                dropped = hits[left][2]
+                counts[dropped] -= 1
+                if not counts[dropped]:
+                    distinct -= 1
+                left += 1
+            score = (distinct, right - left + 1)
+            if best_score is None or score > best_score:
+                best, best_score = (hits[left][0], end), score
+        return best
 
-    if anchor_pos == -1:
-        return text[:max_chars]
+    def snippet(self, chunk_text: str, max_chars: int) -> str:
+        text = " ".join((chunk_text or "").split())
+        if not text:
+            return ""
 
-    start = max(0, anchor_pos - max_chars // 2)
-    end = min(len(text), start + max_chars)
-    snippet = text[start:end].strip()
+        window = self.densest_window(text.lower(), max_chars)
+        if window is None:
+            return text[:max_chars]
 
-    if start > 0:
-        snippet = "…" + snippet
-    if end < len(text):
-        snippet = snippet + "…"
+        # Center the snippet on the densest window
+        center = (window[0] + window[1]) // 2
+        end = min(len(text), max(0, center - max_chars // 2) + max_chars)
+        start = max(0, end - max_chars)
+        snippet = text[start:end].strip()
 
-    return snippet
+        if start > 0:
+            snippet = "…" + snippet
+        if end < len(text):
+            snippet = snippet + "…"
+
+        return snippet
+
+
+@functools.lru_cache(maxsize=256)
+def claim_matcher(claim: str) -> ClaimMatcher:
+    return ClaimMatcher(claim)
+
+def extract_match_snippet(claim: str, chunk_text: str, max_chars: int) -> str:
+    return claim_matcher(claim).snippet(chunk_text, max_chars)
 
 def clamp01(x: float) -> float:
     if x < 0.0:
@@ -119,23 +254,458 @@ def clamp01(x: float) -> float:
         return 1.0
     return x
 
-# -------- Retrieval --------
-def retrieve_chunks(kb_id: str, claim: str) -> List[Dict]:
-    response = kb_client.retrieve(
-        knowledgeBaseId=kb_id,
-        retrievalQuery={"text": claim},
-        retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": TOP_K}},
+# -------- Tenants --------
+class Tenant(NamedTuple):
+    name: str
+    kb_id: str
+    kb_ids: Tuple[str, ...]  # kb_id first, then extra_kb_ids (e.g. a shared policy KB)
+    top_k: int
+    min_score: float
+    model_id: str
+    max_tokens: int
+    temperature: float
+
+
+def make_tenant(name: str, settings: Dict) -> Tenant:
+    """Registry entry → Tenant; anything not overridden falls back to the Lambda's env defaults."""
+    if not settings.get("kb_id"):
+        raise ValueError(f"tenant {name!r} has no kb_id")
+    return Tenant(
+        name=name,
+        kb_id=str(settings["kb_id"]),
+        kb_ids=tuple(dict.fromkeys([str(settings["kb_id"])] + [str(k) for k in settings.get("extra_kb_ids", [])])),
+        top_k=int(settings.get("top_k", TOP_K)),
+        min_score=float(settings.get("min_score", MIN_SCORE)),
+        model_id=str(settings.get("model_id", MODEL_ID)),
+        max_tokens=int(settings.get("max_tokens", MAX_TOKENS)),
+        temperature=float(settings.get("temperature", TEMPERATURE)),
     )
 
+
+class TenantRegistry:
+    """
+    Tenant name → Tenant, parsed once into a dict so each request is a single
+    lookup. The source is re-checked (ETag / mtime) at most every `ttl`
+    seconds by one thread while the others keep serving the current snapshot;
+    a failed refresh keeps the last good snapshot.
+
+    Registry document: {"tenants": {"<name>": {"kb_id", "extra_kb_ids"?: [...], "top_k"?,
+    "min_score"?, "model_id"?, "max_tokens"?, "temperature"?, "aliases"?: [...]}}}
+    """
+
+    def __init__(self, uri: str, ttl: float, legacy: Dict[str, str]):
+        self.uri = uri
+        self.ttl = ttl
+        self.legacy = {name: kb_id for name, kb_id in legacy.items() if kb_id}
+        self._tenants = None  # name -> Tenant
+        self._marker = None  # ETag or mtime of the loaded document
+        self._checked_at = 0.0
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Tenant:
+        if self._tenants is None or time.time() - self._checked_at >= self.ttl:
+            self.refresh(blocking=self._tenants is None)
+        tenant = self._tenants.get(normalize(name).lower())
+        if tenant is None:
+            raise RuntimeError(f"Unknown company {name!r}.")
+        return tenant
+
+    def refresh(self, blocking: bool):
+        if not self._lock.acquire(blocking=blocking):
+            return
+        try:
+            if self._tenants is not None and time.time() - self._checked_at < self.ttl:
+                return
+            try:
+                marker, document = self.fetch(self._marker)
+                if document is not None or self._tenants is None:
+                    self._tenants = self.parse(document or {})
+                    self._marker = marker
+            except Exception as e:
+                if self._tenants is None:
+                    raise
+                print("Tenant registry refresh error:", repr(e))
+            self._checked_at = time.time()
+        finally:
+            self._lock.release()
+
+    def fetch(self, marker):
+        """(marker, document), or (marker, None) when the source hasn't changed since `marker`."""
+        if not self.uri:
+            return None, None
+        if self.uri.startswith("s3://"):
+            bucket, _, key = self.uri[len("s3://"):].partition("/")
+            if self._client is None:
+                self._client = aws_client("s3")
+            etag = self._client.head_object(Bucket=bucket, Key=key)["ETag"]
+            if etag == marker:
+                return marker, None
+            return etag, json.loads(self._client.get_object(Bucket=bucket, Key=key)["Body"].read())
+        mtime = os.stat(self.uri).st_mtime_ns
+        if mtime == marker:
+            return marker, None
+        with open(self.uri, "r", encoding="utf-8") as f:
+            return mtime, json.load(f)
+
+    def parse(self, document: Dict) -> Dict[str, Tenant]:
+        tenants = {name: make_tenant(name, {"kb_id": kb_id}) for name, kb_id in self.legacy.items()}
+        for raw_name, settings in (document.get("tenants") or {}).items():
+            name = normalize(raw_name).lower()
+            try:
+                tenant = make_tenant(name, settings)
+            except Exception as e:
+                print("Tenant registry entry error:", repr(e))
+                continue
+            tenants[name] = tenant
+            for alias in settings.get("aliases", []):
+                tenants[normalize(alias).lower()] = tenant
+        return tenants
+
+
+tenant_registry = TenantRegistry(TENANT_REGISTRY_URI, TENANT_REGISTRY_TTL, {"aws": KB_AWS_ID, "cisco": KB_CISCO_ID})
+
+def resolve_tenant(company_raw: str) -> Tenant:
+    return tenant_registry.get(company_raw)
+
+def resolve_scope(company_raw) -> Tuple[Tenant, List[str]]:
+    """
+    "acme" or "acme, policy" (or a list) → (primary tenant, KBs to search).
+    The first tenant's top_k, thresholds and model apply to the whole check.
+    """
+    names = company_raw if isinstance(company_raw, list) else str(company_raw or "").split(",")
+    tenants = [resolve_tenant(name) for name in names if normalize(str(name))] or [resolve_tenant("")]
+    kb_ids = list(dict.fromkeys(kb_id for tenant in tenants for kb_id in tenant.kb_ids))
+    return tenants[0], kb_ids
+
+# -------- Retrievers --------
+# A retriever returns [{"text", "score", "uri"}] best first; fetch_chunks assigns chunk ids.
+class BedrockRetriever:
+    def retrieve(self, kb_id: str, claim: str, top_k: int) -> List[Dict]:
+        response = get_kb_client().retrieve(
+            knowledgeBaseId=kb_id,
+            retrievalQuery={"text": claim},
+            retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": top_k}},
+        )
+        return [
+            {
+                "text": r.get("content", {}).get("text", ""),
+                "score": safe_float(r.get("score", 0)),
+                "uri": extract_uri(r.get("location", {})),
+            }
+            for r in response.get("retrievalResults", [])
+        ]
+
+
+class LocalRetriever:
+    """Hybrid index per kb_id under `root`, reloaded when its manifest is rewritten."""
+
+    def __init__(self, root: str):
+        self.local_index = None  # imported with the first index: NumPy is only needed by this retriever
+        self.root = root
+        self._indexes = {}  # kb_id -> (manifest mtime, HybridIndex)
+        self._lock = threading.Lock()
+
+    def index(self, kb_id: str):
+        path = os.path.join(self.root, kb_id)
+        mtime = os.stat(os.path.join(path, "manifest.json")).st_mtime_ns
+        cached = self._indexes.get(kb_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with self._lock:
+            cached = self._indexes.get(kb_id)
+            if not cached or cached[0] != mtime:
+                if self.local_index is None:
+                    import local_index
+
+                    self.local_index = local_index
+                cached = (mtime, self.local_index.HybridIndex(path, get_br_client(), LOCAL_INDEX_EMBED_MODEL_ID))
+                self._indexes[kb_id] = cached
+        return cached[1]
+
+    def retrieve(self, kb_id: str, claim: str, top_k: int) -> List[Dict]:
+        return self.index(kb_id).search(claim, top_k)
+
+
+def make_retriever(name: str):
+    if name == "local":
+        return LocalRetriever(LOCAL_INDEX_DIR)
+    return BedrockRetriever()
+
+
+retriever = make_retriever(RETRIEVER)
+
+# -------- Retrieval Cache --------
+class RetrievalCache:
+    """LRU of normalized chunk lists, bounded by the approximate size of the stored text."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (size, chunks)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def entry_size(chunks: List[Dict]) -> int:
+        return sum(len(c["text"]) + len(c["uri"]) + 64 for c in chunks) + 64
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return [dict(c) for c in entry[1]]
+
+    def put(self, key, chunks: List[Dict]):
+        size = self.entry_size(chunks)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= old[0]
+            self._entries[key] = (size, [dict(c) for c in chunks])
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def invalidate_kb(self, kb_id: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == kb_id]:
+                self._bytes -= self._entries.pop(key)[0]
+
+
+class KbVersionTracker:
+    """
+    Caches each knowledge base's version marker for KB_VERSION_CHECK_SECONDS.
+    Returns None when the marker can't be read, which disables caching for that request.
+    """
+
+    def __init__(self, source: str, check_seconds: float, on_change):
+        self.source = source
+        self.check_seconds = check_seconds
+        self.on_change = on_change
+        self._versions = {}  # kb_id -> (checked_at, version)
+        self._client = None
+        self._lock = threading.Lock()
+
+    def current(self, kb_id: str):
+        now = time.time()
+        cached = self._versions.get(kb_id)
+        if cached and now - cached[0] < self.check_seconds:
+            return cached[1]
+
+        try:
+            version = self.fetch(kb_id)
+        except Exception as e:
+            # Remember the failure too, so a missing permission costs one call per interval
+            print("KB version check error:", repr(e))
+            version = None
+
+        with self._lock:
+            previous = self._versions.get(kb_id)
+            self._versions[kb_id] = (now, version)
+        if previous and previous[1] != version:
+            self.on_change(kb_id)
+        return version
+
+    def fetch(self, kb_id: str) -> str:
+        if self.source == "none":
+            return ""
+        if self.source == "local":
+            with open(os.path.join(LOCAL_INDEX_DIR, kb_id, "manifest.json"), "r", encoding="utf-8") as f:
+                return str(json.load(f)["version"])
+        if self.source == "s3":
+            bucket, _, key = KB_VERSION_MARKER_URI.format(kb_id=kb_id)[len("s3://"):].partition("/")
+            if self._client is None:
+                self._client = aws_client("s3")
+            return self._client.head_object(Bucket=bucket, Key=key)["ETag"]
+
+        if self._client is None:
+            self._client = aws_client("bedrock-agent")
+        markers = []
+        sources = self._client.list_data_sources(knowledgeBaseId=kb_id).get("dataSourceSummaries", [])
+        for source in sorted(sources, key=lambda d: d["dataSourceId"]):
+            jobs = self._client.list_ingestion_jobs(
+                knowledgeBaseId=kb_id,
+                dataSourceId=source["dataSourceId"],
+                filters=[{"attribute": "STATUS", "operator": "EQ", "values": ["COMPLETE"]}],
+                sortBy={"attribute": "STARTED_AT", "order": "DESCENDING"},
+                maxResults=1,
+            ).get("ingestionJobSummaries", [])
+            markers.append(f"{source['dataSourceId']}:{jobs[0]['ingestionJobId'] if jobs else ''}")
+        return ",".join(markers)
+
+
+retrieval_cache = RetrievalCache(RETRIEVAL_CACHE_MAX_BYTES) if RETRIEVAL_CACHE_MAX_BYTES > 0 else None
+kb_versions = KbVersionTracker(
+    KB_VERSION_SOURCE,
+    KB_VERSION_CHECK_SECONDS,
+    on_change=lambda kb_id: retrieval_cache and retrieval_cache.invalidate_kb(kb_id),
+)
+
+# -------- Near-duplicate Cache --------
+similarity_cache = (
+    SimilarityCache(SIMILARITY_CACHE_MAX_ENTRIES, SIMILARITY_CACHE_TTL, SIMILARITY_CACHE_THRESHOLD)
+    if SIMILARITY_CACHE_MAX_ENTRIES > 0
+    else None
+)
+
+def similarity_namespace(tenant: Tenant, kb_ids: List[str]):
+    """Verdicts are only shared within one tenant and set of KB versions; None skips the cache."""
+    if similarity_cache is None:
+        return None
+    versions = []
+    for kb_id in kb_ids:
+        version = kb_versions.current(kb_id)
+        if version is None:
+            return None
+        versions.append(f"{kb_id}@{version}")
+    return f"{tenant.name}:{'+'.join(versions)}"
+
+# -------- Retrieval --------
+def retrieve_chunks(kb_id: str, claim: str, top_k: int = TOP_K) -> List[Dict]:
+    if retrieval_cache is None or KB_VERSION_SOURCE == "none":
+        return fetch_chunks(kb_id, claim, top_k)
+
+    version = kb_versions.current(kb_id)
+    if version is None:
+        return fetch_chunks(kb_id, claim, top_k)
+
+    # The version is part of the key so a put that races a re-ingest can never be served afterwards
+    key = (kb_id, version, normalize(claim).lower(), top_k)
+    chunks = retrieval_cache.get(key)
+    if chunks is None:
+        chunks = fetch_chunks(kb_id, claim, top_k)
+        retrieval_cache.put(key, chunks)
+    return chunks
+
+def fetch_chunks(kb_id: str, claim: str, top_k: int = TOP_K) -> List[Dict]:
     chunks = []
-    for idx, r in enumerate(response.get("retrievalResults", []), start=1):
-        text = r.get("content", {}).get("text", "")
-        score = safe_float(r.get("score", 0))
-        uri = extract_uri(r.get("location", {}))
-        chunks.append({"chunk_id": idx, "text": normalize(text), "score": score, "uri": uri})
+    for idx, r in enumerate(retriever.retrieve(kb_id, claim, top_k), start=1):
+        chunks.append({"chunk_id": idx, "text": normalize(r["text"]), "score": safe_float(r["score"]), "uri": r["uri"]})
     chunks.sort(key=lambda x: x["score"], reverse=True)
     return chunks
 
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_MAX_WORKERS)
+
+def retrieve_merged(kb_ids: List[str], claim: str, top_k: int = TOP_K) -> List[Dict]:
+    """Retrieves from every KB concurrently, so a multi-KB check costs about the slowest KB, not the sum."""
+    if len(kb_ids) == 1:
+        return retrieve_chunks(kb_ids[0], claim, top_k)
+    futures = [retrieval_executor.submit(retrieve_chunks, kb_id, claim, top_k) for kb_id in kb_ids]
+    return merge_chunks([(kb_id, f.result()) for kb_id, f in zip(kb_ids, futures)], top_k)
+
+def merge_chunks(per_kb: List[Tuple[str, List[Dict]]], top_k: int) -> List[Dict]:
+    """
+    Reciprocal-rank fusion across KBs: raw scores from different indexes (and
+    embedding models) aren't comparable, ranks are. Identical chunks returned
+    by several KBs are kept once and accumulate their fused score. Each chunk
+    keeps its raw "score", so MIN_SCORE and the fast path mean the same thing.
+    """
+    fused = {}  # normalized text -> [rrf, chunk]
+    for kb_id, chunks in per_kb:
+        for rank, chunk in enumerate(chunks, start=1):
+            key = chunk["text"].lower()
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = [0.0, {**chunk, "kb_id": kb_id}]
+            elif chunk["score"] > entry[1]["score"]:
+                entry[1] = {**chunk, "kb_id": kb_id}
+            entry[0] += 1.0 / (MERGE_RRF_K + rank)
+
+    ranked = sorted(fused.values(), key=lambda e: (e[0], e[1]["score"]), reverse=True)[:top_k]
+    return [{**chunk, "chunk_id": idx} for idx, (_, chunk) in enumerate(ranked, start=1)]
+
+# -------- Context Packing --------
+def chunk_tokens(chunk: Dict) -> int:
+    # Text plus the "[id] uri (score=...)" header format_chunks adds
+    return estimate_tokens(chunk["text"]) + estimate_tokens(chunk["uri"]) + 8
+
+def suffix_overlap(a: List[str], b: List[str]) -> int:
+    """Words by which a's tail overlaps b's head (0 below CHUNK_MERGE_MIN_OVERLAP_WORDS)."""
+    if not b:
+        return 0
+    for i in range(max(0, len(a) - len(b)), len(a) - CHUNK_MERGE_MIN_OVERLAP_WORDS + 1):
+        if a[i] == b[0] and a[i:] == b[:len(a) - i]:
+            return len(a) - i
+    return 0
+
+class PackedChunk:
+    def __init__(self, chunk: Dict):
+        self.chunk = dict(chunk)
+        self.set_words(chunk["text"].split())
+
+    def set_words(self, words: List[str]):
+        self.words = words
+        self.low = [w.lower() for w in words]
+        self.low_text = " ".join(self.low)
+        self.shingles = {tuple(self.low[i:i + 3]) for i in range(max(1, len(self.low) - 2))}
+        self.chunk["text"] = " ".join(words)
+
+    def duplicates(self, other: "PackedChunk") -> bool:
+        if other.low_text in self.low_text:
+            return True
+        union = len(self.shingles | other.shingles)
+        return union > 0 and len(self.shingles & other.shingles) / union >= CHUNK_DEDUP_THRESHOLD
+
+    def absorb(self, other: "PackedChunk") -> bool:
+        """Stitches an overlapping neighbour from the same document onto this chunk."""
+        if other.chunk["uri"] != self.chunk["uri"] or not self.chunk["uri"]:
+            return False
+        overlap = suffix_overlap(self.low, other.low)
+        if overlap:
+            self.set_words(self.words + other.words[overlap:])
+            return True
+        overlap = suffix_overlap(other.low, self.low)
+        if overlap:
+            self.set_words(other.words + self.words[overlap:])
+            return True
+        return False
+
+def compact_chunks(chunks: List[Dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[List[Dict], Dict]:
+    """
+    chunks (best first) → (packed chunks renumbered from 1, stats). A dropped
+    or absorbed chunk's rank goes to the better-ranked chunk that covers it.
+    """
+    tokens_in = sum(chunk_tokens(c) for c in chunks)
+    stats = {"chunksIn": len(chunks), "duplicates": 0, "merged": 0, "overBudget": 0, "tokensIn": tokens_in}
+    if CONTEXT_COMPACTION == "off" or not chunks:
+        return chunks, {**stats, "chunksOut": len(chunks), "tokensOut": tokens_in, "tokensSaved": 0}
+
+    kept = []
+    for chunk in chunks:
+        candidate = PackedChunk(chunk)
+        if any(k.duplicates(candidate) for k in kept):
+            stats["duplicates"] += 1
+            continue
+        if any(k.absorb(candidate) for k in kept):
+            stats["merged"] += 1
+            continue
+        kept.append(candidate)
+
+    packed, used = [], 0
+    for k in kept:
+        tokens = chunk_tokens(k.chunk)
+        if token_budget and used + tokens > token_budget:
+            if packed:
+                stats["overBudget"] += 1
+                continue
+            # The top chunk always goes in, trimmed to the budget
+            k.set_words(k.words[: max(1, (token_budget - estimate_tokens(k.chunk["uri"]) - 8) * 3 // 4)])
+            tokens = chunk_tokens(k.chunk)
+        packed.append({**k.chunk, "chunk_id": len(packed) + 1})
+        used += tokens
+
+    stats.update(chunksOut=len(packed), tokensOut=used, tokensSaved=tokens_in - used)
+    return packed, stats
+
 def retrieval_confidence(chunks):
     if not chunks:
         return 0.0
@@ -180,19 +750,152 @@ def build_summary(claim: str, final_label: str, signed_conf: float, retr_conf: f
     summary = f"{evidence_statement} {internal_rationale}"
     return limit_words_smart(summary)
 
+# -------- Fast Path --------
+def lexical_form(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+def fast_path(claim: str, chunks: List[Dict], min_score: float = MIN_SCORE):
+    """
+    Returns (internal_result, path) when retrieval alone decides the answer,
+    else None. internal_result has the same shape classify() returns.
+    """
+    if FAST_PATH == "off":
+        return None
+
+    unsure = {"label": "INTERNAL_UNSURE", "confidence": 0.0, "rationale": "", "citations": []}
+    if not chunks:
+        return unsure, "fast_empty"
+    if safe_float(chunks[0].get("score", 0)) < FAST_PATH_MIN_SCORE:
+        return unsure, "fast_low_score"
+
+    if FAST_PATH != "lexical":
+        return None
+
+    matcher = claim_matcher(claim)
+    if matcher.tokens:
+        found = set()
+        for c in chunks:
+            found |= matcher.found_tokens(c["text"])
+        if len(found) / len(matcher.tokens) < FAST_PATH_MIN_OVERLAP:
+            return unsure, "fast_low_overlap"
+
+    if safe_float(chunks[0].get("score", 0)) >= min_score:
+        claim_form = lexical_form(claim)
+        if len(claim_form.split()) >= 4 and f" {claim_form} " in f" {lexical_form(chunks[0]['text'])} ":
+            return {
+                "label": "INTERNAL_TRUE",
+                "confidence": FAST_PATH_LEXICAL_CONFIDENCE,
+                "rationale": "The claim appears verbatim in the top internal document.",
+                "citations": [{"chunk_id": chunks[0]["chunk_id"], "supports": True}],
+            }, "fast_lexical"
+
+    return None
+
+# -------- Prompt --------
+def format_chunks(chunks: List[Dict]) -> str:
+    return "\n\n".join([f"[{c['chunk_id']}] {c['uri']} (score={c['score']:.4f})\n{c['text']}" for c in chunks])
+
+def is_weak(chunks: List[Dict], min_score: float = MIN_SCORE) -> bool:
+    return (not chunks) or (safe_float(chunks[0].get("score", 0)) < min_score)
+
+def build_prompt(claim: str, chunks: List[Dict], min_score: float = MIN_SCORE) -> str:
+    prompt = (
+        "You are an INTERNAL fact-checking system.\n"
+        "Only use the knowledge base chunks below.\n"
+        "If clearly supported → INTERNAL_TRUE (confidence ≥ 0.8).\n"
+        "If clearly contradicted → INTERNAL_MISINFO (confidence ≥ 0.8).\n"
+        "Otherwise → INTERNAL_UNSURE.\n\n"
+        f"CLAIM:\n{claim}\n\n"
+        "CHUNKS (top first):\n"
+        + format_chunks(chunks)
+        + "\n\nReturn JSON with: label, confidence, rationale, citations[{chunk_id, supports}]."
+    )
+
+    if is_weak(chunks, min_score):
+        prompt = (
+            "IMPORTANT: Retrieval confidence is weak.\n"
+            "Unless clearly supported/contradicted, return INTERNAL_UNSURE.\n\n"
+            + prompt
+        )
+    return prompt
+
+def build_batch_prompt(items: List[Tuple[str, List[Dict]]], min_score: float = MIN_SCORE) -> str:
+    sections = []
+    for claim_id, (claim, chunks) in enumerate(items, start=1):
+        weak_note = "RETRIEVAL: WEAK\n" if is_weak(chunks, min_score) else ""
+        sections.append(f"=== CLAIM {claim_id} ===\n{claim}\n{weak_note}CHUNKS (top first):\n{format_chunks(chunks)}")
+
+    return (
+        "You are an INTERNAL fact-checking system.\n"
+        "Evaluate EACH claim independently, using only the knowledge base chunks listed under it.\n"
+        "If clearly supported → INTERNAL_TRUE (confidence ≥ 0.8).\n"
+        "If clearly contradicted → INTERNAL_MISINFO (confidence ≥ 0.8).\n"
+        "Otherwise → INTERNAL_UNSURE.\n"
+        "Claims marked RETRIEVAL: WEAK should be INTERNAL_UNSURE unless clearly supported/contradicted.\n"
+        "chunk_id values refer to the chunks of the same claim.\n\n"
+        + "\n\n".join(sections)
+        + "\n\nReturn ONLY a JSON array with one object per claim: "
+        "claim_id, label, confidence, rationale, citations[{chunk_id, supports}]."
+    )
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def plan_batches(items: List[Tuple[str, List[Dict]]], max_tokens: int = MAX_TOKENS) -> List[List[int]]:
+    """Groups item indexes so each call's expected output fits max_tokens and its prompt fits the input budget."""
+    max_claims = max(1, max_tokens // BATCH_TOKENS_PER_CLAIM)
+    batches, current, current_tokens = [], [], 0
+    for idx, (claim, chunks) in enumerate(items):
+        tokens = estimate_tokens(claim) + estimate_tokens(format_chunks(chunks))
+        if current and (len(current) >= max_claims or current_tokens + tokens > BATCH_MAX_PROMPT_TOKENS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(idx)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+# -------- Backpressure --------
+def is_throttle(e: Exception) -> bool:
+    code = (getattr(e, "response", None) or {}).get("Error", {}).get("Code")
+    return code in THROTTLE_ERROR_CODES
+
+
+model_backpressure = Backpressure(
+    "bedrock", MODEL_RATE_PER_SEC, MODEL_BURST, MODEL_CONCURRENCY_MAX, SHED_QUEUE_TIMEOUT, MODEL_MAX_RETRIES,
+    is_throttle=is_throttle, retry_after=SHED_RETRY_AFTER, backoff_base=MODEL_BACKOFF_BASE, backoff_max=MODEL_BACKOFF_MAX,
+)
+
 # -------- Model Call --------
-def classify(prompt):
-    response = br_client.converse(
-        modelId=MODEL_ID,
+def inference_config(tenant: Tenant = None) -> Dict:
+    if tenant is None:
+        return {"maxTokens": MAX_TOKENS, "temperature": TEMPERATURE}
+    return {"maxTokens": tenant.max_tokens, "temperature": tenant.temperature}
+
+def model_id(tenant: Tenant = None) -> str:
+    model = tenant.model_id if tenant else MODEL_ID
+    if not model:
+        raise RuntimeError("MODEL_ID is not set")
+    return model
+
+def converse(prompt: str, tenant: Tenant = None, trace: Trace = None) -> str:
+    response = model_backpressure.call(
+        get_br_client().converse,
+        modelId=model_id(tenant),
         messages=[{"role": "user", "content": [{"text": prompt}]}],
-        inferenceConfig={"maxTokens": MAX_TOKENS, "temperature": TEMPERATURE},
+        inferenceConfig=inference_config(tenant),
     )
+    if trace:
+        trace.add_usage(response.get("usage"))
 
     text_output = ""
     for block in response["output"]["message"]["content"]:
         if "text" in block:
             text_output += block["text"]
+    return text_output
 
+def parse_model_json(text_output: str) -> Dict:
     try:
         return json.loads(text_output)
     except Exception:
@@ -201,113 +904,316 @@ def classify(prompt):
             raise RuntimeError("Model did not return JSON.")
         return json.loads(match.group(0))
 
-# -------- Lambda --------
-def lambda_handler(event, context):
-    try:
-        body = parse_body(event)
+def converse_stream(prompt: str, on_text, tenant: Tenant = None, trace: Trace = None) -> str:
+    """converse() through ConverseStream, passing each piece of model text to on_text as it arrives."""
+    def run():
+        response = get_br_client().converse_stream(
+            modelId=model_id(tenant),
+            messages=[{"role": "user", "content": [{"text": prompt}]}],
+            inferenceConfig=inference_config(tenant),
+        )
+        text_output = ""
+        for event in response["stream"]:
+            if "contentBlockDelta" in event:
+                text = event["contentBlockDelta"]["delta"].get("text", "")
+                if text:
+                    text_output += text
+                    on_text(text)
+            elif "metadata" in event and trace:
+                trace.add_usage(event["metadata"].get("usage"))
+        return text_output
 
-        claim = normalize(body.get("text", ""))
-        if not claim:
-            return {"statusCode": 400, "body": json.dumps({"error": "Missing text"})}
+    return model_backpressure.call(run)
 
-        company = normalize(body.get("company", "") or event.get("company", ""))
-        kb_id = resolve_kb_id(company)
+def classify(prompt, tenant: Tenant = None, trace: Trace = None, on_text=None):
+    if on_text is not None:
+        return parse_model_json(converse_stream(prompt, on_text, tenant, trace))
+    return parse_model_json(converse(prompt, tenant, trace))
 
-        chunks = retrieve_chunks(kb_id, claim)
-        retr_conf = retrieval_confidence(chunks)
+def classify_batch(items: List[Tuple[str, List[Dict]]], tenant: Tenant = None, trace: Trace = None) -> List[Dict]:
+    """
+    One converse call for several (claim, chunks) pairs. Claims missing from an
+    unparseable or incomplete response are re-classified one at a time.
+    """
+    min_score = tenant.min_score if tenant else MIN_SCORE
+    by_id = {}
+    if len(items) > 1:
+        try:
+            text_output = converse(build_batch_prompt(items, min_score), tenant, trace)
+            match = re.search(r"\[.*\]", text_output, re.DOTALL)
+            parsed = json.loads(match.group(0)) if match else []
+            for entry in parsed:
+                if isinstance(entry, dict):
+                    by_id[int(entry.get("claim_id", 0))] = entry
+        except Overloaded:
+            # Falling back to one call per claim would only add load
+            raise
+        except Exception as e:
+            print("Batch classify error:", repr(e))
 
-        weak = (not chunks) or (safe_float(chunks[0].get("score", 0)) < MIN_SCORE)
+    results = []
+    for claim_id, (claim, chunks) in enumerate(items, start=1):
+        entry = by_id.get(claim_id)
+        if entry is None:
+            entry = classify(build_prompt(claim, chunks, min_score), tenant, trace)
+        results.append(entry)
+    return results
 
-        prompt = (
-            "You are an INTERNAL fact-checking system.\n"
-            "Only use the knowledge base chunks below.\n"
-            "If clearly supported → INTERNAL_TRUE (confidence ≥ 0.8).\n"
-            "If clearly contradicted → INTERNAL_MISINFO (confidence ≥ 0.8).\n"
-            "Otherwise → INTERNAL_UNSURE.\n\n"
-            f"CLAIM:\n{claim}\n\n"
-            "CHUNKS (top first):\n"
-            + "\n\n".join([f"[{c['chunk_id']}] {c['uri']} (score={c['score']:.4f})\n{c['text']}" for c in chunks])
-            + "\n\nReturn JSON with: label, confidence, rationale, citations[{chunk_id, supports}]."
-        )
+# -------- Result --------
+def build_top_match(claim: str, chunks: List[Dict], snippet: str = None):
+    if not chunks:
+        return None
+    if snippet is None:
+        snippet = extract_match_snippet(claim, chunks[0].get("text", ""), MATCH_SNIPPET_CHARS)
+    return {
+        "document": chunks[0]["uri"],  # ✅ simple s3://... uri only
+        "retrieval_score": chunks[0]["score"],
+        "match_snippet": snippet,
+    }
 
-        if weak:
-            prompt = (
-                "IMPORTANT: Retrieval confidence is weak.\n"
-                "Unless clearly supported/contradicted, return INTERNAL_UNSURE.\n\n"
-                + prompt
+def build_result(
+    claim: str,
+    company: str,
+    kb_ids: List[str],
+    chunks: List[Dict],
+    internal_result: Dict,
+    path: str = "llm",
+    context: Dict = None,
+) -> Dict:
+    retr_conf = retrieval_confidence(chunks)
+
+    internal_label = internal_result.get("label", "INTERNAL_UNSURE")
+    model_conf = safe_float(internal_result.get("confidence", 0))
+    internal_rationale = normalize(internal_result.get("rationale", ""))
+
+    if internal_label == "INTERNAL_TRUE":
+        signed_conf = clamp01(model_conf)
+    elif internal_label == "INTERNAL_MISINFO":
+        signed_conf = -clamp01(model_conf)
+    else:
+        signed_conf = 0.0
+
+    # A chunk can be both cited and the top match; extract each snippet once
+    chunks_by_id = {c["chunk_id"]: c for c in chunks}
+    snippets = {}
+
+    def snippet_for(chunk):
+        if chunk["chunk_id"] not in snippets:
+            snippets[chunk["chunk_id"]] = extract_match_snippet(claim, chunk.get("text", ""), MATCH_SNIPPET_CHARS)
+        return snippets[chunk["chunk_id"]]
+
+    if internal_label == "INTERNAL_UNSURE":
+        final_label = "unknown"
+        mapped_citations = []
+    else:
+        mapped_citations = []
+        for cite in (internal_result.get("citations") or []):
+            chunk_id = cite.get("chunk_id")
+            chunk = chunks_by_id.get(chunk_id)
+            if not chunk:
+                continue
+
+            mapped_citations.append(
+                {
+                    "document": chunk["uri"],  # ✅ simple s3://... uri only
+                    "chunk_id": chunk_id,
+                    "supports": bool(cite.get("supports", False)),
+                    "retrieval_score": chunk["score"],
+                    "source_text": chunk["text"][:CITATION_TEXT_CHARS],
+                    "match_snippet": snippet_for(chunk),
+                }
             )
 
-        internal_result = classify(prompt)
+        final_label = evaluate_truth(mapped_citations, signed_conf)
 
-        internal_label = internal_result.get("label", "INTERNAL_UNSURE")
-        model_conf = safe_float(internal_result.get("confidence", 0))
-        internal_rationale = normalize(internal_result.get("rationale", ""))
+    top_match = build_top_match(claim, chunks, snippet_for(chunks[0]) if chunks else None)
 
-        if internal_label == "INTERNAL_TRUE":
-            signed_conf = clamp01(model_conf)
-        elif internal_label == "INTERNAL_MISINFO":
-            signed_conf = -clamp01(model_conf)
-        else:
-            signed_conf = 0.0
+    summary = build_summary(
+        claim=claim,
+        final_label=final_label,
+        signed_conf=signed_conf,
+        retr_conf=retr_conf,
+        citations=mapped_citations,
+        internal_rationale=internal_rationale,
+    )
 
-        if internal_label == "INTERNAL_UNSURE":
-            final_label = "unknown"
-            mapped_citations = []
-        else:
-            mapped_citations = []
-            for cite in (internal_result.get("citations") or []):
-                chunk_id = cite.get("chunk_id")
-                chunk = next((c for c in chunks if c["chunk_id"] == chunk_id), None)
-                if not chunk:
-                    continue
-
-                mapped_citations.append(
-                    {
-                        "document": chunk["uri"],  # ✅ simple s3://... uri only
-                        "chunk_id": chunk_id,
-                        "supports": bool(cite.get("supports", False)),
-                        "retrieval_score": chunk["score"],
-                        "source_text": chunk["text"][:CITATION_TEXT_CHARS],
-                        "match_snippet": extract_match_snippet(claim, chunk.get("text", ""), MATCH_SNIPPET_CHARS),
-                    }
-                )
+    result = {
+        "claim": claim,
+        "company": company,
+        "kbId": kb_ids[0],
+        "retrievalConfidence": retr_conf,
+        "label": final_label,
+        "confidence": signed_conf,
+        "summary": summary,
+        "citations": mapped_citations,
+        "top_match": top_match,
+        "path": path,
+        "timestamp": int(time.time()),
+    }
+    if len(kb_ids) > 1:
+        result["kbIds"] = kb_ids
+    if context:
+        result["context"] = context
+    return result
 
-            final_label = evaluate_truth(mapped_citations, signed_conf)
+def shed_result(claim: str, company: str, kb_ids: List[str], chunks: List[Dict], context: Dict, retry_after: int) -> Dict:
+    """Immediate "unknown, retry later" answer for a claim the model had no capacity for. Never cached."""
+    result = build_result(claim, company, kb_ids, chunks, {"label": "INTERNAL_UNSURE"}, "shed", context)
+    result["summary"] = "The internal checker is at capacity right now; retry this claim shortly."
+    result["retryAfter"] = retry_after
+    return result
 
-        top_match = None
-        if chunks:
-            top_match = {
-                "document": chunks[0]["uri"],  # ✅ simple s3://... uri only
-                "retrieval_score": chunks[0]["score"],
-                "match_snippet": extract_match_snippet(claim, chunks[0].get("text", ""), MATCH_SNIPPET_CHARS),
-            }
+# -------- Streaming --------
+stream_store = build_stream_store(STREAM_TABLE, STREAM_TTL, STREAM_ENDPOINT_URL)
 
-        summary = build_summary(
-            claim=claim,
-            final_label=final_label,
-            signed_conf=signed_conf,
-            retr_conf=retr_conf,
-            citations=mapped_citations,
-            internal_rationale=internal_rationale,
-        )
+def evidence_fields(claim: str, kb_ids: List[str], chunks: List[Dict]) -> Dict:
+    """The "evidence" event: what retrieval found, before the model has looked at it."""
+    return {
+        "claim": claim,
+        "kbId": kb_ids[0],
+        "retrievalConfidence": retrieval_confidence(chunks),
+        "top_match": build_top_match(claim, chunks),
+    }
+
+# -------- Lambda --------
+def lambda_handler(event, context):
+    trace = Trace("internal", tokens=True)
+    stream = None
+    try:
+        body = parse_body(event)
+        trace.trace_id = body.get("traceId") or trace.trace_id
+        want_timings = bool(body.get("timings"))
 
+        company = body.get("company", "") or event.get("company", "")
+        company = ", ".join(map(str, company)) if isinstance(company, list) else normalize(company)
+
+        if isinstance(body.get("texts"), list):
+            return batch_lambda_handler(body["texts"], company, trace, want_timings)
+
+        claim = normalize(body.get("text", ""))
+        if not claim:
+            return {"statusCode": 400, "body": json.dumps({"error": "Missing text"})}
+        if body.get("streamId"):
+            stream = StreamWriter(stream_store, body["streamId"], "internal", STREAM_FLUSH_SECONDS)
+
+        with trace.stage("tenant"):
+            tenant, kb_ids = resolve_scope(company)
+
+        with trace.stage("similarity"):
+            namespace = similarity_namespace(tenant, kb_ids)
+            match = similarity_cache.lookup(namespace, claim) if namespace else None
+        if match:
+            result, matched_claim, similarity = match
+            result = {**result, "claim": claim, "similarClaim": {"claim": matched_claim, "similarity": similarity}}
+            path = "similar"
+            if stream:
+                stream.emit(
+                    "evidence", claim=claim, kbId=result.get("kbId"),
+                    retrievalConfidence=result.get("retrievalConfidence"), top_match=result.get("top_match"),
+                )
+        else:
+            with trace.stage("retrieve"):
+                chunks = retrieve_merged(kb_ids, claim, tenant.top_k)
+            with trace.stage("compact"):
+                chunks, context = compact_chunks(chunks)
+            if stream:
+                stream.emit("evidence", **evidence_fields(claim, kb_ids, chunks))
+            decided = fast_path(claim, chunks, tenant.min_score)
+            try:
+                if decided is None:
+                    with trace.stage("classify"):
+                        prompt = build_prompt(claim, chunks, tenant.min_score)
+                        decided = classify(prompt, tenant, trace, stream.delta if stream else None), "llm"
+                internal_result, path = decided
+                result = build_result(claim, company, kb_ids, chunks, internal_result, path, context)
+                if namespace:
+                    similarity_cache.store(namespace, claim, result)
+            except Overloaded as e:
+                result, path = shed_result(claim, company, kb_ids, chunks, context, e.retry_after), "shed"
+
+        trace.emit(mode="single", path=path, tenant=tenant.name)
+        if want_timings:
+            result = {**result, "timings": trace.summary()}
         return {
             "statusCode": 200,
-            "body": json.dumps(
-                {
-                    "claim": claim,
-                    "company": company,
-                    "kbId": kb_id,
-                    "retrievalConfidence": retr_conf,
-                    "label": final_label,
-                    "confidence": signed_conf,
-                    "summary": summary,
-                    "citations": mapped_citations,
-                    "top_match": top_match,
-                    "timestamp": int(time.time()),
-                }
-            ),
+            "body": json.dumps(result),
         }
 
     except Exception as e:
+        trace.emit(mode="single", error=str(e))
         return {"statusCode": 502, "body": json.dumps({"error": str(e)})}
+    finally:
+        # The orchestrator closes the stream with its verdict; only the model text still held back is left here
+        if stream:
+            stream.flush()
+
+def batch_lambda_handler(texts, company, trace: Trace = None, want_timings: bool = False):
+    """
+    {"texts": [...], "company": ...} → {"results": [...]}, one result per input
+    text in order. Retrieval runs concurrently; classification is packed into
+    as few model calls as the tenant's max_tokens allows.
+    """
+    trace = trace or Trace("internal", tokens=True)
+    claims = [normalize(t) for t in texts if isinstance(t, str)]
+    if not claims or not all(claims):
+        return {"statusCode": 400, "body": json.dumps({"error": "Missing text"})}
+
+    with trace.stage("tenant"):
+        tenant, kb_ids = resolve_scope(company)
+
+    with trace.stage("similarity"):
+        namespace = similarity_namespace(tenant, kb_ids)
+        matches = [similarity_cache.lookup(namespace, claim) if namespace else None for claim in claims]
+    claims_all, claims = claims, [claim for claim, match in zip(claims, matches) if match is None]
+
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+        with trace.stage("retrieve"):
+            packed = list(executor.map(lambda c: compact_chunks(retrieve_merged(kb_ids, c, tenant.top_k)), claims))
+        items = [(claim, chunks) for claim, (chunks, _) in zip(claims, packed)]
+
+        # Fast-path claims never reach the model
+        decided = [fast_path(claim, chunks, tenant.min_score) for claim, chunks in items]
+        pending = [i for i, d in enumerate(decided) if d is None]
+        batches = [[pending[j] for j in idxs] for idxs in plan_batches([items[i] for i in pending], tenant.max_tokens)]
+        def classify_or_shed(idxs):
+            try:
+                return [(entry, "llm") for entry in classify_batch([items[i] for i in idxs], tenant, trace)]
+            except Overloaded as e:
+                return [(e, "shed")] * len(idxs)
+
+        with trace.stage("classify"):
+            batch_results = list(executor.map(classify_or_shed, batches))
+
+    for idxs, entries in zip(batches, batch_results):
+        for idx, entry in zip(idxs, entries):
+            decided[idx] = entry
+
+    checked = iter([
+        (shed_result(claim, company, kb_ids, chunks, context, internal_result.retry_after), path)
+        if path == "shed"
+        else (build_result(claim, company, kb_ids, chunks, internal_result, path, context), path)
+        for (claim, chunks), (internal_result, path), (_, context) in zip(items, decided, packed)
+    ])
+    # Near-duplicates answered from the cache go back in their input positions
+    results = []
+    for claim, match in zip(claims_all, matches):
+        if match:
+            result, matched_claim, similarity = match
+            results.append({**result, "claim": claim, "similarClaim": {"claim": matched_claim, "similarity": similarity}})
+            continue
+        result, path = next(checked)
+        if namespace and path != "shed":
+            similarity_cache.store(namespace, claim, result)
+        results.append(result)
+    shed = sum(1 for _, path in decided if path == "shed")
+    trace.emit(
+        mode="batch", tenant=tenant.name, claims=len(claims_all), similar=len(claims_all) - len(claims),
+        batches=len(batches), shed=shed,
+    )
+    body = {"results": results, "batches": len(batches)}
+    if want_timings:
+        body["timings"] = trace.summary()
+    return {
+        "statusCode": 200,
+        "body": json.dumps(body),
+    }
@@ -1,278 +1,245 @@
-import base64
+import functools
+import hashlib
 import json
 import os
-import re
+import sys
 import time
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
 
-import boto3
-from botocore.config import Config
+import numpy as np
+
+import local_index
 
 # -------- ENV --------
-MODEL_ID = os.environ["MODEL_ID"]
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 
-KB_AWS_ID = os.environ.get("KB_AWS_ID", "")
-KB_CISCO_ID = os.environ.get("KB_CISCO_ID", "")
-
-TOP_K = int(os.environ.get("TOP_K", "5"))
-MIN_SCORE = float(os.environ.get("MIN_SCORE", "0.25"))
-
-MAX_TOKENS = int(os.environ.get("MAX_TOKENS", "800"))
-TEMPERATURE = float(os.environ.get("TEMPERATURE", "0.0"))
-
-CITATION_TEXT_CHARS = int(os.environ.get("CITATION_TEXT_CHARS", "600"))
-MATCH_SNIPPET_CHARS = int(os.environ.get("MATCH_SNIPPET_CHARS", "280"))
+# s3://bucket/prefix/{kb_id}/ or a local directory (file:///path/{kb_id}) standing in for S3
+INGEST_SOURCE_URI = os.environ.get("INGEST_SOURCE_URI", "")
+# Point at MinIO/LocalStack or any other S3-compatible store
+INGEST_ENDPOINT_URL = os.environ.get("INGEST_ENDPOINT_URL") or None
+INGEST_EXTENSIONS = tuple(os.environ.get("INGEST_EXTENSIONS", ".txt,.md,.json,.csv,.html").split(","))
+
+# Same directory the internal checker reads with RETRIEVER=local (an EFS mount on Lambda)
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", "/opt/index")
+# Where to publish the version marker read by KB_VERSION_SOURCE=s3 ("" = manifest only)
+KB_VERSION_MARKER_URI = os.environ.get("KB_VERSION_MARKER_URI", "")
+
+CHUNK_WORDS = int(os.environ.get("CHUNK_WORDS", "200"))
+CHUNK_OVERLAP_WORDS = int(os.environ.get("CHUNK_OVERLAP_WORDS", "40"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+SHARD_MAX_CHUNKS = int(os.environ.get("SHARD_MAX_CHUNKS", "20000"))
+
+INGEST_EMBEDDER = os.environ.get("INGEST_EMBEDDER", "hash")  # hash | bedrock
+# 0 = the embedder's default: 1024 for bedrock (Titan v2 only takes 256, 512 or 1024), 384 for hash
+EMBED_DIM = int(os.environ.get("EMBED_DIM", "0"))
+EMBED_MODEL_ID = os.environ.get("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+# Concurrent invoke_model calls per batch with the bedrock embedder (Titan embeds one text per call)
+EMBED_MAX_WORKERS = int(os.environ.get("EMBED_MAX_WORKERS", "8"))
 
 # -------- Clients --------
-cfg = Config(retries={"max_attempts": 2})
-kb_client = boto3.client("bedrock-agent-runtime", region_name=AWS_REGION, config=cfg)
-br_client = boto3.client("bedrock-runtime", region_name=AWS_REGION, config=cfg)
-
-# -------- Helpers --------
-def parse_body(event):
-    body = event.get("body", "")
-    if event.get("isBase64Encoded"):
-        body = base64.b64decode(body).decode("utf-8")
-    return json.loads(body) if body else {}
-
-def normalize(text):
-    return re.sub(r"\s+", " ", (text or "").strip())
-
-def extract_uri(location):
-    if not isinstance(location, dict):
-        return ""
-    if "s3Location" in location:
-        return location["s3Location"].get("uri", "")
-    return ""
-
-def resolve_kb_id(company_raw: str) -> str:
-    company = normalize(company_raw).lower()
-    if company == "aws":
-        if not KB_AWS_ID:
-            raise RuntimeError("KB_AWS_ID is not set")
-        return KB_AWS_ID
-    if company == "cisco":
-        if not KB_CISCO_ID:
-            raise RuntimeError("KB_CISCO_ID is not set")
-        return KB_CISCO_ID
-    raise RuntimeError("Invalid company flag. Use 'aws' or 'cisco'.")
-
-def safe_float(x, default=0.0):
-    try:
-        return float(x)
-    except Exception:
-        return default
-
-def extract_match_snippet(claim: str, chunk_text: str, max_chars: int) -> str:
-    """
-    Best-effort snippet: find a close phrase overlap around the first matching word.
-    If no overlap, return the first max_chars chars of chunk_text.
-    """
-    claim = normalize(claim).lower()
-    text = normalize(chunk_text)
-    if not text:
-        return ""
-
-    low = text.lower()
-
-    # Try to anchor on a meaningful token from claim
-    tokens = [t for t in re.findall(r"[a-z0-9]{4,}", claim) if t not in {"this", "that", "with", "from", "have", "uses"}]
-    anchor_pos = -1
-    anchor = None
-    for t in tokens[:12]:
-        p = low.find(t)
-        if p != -1:
-            anchor_pos = p
-            anchor = t
-            break
-
-    if anchor_pos == -1:
-        return text[:max_chars]
-
-    # Center snippet around anchor
-    start = max(0, anchor_pos - max_chars // 2)
-    end = min(len(text), start + max_chars)
-    snippet = text[start:end].strip()
-
-    # Add ellipses if trimmed
-    if start > 0:
-        snippet = "…" + snippet
-    if end < len(text):
-        snippet = snippet + "…"
-
-    return snippet
-
-# -------- Retrieval --------
-def retrieve_chunks(kb_id: str, claim: str) -> List[Dict]:
-    response = kb_client.retrieve(
-        knowledgeBaseId=kb_id,
-        retrievalQuery={"text": claim},
-        retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": TOP_K}},
-    )
-
+# Built on first use: a run over a local directory with the hash embedder never imports boto3
+@functools.lru_cache(maxsize=None)
+def aws_client(service: str):
+    import boto3
+    from botocore.config import Config
+
+    endpoint_url = INGEST_ENDPOINT_URL if service == "s3" else None
+    return boto3.client(service, region_name=AWS_REGION, endpoint_url=endpoint_url, config=Config(retries={"max_attempts": 2}))
+
+# -------- Sources --------
+def split_s3_uri(uri: str) -> Tuple[str, str]:
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+def iter_s3_documents(uri: str) -> Iterator[Tuple[str, str, bytes]]:
+    """Yields (doc_id, uri, body) one object at a time, so memory stays flat."""
+    bucket, prefix = split_s3_uri(uri)
+    s3_client = aws_client("s3")
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if not key.endswith(INGEST_EXTENSIONS):
+                continue
+            body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+            yield key, f"s3://{bucket}/{key}", body
+
+def iter_local_documents(root: str) -> Iterator[Tuple[str, str, bytes]]:
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if not name.endswith(INGEST_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                yield os.path.relpath(path, root), f"file://{path}", f.read()
+
+def iter_documents(source_uri: str) -> Iterator[Tuple[str, str, bytes]]:
+    if source_uri.startswith("s3://"):
+        return iter_s3_documents(source_uri)
+    if source_uri.startswith("file://"):
+        return iter_local_documents(source_uri[len("file://"):])
+    return iter_local_documents(source_uri)
+
+# -------- Chunking --------
+def chunk_text(text: str) -> List[str]:
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, CHUNK_WORDS - CHUNK_OVERLAP_WORDS)
     chunks = []
-    for idx, r in enumerate(response.get("retrievalResults", []), start=1):
-        text = r.get("content", {}).get("text", "")
-        score = safe_float(r.get("score", 0))
-        uri = extract_uri(r.get("location", {}))
-        chunks.append(
-            {
-                "chunk_id": idx,
-                "text": normalize(text),
-                "score": score,
-                "uri": uri,
-            }
-        )
-    chunks.sort(key=lambda x: x["score"], reverse=True)
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + CHUNK_WORDS]))
+        if start + CHUNK_WORDS >= len(words):
+            break
     return chunks
 
-def retrieval_confidence(chunks):
-    if not chunks:
-        return 0.0
-    top = safe_float(chunks[0].get("score", 0))
-    return top / (top + 1.0) if top > 0 else 0.0
-
-# -------- Your Label Function --------
-def evaluate_truth(citations, confidence):
-    if citations is None:
-        return "unknown"
-
-    if confidence > 0.6:
-        return "likely true"
-    elif confidence < -0.6:
-        return "likely false"
-    elif confidence == 0 and not citations:
-        return "unknown"
-    else:
-        return "mixed or uncertain"
-
-# -------- Model Call --------
-def classify(prompt):
-    response = br_client.converse(
-        modelId=MODEL_ID,
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        inferenceConfig={"maxTokens": MAX_TOKENS, "temperature": TEMPERATURE},
+# -------- Ingestion --------
+def make_embedder():
+    if INGEST_EMBEDDER == "bedrock":
+        return local_index.make_embedder(
+            "bedrock", EMBED_DIM or None, aws_client("bedrock-runtime"), EMBED_MODEL_ID, EMBED_MAX_WORKERS
+        )
+    return local_index.make_embedder("hash", EMBED_DIM or None)
+
+def next_shard_name(manifest: Dict) -> str:
+    # Monotonic, so a dropped shard's name is never reused under a reader that still maps it
+    seq = max((int(name.rsplit("-", 1)[1]) for name in manifest["shards"]), default=-1) + 1
+    seq = max(seq, manifest.get("next_shard", 0))
+    manifest["next_shard"] = seq + 1
+    return f"shard-{seq:05d}"
+
+def flush_shard(index_dir: str, manifest: Dict, embedder, rows: List[Dict], pending_docs: Dict) -> str:
+    """Embeds rows in batches, writes them as one new shard and points their documents at it."""
+    shard = next_shard_name(manifest)
+    vectors = [
+        embedder.embed_batch([r["text"] for r in rows[i:i + EMBED_BATCH_SIZE]])
+        for i in range(0, len(rows), EMBED_BATCH_SIZE)
+    ]
+    stacked = np.concatenate(vectors) if vectors else np.zeros((0, embedder.dim), dtype=np.float32)
+    local_index.write_shard(index_dir, shard, rows, stacked)
+    manifest["shards"].append(shard)
+    for doc_id, record in pending_docs.items():
+        manifest["documents"][doc_id] = {**record, "shard": shard}
+    return shard
+
+def publish_version_marker(kb_id: str, version: str):
+    if not KB_VERSION_MARKER_URI:
+        return
+    bucket, key = split_s3_uri(KB_VERSION_MARKER_URI.format(kb_id=kb_id))
+    aws_client("s3").put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps({"kb_id": kb_id, "version": version}).encode("utf-8"),
+        ContentType="application/json",
     )
 
-    text_output = ""
-    for block in response["output"]["message"]["content"]:
-        if "text" in block:
-            text_output += block["text"]
+def ingest(kb_id: str, source_uri: str) -> Dict:
+    """
+    Incrementally syncs LOCAL_INDEX_DIR/<kb_id> with the documents under
+    source_uri. Unchanged documents (same sha256) are skipped; changed ones are
+    re-chunked into new shards; documents gone from the source are retired.
+    """
+    started = time.perf_counter()
+    index_dir = os.path.join(LOCAL_INDEX_DIR, kb_id)
+    os.makedirs(index_dir, exist_ok=True)
+
+    embedder = make_embedder()
+    manifest = local_index.read_manifest(index_dir) or {
+        "version": "",
+        "dim": embedder.dim,
+        "embedder": embedder.name,
+        "shards": [],
+        "documents": {},
+    }
+    if (manifest["embedder"], manifest["dim"]) != (embedder.name, embedder.dim):
+        raise RuntimeError(
+            f"Index was built with {manifest['embedder']}/{manifest['dim']}; "
+            f"re-ingesting with {embedder.name}/{embedder.dim} needs a fresh LOCAL_INDEX_DIR"
+        )
 
-    try:
-        return json.loads(text_output)
-    except Exception:
-        match = re.search(r"\{.*\}", text_output, re.DOTALL)
-        if not match:
-            raise RuntimeError("Model did not return JSON.")
-        return json.loads(match.group(0))
+    seen, rows, pending_docs = set(), [], {}
+    docs_seen = docs_changed = chunks_written = 0
+    new_shards = []
+    for doc_id, uri, body in iter_documents(source_uri):
+        docs_seen += 1
+        seen.add(doc_id)
+        digest = hashlib.sha256(body).hexdigest()
+        if manifest["documents"].get(doc_id, {}).get("hash") == digest:
+            continue
+
+        docs_changed += 1
+        chunks = chunk_text(body.decode("utf-8", errors="ignore"))
+        rows.extend({"doc_id": doc_id, "uri": uri, "text": text} for text in chunks)
+        pending_docs[doc_id] = {"hash": digest, "uri": uri}
+        chunks_written += len(chunks)
+
+        if len(rows) >= SHARD_MAX_CHUNKS:
+            new_shards.append(flush_shard(index_dir, manifest, embedder, rows, pending_docs))
+            rows, pending_docs = [], {}
+
+    if pending_docs:
+        new_shards.append(flush_shard(index_dir, manifest, embedder, rows, pending_docs))
+
+    deleted = [doc_id for doc_id in manifest["documents"] if doc_id not in seen]
+    for doc_id in deleted:
+        del manifest["documents"][doc_id]
+
+    changed = bool(new_shards or deleted)
+    dropped = []
+    if changed:
+        # Shards whose documents have all been superseded carry no live chunks
+        live_shards = {record["shard"] for record in manifest["documents"].values()}
+        dropped = [shard for shard in manifest["shards"] if shard not in live_shards]
+        manifest["shards"] = [shard for shard in manifest["shards"] if shard in live_shards]
+        state_hash = hashlib.sha256(json.dumps(manifest["documents"], sort_keys=True).encode("utf-8")).hexdigest()
+        manifest["version"] = f"{int(time.time())}-{state_hash[:12]}"
+        local_index.write_manifest(index_dir, manifest)
+        for shard in dropped:
+            shard_dir = os.path.join(index_dir, shard)
+            for name in os.listdir(shard_dir):
+                os.remove(os.path.join(shard_dir, name))
+            os.rmdir(shard_dir)
+        publish_version_marker(kb_id, manifest["version"])
+
+    elapsed = time.perf_counter() - started
+    return {
+        "kb_id": kb_id,
+        "version": manifest["version"],
+        "changed": changed,
+        "docs_seen": docs_seen,
+        "docs_changed": docs_changed,
+        "docs_deleted": len(deleted),
+        "chunks_written": chunks_written,
+        "shards_written": new_shards,
+        "shards_dropped": dropped,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(docs_seen / elapsed, 1) if elapsed else 0.0,
+        "chunks_per_sec": round(chunks_written / elapsed, 1) if elapsed else 0.0,
+    }
 
 # -------- Lambda --------
 def lambda_handler(event, context):
+    """
+    Invoked on a schedule or by an S3 notification. Event: {"kb_id": ..., "source_uri": ...};
+    source_uri defaults to INGEST_SOURCE_URI with {kb_id} substituted.
+    """
     try:
-        body = parse_body(event)
-
-        claim = normalize(body.get("text", ""))
-        if not claim:
-            return {"statusCode": 400, "body": json.dumps({"error": "Missing text"})}
-
-        company = normalize(body.get("company", "") or event.get("company", ""))
-        kb_id = resolve_kb_id(company)
-
-        chunks = retrieve_chunks(kb_id, claim)
-        retr_conf = retrieval_confidence(chunks)
-
-        weak = (not chunks) or (safe_float(chunks[0].get("score", 0)) < MIN_SCORE)
-
-        prompt = (
-            "You are an INTERNAL fact-checking system.\n"
-            "Only use the knowledge base chunks below.\n"
-            "If clearly supported → INTERNAL_TRUE (confidence ≥ 0.8).\n"
-            "If clearly contradicted → INTERNAL_MISINFO (confidence ≥ 0.8).\n"
-            "Otherwise → INTERNAL_UNSURE.\n\n"
-            f"CLAIM:\n{claim}\n\n"
-            "CHUNKS (top first):\n"
-            + "\n\n".join(
-                [f"[{c['chunk_id']}] {c['uri']} (score={c['score']:.4f})\n{c['text']}" for c in chunks]
-            )
-            + "\n\nReturn JSON with: label, confidence, rationale, citations[{chunk_id, supports}]."
-        )
+        kb_id = event.get("kb_id") or event.get("company")
+        if not kb_id:
+            return {"statusCode": 400, "body": json.dumps({"error": "Missing kb_id"})}
 
-        if weak:
-            prompt = (
-                "IMPORTANT: Retrieval confidence is weak.\n"
-                "Unless clearly supported/contradicted, return INTERNAL_UNSURE.\n\n"
-                + prompt
-            )
-
-        internal_result = classify(prompt)
-
-        internal_label = internal_result.get("label", "INTERNAL_UNSURE")
-        model_conf = safe_float(internal_result.get("confidence", 0))
-
-        # Convert INTERNAL_* to signed confidence
-        if internal_label == "INTERNAL_TRUE":
-            signed_conf = model_conf
-        elif internal_label == "INTERNAL_MISINFO":
-            signed_conf = -model_conf
-        else:
-            signed_conf = 0.0
-
-        # If UNSURE → force unknown (no citations)
-        if internal_label == "INTERNAL_UNSURE":
-            final_label = "unknown"
-            mapped_citations = []
-        else:
-            mapped_citations = []
-            for cite in (internal_result.get("citations") or []):
-                chunk_id = cite.get("chunk_id")
-                chunk = next((c for c in chunks if c["chunk_id"] == chunk_id), None)
-                if not chunk:
-                    continue
-
-                snippet = extract_match_snippet(claim, chunk.get("text", ""), MATCH_SNIPPET_CHARS)
-
-                mapped_citations.append(
-                    {
-                        "document": chunk["uri"],
-                        "chunk_id": chunk_id,
-                        "supports": bool(cite.get("supports", False)),
-                        "retrieval_score": chunk["score"],
-                        "source_text": chunk["text"][:CITATION_TEXT_CHARS],
-                        # ✅ extra snippet showing where it matched
-                        "match_snippet": snippet,
-                    }
-                )
-
-            final_label = evaluate_truth(mapped_citations, signed_conf)
-
-        # Optional: top match snippet even when unknown (helps debugging)
-        top_match = None
-        if chunks:
-            top_match = {
-                "document": chunks[0]["uri"],
-                "retrieval_score": chunks[0]["score"],
-                "match_snippet": extract_match_snippet(claim, chunks[0].get("text", ""), MATCH_SNIPPET_CHARS),
-            }
-
-        return {
-            "statusCode": 200,
-            "body": json.dumps(
-                {
-                    "claim": claim,
-                    "company": company,
-                    "kbId": kb_id,
-                    "retrievalConfidence": retr_conf,
-                    "label": final_label,  # ONLY your 4 categories
-                    "confidence": signed_conf,
-                    "citations": mapped_citations,
-                    #  additional field: what it matched best (even if unknown)
-                    "top_match": top_match,
-                    "timestamp": int(time.time()),
-                }
-            ),
-        }
+        source_uri = event.get("source_uri") or INGEST_SOURCE_URI.format(kb_id=kb_id)
+        if not source_uri:
+            return {"statusCode": 400, "body": json.dumps({"error": "INGEST_SOURCE_URI is not set"})}
+
+        report = ingest(kb_id, source_uri)
+        print(json.dumps({"event": "ingestion", **report}))
+        return {"statusCode": 200, "body": json.dumps(report)}
 
     except Exception as e:
         return {"statusCode": 502, "body": json.dumps({"error": str(e)})}
+
+
+if __name__ == "__main__":
+    # Offline run: python ingestion_trigger.py <kb_id> <source_uri or directory>
+    print(json.dumps(ingest(sys.argv[1], sys.argv[2]), indent=2))
@@ -0,0 +1,295 @@
+"""
+Local hybrid retrieval index: BM25 over an inverted index plus a dense vector
+index, fused with reciprocal-rank fusion. Arrays are memory-mapped, so a warm
+Lambda pays for loading once and queries touch only the pages they need.
+
+Index directory layout (one directory per knowledge base):
+
+    manifest.json           {"version", "dim", "embedder", "shards": [...], "next_shard",
+                             "documents": {doc_id: {"shard", "hash", "uri"}}}
+    <shard>/terms.json      {term: [offset, count]} into postings.npy
+    <shard>/postings.npy    int32 (n, 2): chunk row, term frequency
+    <shard>/doclen.npy      int32 (rows,) token count per chunk
+    <shard>/vectors.npy     float32 (rows, dim), L2-normalized
+    <shard>/chunks.jsonl    {"doc_id", "uri", "text"} per chunk row
+
+A chunk is live only while the manifest still maps its doc_id to the chunk's
+shard, so re-ingesting a document into a new shard retires its old chunks
+without rewriting the old shard.
+"""
+import json
+import math
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "of", "in", "on", "at", "to",
+    "for", "by", "and", "or", "that", "this", "it", "its", "as", "with", "from",
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+DEFAULT_DIM = 384  # hashing embedder; any size works
+# Titan Text Embeddings v2 only returns these sizes
+TITAN_DIMENSIONS = (256, 512, 1024)
+DEFAULT_BEDROCK_DIM = 1024
+EMBED_MAX_WORKERS = 8
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+# -------- Embedders --------
+class HashingEmbedder:
+    """
+    Signed feature hashing of unigrams and bigrams. No model, no network, and
+    deterministic across processes, so ingestion and queries always agree.
+    """
+
+    name = "hash"
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+
+    def embed_batch(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                h = zlib.crc32(feature.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class BedrockEmbedder:
+    """
+    Amazon Titan text embeddings (v2). The model takes one text per
+    invoke_model call, so a batch is embedded with up to `max_workers` calls
+    in flight; a single text (a query) is embedded on the caller's thread.
+    """
+
+    name = "bedrock"
+
+    def __init__(self, client, model_id, dim=DEFAULT_BEDROCK_DIM, max_workers=EMBED_MAX_WORKERS):
+        if dim not in TITAN_DIMENSIONS:
+            raise ValueError(f"Titan v2 embeddings are {', '.join(map(str, TITAN_DIMENSIONS))} wide, not {dim}")
+        self.client = client
+        self.model_id = model_id
+        self.dim = dim
+        self.max_workers = max(1, max_workers)
+        self._executor = None
+
+    def embed_one(self, text):
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            body=json.dumps({"inputText": text, "dimensions": self.dim, "normalize": True}),
+        )
+        return json.loads(response["body"].read())["embedding"]
+
+    def embed_batch(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if len(texts) == 1 or self.max_workers == 1:
+            embeddings = map(self.embed_one, texts)
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed")
+            embeddings = self._executor.map(self.embed_one, texts)
+        for row, embedding in enumerate(embeddings):
+            out[row] = embedding
+        return out
+
+
+def make_embedder(name, dim=None, bedrock_client=None, model_id=None, max_workers=EMBED_MAX_WORKERS):
+    """dim None = the embedder's default size."""
+    if name == "bedrock":
+        if bedrock_client is None or not model_id:
+            raise RuntimeError("Bedrock embedder needs a bedrock-runtime client and model id")
+        return BedrockEmbedder(bedrock_client, model_id, dim or DEFAULT_BEDROCK_DIM, max_workers)
+    return HashingEmbedder(dim or DEFAULT_DIM)
+
+
+# -------- Writing --------
+def read_manifest(index_dir):
+    path = os.path.join(index_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(index_dir, manifest):
+    # Write-then-rename so readers never see a half-written manifest
+    path = os.path.join(index_dir, "manifest.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def write_shard(index_dir, shard, rows, vectors):
+    """rows: [{"doc_id", "uri", "text"}], vectors: float32 (len(rows), dim)."""
+    shard_dir = os.path.join(index_dir, shard)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    postings = {}
+    doclen = np.zeros(len(rows), dtype=np.int32)
+    for row, chunk in enumerate(rows):
+        tokens = tokenize(chunk["text"])
+        doclen[row] = len(tokens)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            postings.setdefault(token, []).append((row, tf))
+
+    terms, flat, offset = {}, [], 0
+    for token in sorted(postings):
+        entries = postings[token]
+        terms[token] = [offset, len(entries)]
+        flat.extend(entries)
+        offset += len(entries)
+
+    np.save(os.path.join(shard_dir, "postings.npy"), np.asarray(flat, dtype=np.int32).reshape(-1, 2))
+    np.save(os.path.join(shard_dir, "doclen.npy"), doclen)
+    np.save(os.path.join(shard_dir, "vectors.npy"), np.asarray(vectors, dtype=np.float32))
+    with open(os.path.join(shard_dir, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f)
+    with open(os.path.join(shard_dir, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for chunk in rows:
+            f.write(json.dumps({"doc_id": chunk["doc_id"], "uri": chunk["uri"], "text": chunk["text"]}) + "\n")
+
+
+def build_index(index_dir, documents, embedder, version, shard="shard-00000"):
+    """
+    Full (non-incremental) build into a single shard.
+    documents: iterable of {"doc_id", "uri", "hash", "chunks": [text, ...]}.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    rows, records = [], {}
+    for doc in documents:
+        records[doc["doc_id"]] = {"shard": shard, "hash": doc.get("hash", ""), "uri": doc["uri"]}
+        rows.extend({"doc_id": doc["doc_id"], "uri": doc["uri"], "text": text} for text in doc["chunks"])
+
+    vectors = embedder.embed_batch([r["text"] for r in rows]) if rows else np.zeros((0, embedder.dim), np.float32)
+    write_shard(index_dir, shard, rows, vectors)
+    write_manifest(
+        index_dir,
+        {"version": version, "dim": embedder.dim, "embedder": embedder.name, "shards": [shard], "documents": records},
+    )
+
+
+# -------- Reading --------
+class Shard:
+    def __init__(self, index_dir, name, documents):
+        path = os.path.join(index_dir, name)
+        with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as f:
+            self.terms = json.load(f)
+        with open(os.path.join(path, "chunks.jsonl"), "r", encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f if line.strip()]
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.doclen = np.load(os.path.join(path, "doclen.npy"))
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.live = np.array(
+            [documents.get(c["doc_id"], {}).get("shard") == name for c in self.chunks], dtype=bool
+        )
+
+    def term_postings(self, term):
+        entry = self.terms.get(term)
+        if entry is None:
+            return None, None
+        block = self.postings[entry[0]:entry[0] + entry[1]]
+        rows = np.asarray(block[:, 0])
+        keep = self.live[rows]
+        return rows[keep], np.asarray(block[:, 1])[keep].astype(np.float32)
+
+
+class HybridIndex:
+    def __init__(self, index_dir, bedrock_client=None, embed_model_id=None):
+        manifest = read_manifest(index_dir)
+        if manifest is None:
+            raise RuntimeError(f"No local index at {index_dir}")
+        self.version = manifest["version"]
+        self.shards = [Shard(index_dir, name, manifest["documents"]) for name in manifest["shards"]]
+        self.embedder = make_embedder(manifest["embedder"], manifest["dim"], bedrock_client, embed_model_id)
+
+        self.live_count = int(sum(s.live.sum() for s in self.shards))
+        total_len = sum(int(s.doclen[s.live].sum()) for s in self.shards)
+        self.avgdl = total_len / self.live_count if self.live_count else 0.0
+
+    def bm25(self, query_terms):
+        """Per-shard BM25 score arrays (dead rows stay 0)."""
+        per_term = {}
+        for term in set(query_terms):
+            hits = [shard.term_postings(term) for shard in self.shards]
+            df = sum(len(rows) for rows, _ in hits if rows is not None)
+            if df:
+                per_term[term] = (math.log(1 + (self.live_count - df + 0.5) / (df + 0.5)), hits)
+
+        scores = [np.zeros(len(s.chunks), dtype=np.float32) for s in self.shards]
+        for idf, hits in per_term.values():
+            for shard_idx, (rows, tf) in enumerate(hits):
+                if rows is None or not len(rows):
+                    continue
+                dl = self.shards[shard_idx].doclen[rows]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / self.avgdl)
+                scores[shard_idx][rows] += idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def dense(self, query):
+        q = self.embedder.embed_batch([query])[0]
+        sims = []
+        for shard in self.shards:
+            s = np.asarray(shard.vectors @ q, dtype=np.float32) if len(shard.chunks) else np.zeros(0, np.float32)
+            s[~shard.live] = -np.inf
+            sims.append(s)
+        return sims
+
+    @staticmethod
+    def ranked(per_shard, candidates, positive_only):
+        """Global (shard, row) ranking of the best `candidates` entries."""
+        pool = []
+        for shard_idx, scores in enumerate(per_shard):
+            if not len(scores):
+                continue
+            k = min(candidates, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            pool.extend(
+                (float(scores[row]), shard_idx, int(row))
+                for row in top
+                if np.isfinite(scores[row]) and (scores[row] > 0 or not positive_only)
+            )
+        pool.sort(key=lambda x: x[0], reverse=True)
+        return [(shard_idx, row) for _, shard_idx, row in pool[:candidates]]
+
+    def search(self, query, top_k, candidates=50):
+        """
+        Returns [{"text", "uri", "score"}] ranked by reciprocal-rank fusion of the
+        BM25 and dense rankings. "score" is the dense cosine similarity, clipped
+        to [0, 1], so it stays comparable with vector-store relevance scores.
+        """
+        if not self.live_count:
+            return []
+
+        sims = self.dense(query)
+        fused = {}
+        for ranking in (self.ranked(self.bm25(tokenize(query)), candidates, True), self.ranked(sims, candidates, False)):
+            for rank, key in enumerate(ranking, start=1):
+                fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+
+        best = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        results = []
+        for (shard_idx, row), _ in best:
+            chunk = self.shards[shard_idx].chunks[row]
+            results.append(
+                {"text": chunk["text"], "uri": chunk["uri"], "score": max(0.0, min(1.0, float(sims[shard_idx][row])))}
+            )
+        return results
@@ -0,0 +1,214 @@
+"""
+Backpressure shared by the internal and public checkers: a token bucket, an
+AIMD concurrency limit and jittered retries in front of one downstream, with
+load shedding ("retry later") when the downstream is saturated.
+
+All of this state lives in module globals, so it is per execution
+environment. A Lambda environment serves one request at a time, so these
+limits only bound the fan-out inside a request (batch claims, citation
+probes, the Gemini and Backboard calls of one check); they do not cap the
+aggregate rate across environments. Use reserved concurrency on the function
+for that; the throttle feedback here still backs each environment off when
+the downstream pushes back.
+"""
+import asyncio
+import random
+import threading
+import time
+
+
+class Overloaded(RuntimeError):
+    """A downstream is saturated; the caller should answer "retry later" instead of waiting."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is overloaded; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`. A rate of 0 never limits."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """Takes a token and returns the seconds to sleep before using it, or None if that exceeds max_wait."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by 1/limit per successful call (about one
+    slot per round of calls) and halves on a throttle. Only calls admitted
+    after the last decrease can cause another, so a burst of throttles from
+    calls that were already in flight counts once. A caller whose expected
+    wait (queue depth / limit x mean call time) already exceeds max_wait is
+    turned away at once instead of timing out in the queue.
+    """
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = max(self.min_limit, self.max_limit / 2)
+        self.inflight = 0
+        self.waiting = 0
+        self.mean_seconds = 0.0
+        self.decreased_at = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self):
+        """Returns the admission time if a slot is free right now, else None. Never blocks."""
+        with self._cond:
+            if self.inflight >= int(self.limit):
+                return None
+            self.inflight += 1
+            return time.monotonic()
+
+    def acquire(self, max_wait):
+        """Returns the admission time (pass it to release), or None if no slot freed up within max_wait."""
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            if self.inflight >= int(self.limit) and (self.waiting + 1) / int(self.limit) * self.mean_seconds > max_wait:
+                return None
+            self.waiting += 1
+            try:
+                while self.inflight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.inflight += 1
+            return time.monotonic()
+
+    def release(self, admitted, throttled=False):
+        with self._cond:
+            self.inflight -= 1
+            self.mean_seconds += 0.2 * ((time.monotonic() - admitted) - self.mean_seconds)
+            if not throttled:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            elif admitted >= self.decreased_at:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self.decreased_at = time.monotonic()
+            self._cond.notify()
+
+
+class Backpressure:
+    """
+    Token bucket, AIMD limiter and jittered retries in front of one downstream.
+    A call that can't get a token or a slot within max_wait, or that is still
+    throttled after max_retries, raises Overloaded right away instead of
+    queueing until the Lambda times out. `is_throttle(e)` decides which errors
+    are the downstream pushing back; anything else (a slow response included)
+    is raised as is and doesn't shrink the limit.
+    """
+
+    def __init__(self, name, rate, burst, max_concurrency, max_wait, max_retries, *,
+                 is_throttle, retry_after=2, backoff_base=0.25, backoff_max=4.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.is_throttle = is_throttle
+        self.retry_after = retry_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.shed = 0
+
+    def overloaded(self):
+        self.shed += 1
+        return Overloaded(self.name, self.retry_after)
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def reserve(self):
+        wait = self.bucket.reserve(self.max_wait)
+        if wait is None:
+            raise self.overloaded()
+        return wait
+
+    def admit(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        admitted = self.limiter.acquire(self.max_wait - wait)
+        if admitted is None:
+            raise self.overloaded()
+        return admitted
+
+    async def admit_async(self):
+        """admit() without blocking the event loop: sleeps with asyncio and waits for a slot on a worker thread."""
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        admitted = self.limiter.try_acquire()
+        if admitted is None:
+            waiter = asyncio.get_running_loop().run_in_executor(None, self.limiter.acquire, self.max_wait - wait)
+            try:
+                admitted = await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                # The wait carries on in its thread; hand back the slot if it gets one
+                waiter.add_done_callback(
+                    lambda f: f.cancelled() or f.exception() or f.result() is None or self.limiter.release(f.result())
+                )
+                raise
+        if admitted is None:
+            raise self.overloaded()
+        return admitted
+
+    def call(self, fn, *args, **kwargs):
+        """Calls fn in a slot, retrying throttles."""
+        for attempt in range(self.max_retries + 1):
+            slot = self.admit()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = self.is_throttle(e)
+                self.limiter.release(slot, throttled)
+                if not throttled:
+                    raise
+                if attempt == self.max_retries:
+                    raise self.overloaded() from e
+                time.sleep(self.backoff_delay(attempt))
+                continue
+            self.limiter.release(slot)
+            return result
+
+    async def call_async(self, fn, *args, **kwargs):
+        """call() for a coroutine function."""
+        for attempt in range(self.max_retries + 1):
+            slot = await self.admit_async()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                throttled = self.is_throttle(e)
+                self.limiter.release(slot, throttled)
+                if not throttled:
+                    raise
+                if attempt == self.max_retries:
+                    raise self.overloaded() from e
+                await asyncio.sleep(self.backoff_delay(attempt))
+                continue
+            except BaseException:
+                # Cancelled: hand the slot back
+                self.limiter.release(slot)
+                raise
+            self.limiter.release(slot)
+            return result
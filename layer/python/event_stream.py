@@ -0,0 +1,191 @@
+"""
+Event streams for checks a client watches as they progress.
+
+The orchestrator answers {"stream": true} with a stream id right away and
+runs the check in the background. It and the internal checker append events
+to the stream as they happen ("evidence" once retrieval returns, "delta" as
+the model writes, "verdict" at the end), and the client polls
+{"streamId": ..., "after": n} for the events it hasn't seen yet.
+
+The managed Python runtime can't send a response in pieces, so the events
+travel through a store instead. A DynamoDB table (verdict cache schema, one
+"stream#<id>" item holding the event list) carries them between Lambda
+invocations. Without a table they stay in this process, which only works
+where the producer and the poller share one: local runs and the in-process
+invoke backend.
+"""
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryStreamStore:
+    """In-process streams with a TTL. Readers wait on a condition instead of polling."""
+
+    def __init__(self, ttl, max_streams=1024):
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self._streams = OrderedDict()  # stream_id -> {"events", "done", "expires_at"}
+        self._cond = threading.Condition()
+
+    def append(self, stream_id, events, done=False):
+        with self._cond:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                stream = self._streams[stream_id] = {"events": [], "done": False}
+                while len(self._streams) > self.max_streams:
+                    self._streams.popitem(last=False)
+            stream["events"].extend(events)
+            stream["done"] = stream["done"] or done
+            stream["expires_at"] = time.time() + self.ttl
+            self._cond.notify_all()
+
+    def read(self, stream_id, after, wait):
+        """Returns (events after `after`, done), or None for an unknown or expired stream."""
+        deadline = time.monotonic() + wait
+        with self._cond:
+            while True:
+                stream = self._streams.get(stream_id)
+                if stream is None or stream["expires_at"] <= time.time():
+                    return None
+                remaining = deadline - time.monotonic()
+                if len(stream["events"]) > after or stream["done"] or remaining <= 0:
+                    return list(stream["events"][after:]), stream["done"]
+                self._cond.wait(remaining)
+
+
+@functools.lru_cache(maxsize=None)
+def dynamodb_client(endpoint_url=None):
+    # Only streams kept in a table need boto3, so it loads with the first of them
+    import boto3
+
+    return boto3.client("dynamodb", endpoint_url=endpoint_url)
+
+
+class DynamoStreamStore:
+    """
+    One item per stream, "stream#<id>", with the events as a list of JSON
+    strings. Appends are a single list_append update, so writers in
+    different environments never overwrite each other.
+    """
+
+    def __init__(self, table, ttl, endpoint_url=None, poll_seconds=0.1):
+        self.table = table
+        self.ttl = ttl
+        self.endpoint_url = endpoint_url
+        self.poll_seconds = poll_seconds
+
+    def append(self, stream_id, events, done=False):
+        update = "SET #events = list_append(if_not_exists(#events, :empty), :events), expires_at = :expires_at"
+        names = {"#events": "events"}
+        values = {
+            ":empty": {"L": []},
+            ":events": {"L": [{"S": json.dumps(event)} for event in events]},
+            ":expires_at": {"N": str(int(time.time() + self.ttl))},
+        }
+        if done:
+            update += ", #done = :done"
+            names["#done"] = "done"
+            values[":done"] = {"BOOL": True}
+        dynamodb_client(self.endpoint_url).update_item(
+            TableName=self.table,
+            Key={"cache_key": {"S": f"stream#{stream_id}"}},
+            UpdateExpression=update,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+    def read(self, stream_id, after, wait):
+        """Returns (events after `after`, done), or None for an unknown or expired stream."""
+        deadline = time.monotonic() + wait
+        while True:
+            item = dynamodb_client(self.endpoint_url).get_item(
+                TableName=self.table, Key={"cache_key": {"S": f"stream#{stream_id}"}}, ConsistentRead=True
+            ).get("Item")
+            if not item or int(item["expires_at"]["N"]) <= time.time():
+                return None
+            events = item.get("events", {}).get("L", [])
+            done = item.get("done", {}).get("BOOL", False)
+            if len(events) > after or done or time.monotonic() >= deadline:
+                return [json.loads(event["S"]) for event in events[after:]], done
+            time.sleep(min(self.poll_seconds, max(0.0, deadline - time.monotonic())))
+
+
+_memory_store = None
+
+
+def build_stream_store(table, ttl, endpoint_url=None):
+    """A DynamoDB store for `table`, else the in-memory store every handler in this process shares."""
+    global _memory_store
+    if table:
+        return DynamoStreamStore(table, ttl, endpoint_url)
+    if _memory_store is None:
+        _memory_store = MemoryStreamStore(ttl)
+    return _memory_store
+
+
+class StreamWriter:
+    """
+    Appends one producer's events to a stream, stamped with the producer and
+    the milliseconds since it started. Model deltas are coalesced and written
+    at most every `flush_seconds`, so a long answer costs a few writes rather
+    than one per token. Store errors are logged, never raised: the check
+    itself still finishes and answers the poller's final read.
+    """
+
+    def __init__(self, store, stream_id, source, flush_seconds=0.2):
+        self.store = store
+        self.stream_id = stream_id
+        self.source = source
+        self.flush_seconds = flush_seconds
+        self.started = time.perf_counter()
+        self._pending = []
+        self._delta = ""
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _stamp(self, event, **fields):
+        return {**fields, "event": event, "source": self.source, "elapsed_ms": round((time.perf_counter() - self.started) * 1000)}
+
+    def _take_delta(self):
+        if self._delta:
+            self._pending.append(self._stamp("delta", text=self._delta))
+            self._delta = ""
+
+    def _write(self, done=False):
+        events, self._pending = self._pending, []
+        self._flushed = time.monotonic()
+        if not events and not done:
+            return
+        try:
+            self.store.append(self.stream_id, events, done)
+        except Exception as e:
+            print("Stream write error:", repr(e))
+
+    def emit(self, event, **fields):
+        """Writes an event now, after any model text still held back."""
+        with self._lock:
+            self._take_delta()
+            self._pending.append(self._stamp(event, **fields))
+            self._write()
+
+    def delta(self, text):
+        with self._lock:
+            self._delta += text
+            if time.monotonic() - self._flushed >= self.flush_seconds:
+                self._take_delta()
+                self._write()
+
+    def flush(self):
+        with self._lock:
+            self._take_delta()
+            self._write()
+
+    def close(self, event, **fields):
+        """Writes the final event and marks the stream done."""
+        with self._lock:
+            self._take_delta()
+            self._pending.append(self._stamp(event, **fields))
+            self._write(done=True)
@@ -0,0 +1,109 @@
+"""
+Near-duplicate verdict cache shared by the internal and public checkers.
+
+This directory is the `python/` root of the Lambda layer both functions
+attach, so handlers import it as a top-level module.
+
+A near-duplicate is the same claim reworded only in ways that can't change
+its meaning: case, punctuation, stopwords and plural endings. Any other
+differing word (a number, "not"/"cannot", "eligible"/"ineligible",
+"increased"/"decreased"), or the same words in another order ("5 seats ...
+50 seats" against "50 seats ... 5 seats"), blocks reuse outright, since a
+wrong cached verdict costs far more than a miss.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "of", "in", "on", "at", "to",
+    "for", "by", "and", "or", "that", "this", "it", "its", "as", "with", "from", "has", "have", "had",
+}
+
+
+def term(word):
+    """Normalized content word: numbers compare by value, plural/third-person "s" is dropped."""
+    if word[0].isdigit():
+        return repr(float(word))
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def claim_features(text):
+    """
+    Character 3-gram shingles of the claim's content words, plus the ordered
+    content terms a near-duplicate must match exactly.
+    """
+    text = (text or "").lower().replace("n't", " not").replace("cannot", "can not")
+    text = re.sub(r"(?<=\d),(?=\d{3}\b)", "", text)  # 3,500,000 → 3500000
+    words = [w for w in re.findall(r"\d+(?:\.\d+)?|[a-z]+", text) if w not in STOPWORDS]
+    terms = tuple(term(w) for w in words)
+    joined = " ".join(words)
+    shingles = frozenset(joined[i:i + 3] for i in range(max(1, len(joined) - 2)))
+    return shingles, terms
+
+
+class SimilarityCache:
+    """
+    Near-duplicate verdict cache. Entries are indexed by their ordered
+    content terms, so a lookup only compares against claims with exactly the
+    same content words in the same order, then checks shingle Jaccard against
+    the threshold. Bounded LRU with TTL; namespaces keep tenants/knowledge
+    bases apart.
+    """
+
+    def __init__(self, max_entries, ttl, threshold):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # entry_id -> entry dict
+        self._index = {}  # (namespace, terms) -> set(entry_id)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        bucket = self._index.get(entry["key"])
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._index[entry["key"]]
+
+    def lookup(self, namespace, claim):
+        """Returns (value, matched_claim, similarity) or None."""
+        shingles, terms = claim_features(claim)
+        now = time.time()
+        best = None
+        with self._lock:
+            for entry_id in list(self._index.get((namespace, terms), ())):
+                entry = self._entries[entry_id]
+                if entry["expires_at"] <= now:
+                    self._remove(entry_id)
+                    continue
+                similarity = len(shingles & entry["shingles"]) / len(shingles | entry["shingles"])
+                if similarity >= self.threshold and (best is None or similarity > best[0]):
+                    best = (similarity, entry_id)
+            if best is None:
+                return None
+            self._entries.move_to_end(best[1])
+            entry = self._entries[best[1]]
+            return entry["value"], entry["claim"], round(best[0], 4)
+
+    def store(self, namespace, claim, value):
+        shingles, terms = claim_features(claim)
+        key = (namespace, terms)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "claim": claim,
+                "value": value,
+                "shingles": shingles,
+                "key": key,
+                "expires_at": time.time() + self.ttl,
+            }
+            self._index.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
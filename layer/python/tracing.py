@@ -0,0 +1,125 @@
+"""
+Per-request tracing shared by the orchestrator, internal and public handlers.
+
+One Trace per request records wall-clock stage timings, counts, model token
+usage and time saved by overlapping stages. `emit()` prints it as a
+CloudWatch Embedded Metric Format line.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+
+# One CloudWatch Embedded Metric Format line per request (off disables)
+TRACE_METRICS = os.environ.get("TRACE_METRICS", "on").lower()
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "FactCheck")
+
+
+class Trace:
+    """
+    Wall-clock stage timings (ms) for one request. The trace id travels in the
+    Lambda payloads ("traceId"), so the orchestrator, internal and public logs
+    of one request can be joined; downstream timing blocks are nested under
+    "children" when the caller asked for timings. `tokens` adds model token
+    counts to the summary and metrics.
+    """
+
+    def __init__(self, function, trace_id=None, detail=False, tokens=False):
+        self.function = function
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.detail = detail
+        self.started = time.perf_counter()
+        self.stages = {}  # stage -> ms, summed when a stage runs more than once
+        self.counts = {}
+        self.children = {}
+        self.savings = {}
+        self.tokens = {"input": 0, "output": 0} if tokens else None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name, ms):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def saved(self, name, ms):
+        """Time a stage did not add to the request because it overlapped another, or was skipped."""
+        with self._lock:
+            self.savings[name] = self.savings.get(name, 0.0) + ms
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def add_tokens(self, input_tokens, output_tokens):
+        with self._lock:
+            self.tokens["input"] += int(input_tokens or 0)
+            self.tokens["output"] += int(output_tokens or 0)
+
+    def add_usage(self, usage):
+        """Token counts from a Bedrock "usage" block."""
+        usage = usage or {}
+        self.add_tokens(usage.get("inputTokens"), usage.get("outputTokens"))
+
+    def child(self, name, data):
+        if self.detail and isinstance(data, dict) and isinstance(data.get("timings"), dict):
+            with self._lock:
+                self.children[name] = data["timings"]
+
+    def payload(self, body):
+        """Adds the trace fields to a downstream Lambda's request body."""
+        return {**body, "traceId": self.trace_id, "timings": self.detail}
+
+    def summary(self):
+        summary = {
+            "traceId": self.trace_id,
+            "function": self.function,
+            "totalMs": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": {name: round(ms, 1) for name, ms in self.stages.items()},
+        }
+        if self.tokens is not None:
+            summary["tokens"] = dict(self.tokens)
+        if self.savings:
+            summary["savedMs"] = {name: round(ms, 1) for name, ms in self.savings.items()}
+        if self.children:
+            summary["children"] = dict(self.children)
+        return summary
+
+    def emit(self, **properties):
+        """
+        Prints the trace as an EMF record; CloudWatch turns each *Ms value into a
+        latency histogram, and the average of each count into a per-request rate.
+        """
+        if TRACE_METRICS == "off":
+            return
+        summary = self.summary()
+        metrics = {f"{name}Ms": ms for name, ms in summary["stages"].items()}
+        metrics.update({f"{name}SavedMs": ms for name, ms in summary.get("savedMs", {}).items()})
+        metrics["totalMs"] = summary["totalMs"]
+        if self.tokens is not None:
+            metrics.update(inputTokens=self.tokens["input"], outputTokens=self.tokens["output"])
+        metrics.update(self.counts)
+        print(json.dumps({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Function"]],
+                    "Metrics": [
+                        {"Name": name, "Unit": "Milliseconds" if name.endswith("Ms") else "Count"} for name in metrics
+                    ],
+                }],
+            },
+            "Function": self.function,
+            "traceId": self.trace_id,
+            **properties,
+            **metrics,
+        }))
@@ -1,9 +1,24 @@
 import os
 import json
 import asyncio
+import collections
+import contextlib
+import hashlib
+import http.client
+import ipaddress
+import queue
+import random
 import re
-import urllib.request
-from backboard import BackboardClient
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+from backpressure import Backpressure, Overloaded
+from similarity_cache import SimilarityCache
+from tracing import Trace
 
 # ======================================================
 # Environment Variables (Lambda config)
@@ -13,15 +28,303 @@ BACKBOARD_API_KEY = ""
 ASSISTANT_ID = ""
 GEMINI_API_KEY = ""
 
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_MODEL_PATH = "/v1beta/models/gemini-2.0-flash:generateContent"
+GEMINI_STREAM_PATH = "/v1beta/models/gemini-2.0-flash:streamGenerateContent?alt=sse"
+# on = stream Gemini's answer and take each citation as soon as it is complete; off = one blocking call
+GEMINI_STREAM = os.environ.get("GEMINI_STREAM", "on").lower()
+
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "4"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "25"))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", "0.25"))
+HTTP_BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", "4"))
+# Longest one call may take across all its attempts and backoffs
+HTTP_DEADLINE = float(os.environ.get("HTTP_DEADLINE", "25"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# 0 = create a fresh Backboard thread per claim; N = keep up to N threads and reuse them
+BACKBOARD_THREAD_POOL_SIZE = int(os.environ.get("BACKBOARD_THREAD_POOL_SIZE", "0"))
+# Retire a pooled thread after this many evaluations so its history stays small
+BACKBOARD_THREAD_MAX_USES = int(os.environ.get("BACKBOARD_THREAD_MAX_USES", "20"))
+
+# on = acquire the Backboard thread while Gemini is still fetching citations; off = only after.
+# Needs BACKBOARD_THREAD_POOL_SIZE > 0: a thread a claim turns out not to need (no citations,
+# settled) goes back to the pool, where without one it would be created and thrown away
+PUBLIC_OVERLAP = os.environ.get("PUBLIC_OVERLAP", "on").lower()
+# When the orchestrator answers from its internal check first it marks the check settled and the
+# evaluation is skipped: in-process with the local invoke backend, otherwise through an item in
+# this DynamoDB table (verdict cache schema; "" = only in-process)
+SETTLE_TABLE = os.environ.get("SETTLE_TABLE", "")
+# Point the DynamoDB tables (SETTLE_TABLE, CITATION_CHECK_TABLE) at DynamoDB Local when running outside AWS
+DYNAMODB_ENDPOINT_URL = os.environ.get("DYNAMODB_ENDPOINT_URL") or None
+
+# Citation URL validation: HEAD each cited URL and drop dead ones before the verdict (off disables)
+CITATION_CHECK = os.environ.get("CITATION_CHECK", "on").lower()
+# Longest one URL's check may take, waiting for a slot, redirects and the GET retry included
+CITATION_CHECK_TIMEOUT = float(os.environ.get("CITATION_CHECK_TIMEOUT", "2"))
+# Probes in flight at once, per event loop
+CITATION_CHECK_CONCURRENCY = int(os.environ.get("CITATION_CHECK_CONCURRENCY", "8"))
+CITATION_CHECK_MAX_REDIRECTS = int(os.environ.get("CITATION_CHECK_MAX_REDIRECTS", "3"))
+# Live/dead answers are reused for a day; timeouts and other inconclusive answers only briefly
+CITATION_CHECK_TTL = int(os.environ.get("CITATION_CHECK_TTL", "86400"))
+CITATION_CHECK_RETRY_TTL = int(os.environ.get("CITATION_CHECK_RETRY_TTL", "300"))
+CITATION_CHECK_MAX_ENTRIES = int(os.environ.get("CITATION_CHECK_MAX_ENTRIES", "8192"))
+# Shared tier behind the in-process cache (verdict cache schema; "" = in-process only)
+CITATION_CHECK_TABLE = os.environ.get("CITATION_CHECK_TABLE", "")
+# Model-generated URLs are never probed on private, loopback or link-local addresses unless this is on
+CITATION_CHECK_ALLOW_PRIVATE = os.environ.get("CITATION_CHECK_ALLOW_PRIVATE", "off").lower()
+# Resolver answers that the name doesn't exist. Anything else (EAI_AGAIN, a SERVFAIL) may clear up
+DNS_NOT_FOUND = {socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)}
+
+# Near-duplicate verdict cache (0 entries disables)
+SIMILARITY_CACHE_MAX_ENTRIES = int(os.environ.get("SIMILARITY_CACHE_MAX_ENTRIES", "4096"))
+SIMILARITY_CACHE_TTL = int(os.environ.get("SIMILARITY_CACHE_TTL", "3600"))
+# Shingle Jaccard a reworded claim needs on top of matching every content word exactly
+SIMILARITY_CACHE_THRESHOLD = float(os.environ.get("SIMILARITY_CACHE_THRESHOLD", "0.9"))
+
+# Backpressure per downstream (rate 0 = unlimited). Per execution environment, so it only bounds
+# the fan-out of one request; reserved concurrency caps the function as a whole
+GEMINI_RATE_PER_SEC = float(os.environ.get("GEMINI_RATE_PER_SEC", "0"))
+GEMINI_BURST = int(os.environ.get("GEMINI_BURST", "10"))
+GEMINI_CONCURRENCY_MAX = int(os.environ.get("GEMINI_CONCURRENCY_MAX", "16"))
+BACKBOARD_RATE_PER_SEC = float(os.environ.get("BACKBOARD_RATE_PER_SEC", "0"))
+BACKBOARD_BURST = int(os.environ.get("BACKBOARD_BURST", "10"))
+BACKBOARD_CONCURRENCY_MAX = int(os.environ.get("BACKBOARD_CONCURRENCY_MAX", "16"))
+# Longest a call waits for a token or a slot before it is shed with "retry later"
+SHED_QUEUE_TIMEOUT = float(os.environ.get("SHED_QUEUE_TIMEOUT", "2"))
+SHED_RETRY_AFTER = int(os.environ.get("SHED_RETRY_AFTER", "2"))
+
 # ======================================================
-# Gemini: Citation Retrieval ONLY
+# Keep-alive HTTP pool (module level, reused by warm invocations)
 # ======================================================
-def gemini_fetch_citations(claim: str):
-    url = (
-        "https://generativelanguage.googleapis.com/v1beta/models/"
-        "gemini-2.0-flash:generateContent"
-    )
+class RequestNotDelivered(ConnectionError):
+    """The connection failed before the server could have answered, so sending again is safe."""
+
+
+class HTTPPool:
+    """
+    Bounded pool of persistent HTTP/1.1 connections to a single origin.
+    At most `max_size` connections exist at once; idle ones are reused
+    most-recently-used first so warm sockets stay warm.
+    """
+
+    def __init__(self, base_url, max_size, connect_timeout, read_timeout, ssl_context=None):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.ssl_context = ssl_context
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.connect_timeout, context=self.ssl_context
+            )
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _open(self, reuse):
+        try:
+            return self._checkout() if reuse else (self._connect(), False)
+        except TimeoutError:
+            raise
+        except OSError as e:
+            # Refused or unresolvable: nothing was sent
+            raise RequestNotDelivered(repr(e)) from e
+
+    def _exchange(self, conn, reused, method, path, body, headers, read):
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise RequestNotDelivered(repr(e)) from e
+        try:
+            resp = conn.getresponse()
+        except http.client.RemoteDisconnected as e:
+            raise RequestNotDelivered(repr(e)) from e
+        except ConnectionResetError as e:
+            # A kept-alive socket the server had already closed answers the request with a reset, not a
+            # status line. On a fresh connection the server may have taken the request before resetting
+            if not reused:
+                raise
+            raise RequestNotDelivered(repr(e)) from e
+        # Timeouts and errors from here on may follow a request the server is still working on
+        return resp, resp.read() if read else None
+
+    def _send(self, method, path, body, headers, read, deadline=None):
+        """
+        Returns (conn, resp, data); data is the body when `read` is set, else
+        None (left for the caller). Only RequestNotDelivered is safe to retry.
+        """
+        reuse = True
+        while True:
+            conn, reused = self._open(reuse)
+            timeout = self.read_timeout if deadline is None else min(self.read_timeout, deadline - time.monotonic())
+            try:
+                if timeout <= 0:
+                    raise TimeoutError("deadline passed")
+                conn.sock.settimeout(timeout)
+                resp, data = self._exchange(conn, reused, method, path, body, headers, read)
+                return conn, resp, data
+            except RequestNotDelivered:
+                conn.close()
+                if not reused:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+            # The server dropped an idle keep-alive socket; retry once on a fresh one
+            reuse = False
+
+    def _finish(self, conn, resp):
+        if resp.will_close:
+            conn.close()
+        else:
+            self._idle.put(conn)
 
+    def request(self, method, path, body=None, headers=None, deadline=None):
+        """Returns (status, headers, body_bytes). Raises on connection errors and timeouts."""
+        with self._slots:
+            conn, resp, data = self._send(method, path, body, headers, read=True, deadline=deadline)
+            self._finish(conn, resp)
+            return resp.status, dict(resp.getheaders()), data
+
+    @contextlib.contextmanager
+    def stream(self, method, path, body=None, headers=None, deadline=None):
+        """
+        Yields (status, headers, response) before the body is read; the caller
+        reads it (iterating gives lines). A response left half-read, e.g. a
+        stream the caller stopped early, closes its connection instead of
+        waiting for the rest.
+        """
+        with self._slots:
+            conn, resp, _ = self._send(method, path, body, headers, read=False, deadline=deadline)
+            try:
+                yield resp.status, dict(resp.getheaders()), resp
+            except BaseException:
+                conn.close()
+                raise
+            if resp.isclosed():
+                self._finish(conn, resp)
+            else:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def backoff_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def request_with_retry(pool, method, path, body=None, headers=None, max_retries=None):
+    """
+    Retries 429/5xx responses and requests that never reached the server with
+    jittered exponential backoff (honouring Retry-After), all within
+    HTTP_DEADLINE. A timeout is never retried: the POST may still be running
+    upstream. Returns the final (status, headers, body).
+    """
+    max_retries = HTTP_MAX_RETRIES if max_retries is None else max_retries
+    deadline = time.monotonic() + HTTP_DEADLINE
+    for attempt in range(max_retries + 1):
+        try:
+            status, resp_headers, data = pool.request(method, path, body=body, headers=headers, deadline=deadline)
+        except RequestNotDelivered:
+            delay = backoff_delay(attempt)
+            if attempt == max_retries or time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
+            continue
+
+        delay = backoff_delay(attempt, resp_headers.get("Retry-After"))
+        if status not in RETRYABLE_STATUS or attempt == max_retries or time.monotonic() + delay >= deadline:
+            return status, resp_headers, data
+        time.sleep(delay)
+
+
+@contextlib.contextmanager
+def stream_with_retry(pool, method, path, body=None, headers=None, max_retries=None):
+    """request_with_retry() for pool.stream(): retries only happen before any of the body is handed out."""
+    max_retries = HTTP_MAX_RETRIES if max_retries is None else max_retries
+    deadline = time.monotonic() + HTTP_DEADLINE
+    for attempt in range(max_retries + 1):
+        with contextlib.ExitStack() as stack:
+            try:
+                status, resp_headers, resp = stack.enter_context(
+                    pool.stream(method, path, body=body, headers=headers, deadline=deadline)
+                )
+            except RequestNotDelivered:
+                delay = backoff_delay(attempt)
+                if attempt == max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+                continue
+            delay = backoff_delay(attempt, resp_headers.get("Retry-After"))
+            if status not in RETRYABLE_STATUS or attempt == max_retries or time.monotonic() + delay >= deadline:
+                yield status, resp_headers, resp
+                return
+            resp.read()
+        time.sleep(delay)
+
+
+gemini_http = HTTPPool(GEMINI_BASE_URL, HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+# ======================================================
+# Backpressure (AIMD concurrency + token bucket + load shedding)
+# ======================================================
+def is_throttle(e):
+    """The downstream pushing back. A timeout is only a slow answer, not a throttle."""
+    text = str(e).lower()
+    return "http 429" in text or "http 503" in text or "rate limit" in text or "too many requests" in text
+
+
+# Gemini 429/5xx are already retried by request_with_retry; only the final outcome counts here
+gemini_backpressure = Backpressure(
+    "gemini", GEMINI_RATE_PER_SEC, GEMINI_BURST, GEMINI_CONCURRENCY_MAX, SHED_QUEUE_TIMEOUT, 0,
+    is_throttle=is_throttle, retry_after=SHED_RETRY_AFTER,
+)
+backboard_backpressure = Backpressure(
+    "backboard", BACKBOARD_RATE_PER_SEC, BACKBOARD_BURST, BACKBOARD_CONCURRENCY_MAX, SHED_QUEUE_TIMEOUT, HTTP_MAX_RETRIES,
+    is_throttle=is_throttle, retry_after=SHED_RETRY_AFTER, backoff_base=HTTP_BACKOFF_BASE, backoff_max=HTTP_BACKOFF_MAX,
+)
+
+# ======================================================
+# Near-duplicate claim cache
+# ======================================================
+similarity_cache = (
+    SimilarityCache(SIMILARITY_CACHE_MAX_ENTRIES, SIMILARITY_CACHE_TTL, SIMILARITY_CACHE_THRESHOLD)
+    if SIMILARITY_CACHE_MAX_ENTRIES > 0
+    else None
+)
+
+# ======================================================
+# Gemini: Citation Retrieval ONLY
+# ======================================================
+def citation_request(claim):
     prompt = (
         f"Given the factual claim:\n\n"
         f"\"{claim}\"\n\n"
@@ -43,43 +346,213 @@ def gemini_fetch_citations(claim: str):
         ]
     }
 
-    data = json.dumps(payload).encode("utf-8")
+    return json.dumps(payload).encode("utf-8")
 
-    req = urllib.request.Request(
-        url,
-        data=data,
-        headers={
-            "Content-Type": "application/json",
-            "x-goog-api-key": GEMINI_API_KEY
-        },
-        method="POST"
-    )
+
+def parse_citations(text):
+    try:
+        match = re.search(r"\[\s*{.*?}\s*\]", text, re.DOTALL)
+        return json.loads(match.group(0)) if match else []
+    except Exception as e:
+        print("Gemini parse error:", repr(e))
+        return []
+
+
+def gemini_fetch_citations(claim: str, trace=None):
+    data = citation_request(claim)
+
+    def generate():
+        status, _, raw = request_with_retry(
+            gemini_http,
+            "POST",
+            GEMINI_MODEL_PATH,
+            body=data,
+            headers={
+                "Content-Type": "application/json",
+                "x-goog-api-key": GEMINI_API_KEY
+            },
+        )
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}: {raw[:200]!r}")
+        return raw
 
     try:
-        with urllib.request.urlopen(req, timeout=25) as resp:
-            raw = resp.read().decode("utf-8")
-            result = json.loads(raw)
+        result = json.loads(gemini_backpressure.call(generate).decode("utf-8"))
+        if trace:
+            usage = result.get("usageMetadata", {})
+            trace.add_tokens(usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
+    except Overloaded:
+        # Shed rather than answer "no sources": the claim was never checked
+        raise
     except Exception as e:
         print("Gemini HTTP error:", repr(e))
         return []
 
     try:
         text = result["candidates"][0]["content"]["parts"][0]["text"]
-        match = re.search(r"\[\s*{.*?}\s*\]", text, re.DOTALL)
-        return json.loads(match.group(0)) if match else []
     except Exception as e:
         print("Gemini parse error:", repr(e))
         return []
+    return parse_citations(text)
+
+
+class CitationStream:
+    """
+    Incremental parser for the JSON array Gemini streams back: feed() it text
+    as it arrives and get back each citation whose closing brace is in.
+    `closed` turns true at the array's closing bracket.
+    """
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self):
+        self.text = ""
+        self.pos = None  # just past the "[" once the array has started
+        self.closed = False
+        self.parsed = 0
+
+    def feed(self, fragment):
+        self.text += fragment
+        found = []
+        if self.pos is None:
+            start = self.text.find("[")
+            if start < 0:
+                return found
+            self.pos = start + 1
+        while not self.closed:
+            while self.pos < len(self.text) and self.text[self.pos] in " \t\r\n,":
+                self.pos += 1
+            if self.pos == len(self.text):
+                break
+            if self.text[self.pos] == "]":
+                self.closed = True
+                break
+            try:
+                item, self.pos = self.decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                # Incomplete so far
+                break
+            found.append(item)
+        self.parsed += len(found)
+        return found
+
+
+def gemini_stream_citations(claim, emit, trace=None, cancelled=None):
+    """
+    Streams Gemini's answer, calling emit(citation) as each one completes and
+    emit(None) once the array has closed. Reading continues after that so the
+    token usage is recorded and the connection can be reused, unless
+    `cancelled` is set, which drops the stream at the next chunk.
+    """
+    data = citation_request(claim)
+
+    def generate():
+        parser, usage = CitationStream(), {}
+        with stream_with_retry(
+            gemini_http,
+            "POST",
+            GEMINI_STREAM_PATH,
+            body=data,
+            headers={
+                "Content-Type": "application/json",
+                "x-goog-api-key": GEMINI_API_KEY
+            },
+        ) as (status, _, resp):
+            if status != 200:
+                raise RuntimeError(f"HTTP {status}: {resp.read()[:200]!r}")
+            for line in resp:
+                if cancelled is not None and cancelled.is_set():
+                    break
+                if not line.startswith(b"data:"):
+                    continue
+                chunk = json.loads(line[5:])
+                usage = chunk.get("usageMetadata") or usage
+                parts = ((chunk.get("candidates") or [{}])[0].get("content") or {}).get("parts") or []
+                was_closed = parser.closed
+                for citation in parser.feed("".join(part.get("text", "") for part in parts)):
+                    emit(citation)
+                if parser.closed and not was_closed:
+                    emit(None)
+        return parser, usage
+
+    try:
+        parser, usage = gemini_backpressure.call(generate)
+        if trace:
+            trace.add_tokens(usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
+    except Overloaded:
+        raise
+    except Exception as e:
+        print("Gemini HTTP error:", repr(e))
+        return
+    if not parser.parsed and not parser.closed:
+        # Not the bare array we asked for; fall back to picking it out of the whole answer
+        for citation in parse_citations(parser.text):
+            emit(citation)
+
+
+def gemini_citations(claim, emit, trace=None, cancelled=None):
+    if GEMINI_STREAM == "on":
+        gemini_stream_citations(claim, emit, trace, cancelled)
+    else:
+        for citation in gemini_fetch_citations(claim, trace):
+            emit(citation)
 
 # ======================================================
 # Backboard: Evaluation + SUMMARY
 # ======================================================
+# One event loop and one client for the lifetime of the execution environment,
+# so warm invocations skip client setup and keep its connections open. They are
+# per thread: Lambda uses one, but an orchestrator running this module
+# in-process calls it from several at once, and a loop can't be shared. Its
+# invoke pool reuses threads, so that is at most one loop per pool thread.
+_loop_state = threading.local()
+_thread_pool = collections.deque()  # (thread_id, uses)
+_dynamodb = None
+
+
+def get_event_loop():
+    loop = getattr(_loop_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _loop_state.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop
+
+
+def get_dynamodb():
+    """Only needed with SETTLE_TABLE or CITATION_CHECK_TABLE set; the Lambda runtime ships boto3."""
+    global _dynamodb
+    if _dynamodb is None:
+        import boto3
+        _dynamodb = boto3.client("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+    return _dynamodb
+
+
+def get_backboard_client():
+    client = getattr(_loop_state, "backboard_client", None)
+    if client is None:
+        # Imported here so cold starts that end in a 400 or a settled check skip the SDK and its HTTP stack
+        from backboard import BackboardClient
+
+        client = _loop_state.backboard_client = BackboardClient(api_key=BACKBOARD_API_KEY)
+    return client
+
+
 async def create_thread():
-    client = BackboardClient(api_key=BACKBOARD_API_KEY)
-    thread = await client.create_thread(ASSISTANT_ID)
+    thread = await get_backboard_client().create_thread(ASSISTANT_ID)
     return thread.thread_id
 
 
+async def acquire_thread():
+    if _thread_pool:
+        return _thread_pool.popleft()
+    return await backboard_backpressure.call_async(create_thread), 0
+
+
+def release_thread(thread_id, uses):
+    if uses < BACKBOARD_THREAD_MAX_USES and len(_thread_pool) < BACKBOARD_THREAD_POOL_SIZE:
+        _thread_pool.append((thread_id, uses))
+
+
 async def backboard_evaluate(thread_id, claim, citations):
     """
     Backboard returns ONLY:
@@ -90,7 +563,7 @@ async def backboard_evaluate(thread_id, claim, citations):
     }
     """
 
-    client = BackboardClient(api_key=BACKBOARD_API_KEY)
+    client = get_backboard_client()
 
     payload = {
         "claim": claim,
@@ -123,6 +596,406 @@ async def backboard_evaluate(thread_id, claim, citations):
     except Exception:
         return {}
 
+# ======================================================
+# Citation URL validation
+# ======================================================
+class CitationCheckCache:
+    """
+    URL → "live" | "dead" | "unknown" with a TTL: a bounded in-process LRU,
+    optionally in front of a DynamoDB table shared by every execution
+    environment (items "url#<sha256>"). Shared-tier errors are logged, never raised.
+    """
+
+    def __init__(self, max_entries, table=None):
+        self.max_entries = max_entries
+        self.table = table
+        self._entries = OrderedDict()  # url -> (status, expires_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url):
+        # Partition keys are capped at 2 KB; URLs are not
+        return "url#" + hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _get_local(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[url]
+                return None
+            self._entries.move_to_end(url)
+            return entry
+
+    def _set_local(self, url, status, expires_at):
+        with self._lock:
+            self._entries[url] = (status, expires_at)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, url):
+        entry = self._get_local(url)
+        if entry is not None:
+            return entry[0]
+        if not self.table:
+            return None
+        try:
+            item = get_dynamodb().get_item(TableName=self.table, Key={"cache_key": {"S": self._key(url)}}).get("Item")
+        except Exception as e:
+            print("Citation cache read error:", repr(e))
+            return None
+        # DynamoDB TTL deletion is lazy, so expired items can still be returned
+        if not item or int(item["expires_at"]["N"]) <= time.time():
+            return None
+        self._set_local(url, item["value"]["S"], int(item["expires_at"]["N"]))
+        return item["value"]["S"]
+
+    def set(self, url, status, ttl):
+        expires_at = int(time.time() + ttl)
+        self._set_local(url, status, expires_at)
+        if not self.table:
+            return
+        try:
+            get_dynamodb().put_item(
+                TableName=self.table,
+                Item={
+                    "cache_key": {"S": self._key(url)},
+                    "value": {"S": status},
+                    "expires_at": {"N": str(expires_at)},
+                },
+            )
+        except Exception as e:
+            print("Citation cache write error:", repr(e))
+
+
+class CitationChecker:
+    """
+    Says whether a cited URL resolves: a HEAD request (GET for servers that
+    refuse HEAD), following a few redirects. One `timeout` covers the whole
+    check (waiting for a slot, every hop and the GET retry). "dead" is
+    a 404/410, a host name that doesn't exist, a host that refuses the
+    connection, or a URL that isn't public http(s); timeouts, DNS failures
+    that may be transient, 403s, 429s and 5xx are "unknown" and keep the
+    citation. Probes are async, at most `concurrency`
+    at a time per event loop.
+    """
+
+    def __init__(self, cache, timeout, concurrency, max_redirects):
+        self.cache = cache
+        self.timeout = timeout
+        self.concurrency = max(1, concurrency)
+        self.max_redirects = max_redirects
+        self._ssl_context = None
+        self.stats = {"cached": 0, "probed": 0, "dead": 0}
+
+    @property
+    def ssl_context(self):
+        # Loading the CA bundle is most of this module's own init time, so it waits for the first https probe
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    def slots(self):
+        # One semaphore per event loop (loops are per thread, and replaced if closed)
+        loop = asyncio.get_running_loop()
+        slots = getattr(_loop_state, "citation_slots", None)
+        if slots is None or slots[0] is not loop:
+            slots = _loop_state.citation_slots = (loop, asyncio.Semaphore(self.concurrency))
+        return slots[1]
+
+    async def status(self, url):
+        loop = asyncio.get_running_loop()
+        cached = self.cache.get(url) if not self.cache.table else await loop.run_in_executor(None, self.cache.get, url)
+        if cached is not None:
+            self.stats["cached"] += 1
+            return cached
+        try:
+            status = await asyncio.wait_for(self.probe_in_slot(url), self.timeout)
+        except asyncio.TimeoutError:
+            status = "unknown"
+        self.stats["probed"] += 1
+        self.stats["dead"] += status == "dead"
+        ttl = CITATION_CHECK_RETRY_TTL if status == "unknown" else CITATION_CHECK_TTL
+        if self.cache.table:
+            await loop.run_in_executor(None, self.cache.set, url, status, ttl)
+        else:
+            self.cache.set(url, status, ttl)
+        return status
+
+    async def probe_in_slot(self, url):
+        async with self.slots():
+            return await self.probe(url)
+
+    async def probe(self, url):
+        method = "HEAD"
+        for _ in range(self.max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                return "dead"
+            try:
+                status, location = await self.request(parts, method)
+            except socket.gaierror as e:
+                return "dead" if e.errno in DNS_NOT_FOUND else "unknown"
+            except (ConnectionRefusedError, PermissionError):
+                return "dead"
+            except (OSError, ValueError):
+                return "unknown"
+            if status in (301, 302, 303, 307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
+            elif status in (405, 501) and method == "HEAD":
+                method = "GET"
+            elif status in (404, 410):
+                return "dead"
+            elif 200 <= status < 400:
+                return "live"
+            else:
+                return "unknown"
+        return "unknown"
+
+    async def request(self, parts, method):
+        """Returns (status, Location header) reading no more than the response head."""
+        https = parts.scheme == "https"
+        port = parts.port or (443 if https else 80)
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        if CITATION_CHECK_ALLOW_PRIVATE != "on" and not ipaddress.ip_address(address).is_global:
+            # Connects to the address checked here, so DNS can't swap in another one afterwards
+            raise PermissionError(f"{parts.hostname} resolves to non-public {address}")
+        reader, writer = await asyncio.open_connection(
+            address, port, ssl=self.ssl_context if https else None, server_hostname=parts.hostname if https else None
+        )
+        try:
+            path = urllib.parse.quote(parts.path or "/", safe="/%:@!$&'()*+,;=-._~")
+            if parts.query:
+                path += "?" + parts.query
+            host = parts.hostname.encode("idna").decode("ascii")
+            if parts.port:
+                host += f":{parts.port}"
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: factcheck-citation-check\r\n"
+                f"Accept: */*\r\nConnection: close\r\n\r\n".encode("ascii", "ignore")
+            )
+            await writer.drain()
+            status_line = (await reader.readline()).split()
+            if len(status_line) < 2:
+                raise ValueError("No HTTP status line")
+            status = int(status_line[1])
+            location = None
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "location":
+                    location = value.strip()
+            return status, location
+        finally:
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+
+citation_checker = CitationChecker(
+    CitationCheckCache(CITATION_CHECK_MAX_ENTRIES, CITATION_CHECK_TABLE or None),
+    CITATION_CHECK_TIMEOUT,
+    CITATION_CHECK_CONCURRENCY,
+    CITATION_CHECK_MAX_REDIRECTS,
+)
+
+
+async def drop_dead_citations(citations, checks, trace, probe_seconds):
+    """
+    Waits for the probes started as citations arrived; returns (kept, dropped)
+    citations. `probe_seconds` collects each finished probe's duration.
+    """
+    if not checks:
+        return citations, []
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*checks.values(), return_exceptions=True)
+    waited = time.perf_counter() - started
+    trace.add("citations", waited * 1000)
+    # Probing only once Gemini had finished would have taken about as long as the slowest probe
+    trace.saved("citations", max(0.0, max(probe_seconds, default=0.0) - waited) * 1000)
+    dead = {url for url, status in zip(checks, statuses) if status == "dead"}
+    return [c for c in citations if c.get("url") not in dead], [c for c in citations if c.get("url") in dead]
+
+
+# ======================================================
+# Overlapped pipeline: Gemini ‖ thread → evaluation
+# ======================================================
+# Check ids the orchestrator has already answered from its internal check
+_settled = OrderedDict()
+_settled_lock = threading.Lock()
+# Smoothed evaluation time, used to estimate what a skipped evaluation saved
+pipeline_stats = {"evaluate_ms": None}
+
+
+def settle(check_id):
+    """Called in-process by the orchestrator when its internal answer won; the check skips its evaluation."""
+    with _settled_lock:
+        _settled[check_id] = time.time()
+        while len(_settled) > 1024:
+            _settled.popitem(last=False)
+
+
+def is_settled(check_id, shared=False):
+    """In-process signal only, unless `shared`: then also the orchestrator's marker in SETTLE_TABLE."""
+    if not check_id:
+        return False
+    with _settled_lock:
+        if check_id in _settled:
+            return True
+    if not shared or not SETTLE_TABLE:
+        return False
+    try:
+        item = get_dynamodb().get_item(
+            TableName=SETTLE_TABLE, Key={"cache_key": {"S": f"settled#{check_id}"}}, ConsistentRead=True
+        ).get("Item")
+        return bool(item)
+    except Exception as e:
+        print("Settle signal read error:", repr(e))
+        return False
+
+
+def screen_citation(citation, seen_urls):
+    """Drops malformed items and repeated URLs as citations arrive, before they reach the evaluation."""
+    if not isinstance(citation, dict) or not (citation.get("url") or citation.get("snippet")):
+        return None
+    url = citation.get("url")
+    if url:
+        if url in seen_urls:
+            return None
+        seen_urls.add(url)
+    return citation
+
+
+async def timed_thread(trace):
+    started = time.perf_counter()
+    try:
+        return await acquire_thread()
+    finally:
+        trace.add("thread", (time.perf_counter() - started) * 1000)
+
+
+async def public_check(claim, check_id, trace):
+    """
+    Returns (citations, dropped, result, outcome). Gemini streams citations
+    from a worker thread while a pooled Backboard thread is acquired here;
+    each citation is screened and its URL probed as it arrives. Once the
+    array closes the probes are awaited and dead citations dropped, so the
+    evaluation (one Backboard message over the whole list) only sees sources
+    that resolve or couldn't be checked. A check the orchestrator has
+    settled stops before evaluating instead.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    arrivals = asyncio.Queue()
+    cancelled = threading.Event()
+    gemini_done = {}
+
+    def emit(item):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(arrivals.put_nowait, item)
+
+    def fetch():
+        try:
+            gemini_citations(claim, emit, trace, cancelled)
+        except Exception as e:
+            emit(e)
+        finally:
+            gemini_done["at"] = time.perf_counter()
+            emit(None)
+
+    gemini = loop.run_in_executor(None, fetch)
+    overlap = PUBLIC_OVERLAP == "on" and BACKBOARD_THREAD_POOL_SIZE > 0
+    thread_task = loop.create_task(timed_thread(trace)) if overlap else None
+    citations, seen_urls = [], set()
+    checks, probe_seconds = {}, []  # url -> probe task
+
+    def start_probe(url):
+        begun = time.perf_counter()
+
+        def done(_):
+            probe_seconds.append(time.perf_counter() - begun)
+
+        checks[url] = loop.create_task(citation_checker.status(url))
+        checks[url].add_done_callback(done)
+    thread_used = False
+    try:
+        while True:
+            item = await arrivals.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            citation = screen_citation(item, seen_urls)
+            if citation:
+                citations.append(citation)
+                if CITATION_CHECK == "on" and citation.get("url"):
+                    start_probe(citation["url"])
+            if is_settled(check_id):
+                break
+        ready = time.perf_counter()
+        trace.add("gemini", (ready - started) * 1000)
+
+        if is_settled(check_id, shared=bool(citations)):
+            cancelled.set()
+            if pipeline_stats["evaluate_ms"] is not None:
+                trace.saved("settled", pipeline_stats["evaluate_ms"])
+            return citations, [], None, "settled"
+        if not citations:
+            return citations, [], None, "no_citations"
+
+        citations, dropped = await drop_dead_citations(citations, checks, trace, probe_seconds)
+        if not citations:
+            return citations, dropped, None, "no_citations"
+
+        try:
+            if thread_task is None:
+                thread_task = loop.create_task(timed_thread(trace))
+            thread_id, uses = await thread_task
+            evaluating = time.perf_counter()
+            if overlap:
+                # Whatever of the thread acquisition ran while Gemini was still answering
+                trace.saved("thread", max(0.0, trace.stages.get("thread", 0.0) - (evaluating - ready) * 1000))
+            thread_used = True
+            result = await backboard_backpressure.call_async(backboard_evaluate, thread_id, claim, citations)
+        except Overloaded:
+            raise
+        except Exception as e:
+            print("Backboard error:", repr(e))
+            return citations, dropped, None, "unevaluated"
+        evaluate_ms = (time.perf_counter() - evaluating) * 1000
+        trace.add("backboard", evaluate_ms)
+        previous = pipeline_stats["evaluate_ms"]
+        pipeline_stats["evaluate_ms"] = evaluate_ms if previous is None else 0.8 * previous + 0.2 * evaluate_ms
+        # Threads that errored are dropped rather than returned to the pool
+        release_thread(thread_id, uses + 1)
+
+        await gemini
+        if GEMINI_STREAM == "on":
+            # The rest of Gemini's stream, which a blocking call would have waited out before evaluating
+            trace.saved("gemini", max(0.0, gemini_done["at"] - ready) * 1000)
+        return citations, dropped, result, "evaluated"
+    finally:
+        if thread_task is not None:
+            if not thread_task.done():
+                thread_task.cancel()
+            # Let a cancelled acquisition unwind now rather than on this loop's next request
+            acquired = (await asyncio.gather(thread_task, return_exceptions=True))[0]
+            if not thread_used and isinstance(acquired, tuple):
+                # Acquired but never needed (no citations, settled): keep it if the pool has room
+                release_thread(*acquired)
+        if not gemini.done():
+            cancelled.set()
+        # Probes nobody is waiting for (settled, shed) stop here
+        for task in checks.values():
+            task.cancel()
+        await asyncio.gather(*checks.values(), return_exceptions=True)
+
 # ======================================================
 # Confidence → Verdict (UI logic)
 # ======================================================
@@ -145,69 +1018,129 @@ def confidence_to_verdict(confidence, citations):
     else:
         return "mixed or uncertain"
 
+def shed_response(overloaded):
+    """Immediate "unknown, retry later" answer when a downstream is saturated. Never cached."""
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json", "Retry-After": str(overloaded.retry_after)},
+        "body": json.dumps({
+            "truth_label": "unknown",
+            "confidence": 0.0,
+            "summary": "The fact checker is at capacity right now; retry this claim shortly.",
+            "citations": [],
+            "retryAfter": overloaded.retry_after
+        })
+    }
+
 # ======================================================
 # Lambda Handler
 # ======================================================
 def lambda_handler(event, context):
+    trace = Trace("public", tokens=True)
     try:
         body = event.get("body", event)
         if isinstance(body, str):
             body = json.loads(body)
+        trace.trace_id = body.get("traceId") or trace.trace_id
 
-        claim = body.get("claim")
-        if not claim:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "Missing 'claim'"})
-            }
+        response, path = check(body, trace)
+        trace.emit(path=path)
+        if body.get("timings") and response["statusCode"] == 200:
+            response["body"] = json.dumps({**json.loads(response["body"]), "timings": trace.summary()})
+        return response
 
-        # Step 1: Gemini → citations
-        citations = gemini_fetch_citations(claim)
+    except Exception as e:
+        trace.emit(error=str(e))
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)})
+        }
 
-        if not citations:
-            return {
-                "statusCode": 200,
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({
-                    "truth_label": "unknown",
-                    "confidence": 0.0,
-                    "summary": "No reliable sources found",
-                    "citations": []
-                })
-            }
 
-        # Step 2: Backboard → confidence + summary
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+def check(body, trace):
+    """Returns (response, path) where path names the branch that answered."""
+    claim = body.get("claim")
+    if not claim:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": "Missing 'claim'"})
+        }, "invalid"
 
-            thread_id = loop.run_until_complete(create_thread())
-            result = loop.run_until_complete(
-                backboard_evaluate(thread_id, claim, citations)
-            )
+    with trace.stage("similarity"):
+        match = similarity_cache.lookup("public", claim) if similarity_cache else None
+    if match:
+        result, matched_claim, similarity = match
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({
+                **result,
+                "similarClaim": {"claim": matched_claim, "similarity": similarity}
+            })
+        }, "similar"
 
-            confidence = float(result.get("confidence", 0.0))
-            summary = result.get("summary", "")
-        except Exception as e:
-            print("Backboard error:", repr(e))
-            confidence = 0.0
-            summary = "Unable to evaluate claim using provided sources"
+    # Gemini → citations, overlapped with Backboard thread acquisition → confidence + summary
+    try:
+        citations, dropped, result, outcome = get_event_loop().run_until_complete(
+            public_check(claim, body.get("checkId"), trace)
+        )
+    except Overloaded as e:
+        return shed_response(e), "shed"
 
-        verdict = confidence_to_verdict(confidence, citations)
+    if outcome == "settled":
+        # The orchestrator already answered from its internal check and is not waiting on this one
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({
+                "truth_label": "unknown",
+                "confidence": 0.0,
+                "summary": "Not evaluated: the internal check already answered this claim",
+                "citations": citations,
+                "settled": True
+            })
+        }, "settled"
 
+    if not citations:
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({
-                "truth_label": verdict,
-                "confidence": confidence,
-                "summary": summary,
-                "citations": citations
+                "truth_label": "unknown",
+                "confidence": 0.0,
+                "summary": "None of the cited sources could be reached" if dropped else "No reliable sources found",
+                "citations": [],
+                **({"droppedCitations": dropped} if dropped else {})
             })
-        }
+        }, "dead_citations" if dropped else "no_citations"
 
+    evaluated = outcome == "evaluated"
+    try:
+        confidence = float(result.get("confidence", 0.0)) if evaluated else 0.0
+        summary = result.get("summary", "") if evaluated else "Unable to evaluate claim using provided sources"
     except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
+        print("Backboard error:", repr(e))
+        confidence = 0.0
+        summary = "Unable to evaluate claim using provided sources"
+        evaluated = False
+
+    # Dead citations were dropped before the evaluation, so the verdict rests only on the sources kept
+    verdict = confidence_to_verdict(confidence, citations)
+
+    result = {
+        "truth_label": verdict,
+        "confidence": confidence,
+        "summary": summary,
+        "citations": citations
+    }
+    if dropped:
+        result["droppedCitations"] = dropped
+    # Only successful evaluations are reused for near-duplicates
+    if evaluated and similarity_cache:
+        similarity_cache.store("public", claim, result)
+
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(result)
+    }, "evaluated" if evaluated else "unevaluated"
@@ -0,0 +1,123 @@
+"""
+CitationChecker against a local HTTP stub: how each kind of response is
+classified, and that one deadline bounds a whole check.
+
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The stub listens on loopback, which the checker refuses by default
+os.environ["CITATION_CHECK_ALLOW_PRIVATE"] = "on"
+os.environ.setdefault("TRACE_METRICS", "off")
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "public_api"))
+# The shared modules, as the Lambda layer puts them on the path
+sys.path.insert(0, os.path.join(ROOT, "layer", "python"))
+
+import lambda_handler  # noqa: E402
+
+TIMEOUT = 0.5
+
+
+class SourceStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def respond(self, head):
+        kind = self.path.strip("/").split("/")[0]
+        if kind == "slow":
+            time.sleep(2 * TIMEOUT)
+        if kind == "step":
+            # Each hop is well inside the timeout; the chain as a whole is not
+            time.sleep(0.6 * TIMEOUT)
+        if kind == "moved":
+            self.send_response(301)
+            self.send_header("Location", "/ok")
+        elif kind == "step":
+            self.send_response(302)
+            self.send_header("Location", "/step")
+        elif kind == "nohead" and head:
+            self.send_response(405)
+        else:
+            self.send_response({"ok": 200, "nohead": 200, "slow": 200, "gone": 404, "removed": 410, "forbidden": 403}.get(kind, 404))
+        body = b"" if head else b"ok"
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def do_GET(self):
+        self.respond(head=False)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SourceStub)
+    server.daemon_threads = True
+    # The checker hangs up on slow pages before they answer; that's expected, not worth a traceback
+    server.handle_error = lambda request, client_address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def make_checker(concurrency=8, max_redirects=3):
+    cache = lambda_handler.CitationCheckCache(128, None)
+    return lambda_handler.CitationChecker(cache, TIMEOUT, concurrency, max_redirects)
+
+
+def check(checker, *urls):
+    async def run():
+        return await asyncio.gather(*(checker.status(url) for url in urls))
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/ok", "live"),
+        ("/moved", "live"),
+        ("/nohead", "live"),
+        ("/gone", "dead"),
+        ("/removed", "dead"),
+        ("/forbidden", "unknown"),
+        ("/slow", "unknown"),
+    ],
+)
+def test_classifies_responses(base_url, path, expected):
+    assert check(make_checker(), base_url + path) == [expected]
+
+
+def test_unreachable_and_unsupported_urls_are_dead():
+    assert check(make_checker(), "http://127.0.0.1:9/refused", "ftp://example.com/file") == ["dead", "dead"]
+
+
+def test_redirect_chain_shares_one_deadline(base_url):
+    started = time.perf_counter()
+    assert check(make_checker(max_redirects=5), base_url + "/step") == ["unknown"]
+    assert time.perf_counter() - started < 1.5 * TIMEOUT
+
+
+def test_waiting_for_a_slot_counts_against_the_deadline(base_url):
+    started = time.perf_counter()
+    assert check(make_checker(concurrency=1), base_url + "/slow/a", base_url + "/slow/b") == ["unknown", "unknown"]
+    assert time.perf_counter() - started < 1.5 * TIMEOUT
+
+
+def test_answers_are_cached(base_url):
+    checker = make_checker()
+    check(checker, base_url + "/gone/cached")
+    assert check(checker, base_url + "/gone/cached") == ["dead"]
+    assert checker.stats["cached"] == 1